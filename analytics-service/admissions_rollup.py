@@ -0,0 +1,305 @@
+# analytics-service/admissions_rollup.py
+"""
+Time-bucketed admission counts, kept up to date by tailing the admissions event log.
+
+Every admission is counted once per granularity (hour, day, month; UTC) and
+dimension: 'all' plus the roomType, doctor and gender columns, so the rollup holds
+{granularity: {dimension: {bucket: {value: count}}}}. The event time is admittedAt
+when the row has one and the log timestamp otherwise; naive times are UTC (that is
+what analytics_update writes).
+
+Like DemandAggregate, refresh() parses only the bytes appended since the last call,
+so admissions written by every gunicorn worker are picked up; load() rebuilds the
+counts from the whole log on startup. Appended rows are folded in a chunk at a time
+with pyarrow (pandas when it is not installed) and NumPy rather than row by row.
+
+A window query never touches the events: [start, end) is covered by whole months,
+then whole days, then single hours at the edges, so "per room type over the last
+7 days" reads at most ~60 buckets however long the history is.
+"""
+import csv
+import io
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+GRANULARITIES = ('hour', 'day', 'month')
+DIMENSIONS = ('all', 'roomType', 'doctor', 'gender')
+TIME_COLUMNS = ('admittedAt', 'timestamp')
+UNKNOWN = 'unknown'
+# bytes of log parsed per step when catching up (startup rebuild of a large log)
+READ_CHUNK_BYTES = 32 << 20
+# above this many (bucket x value) cells a chunk is counted with np.unique instead of np.bincount
+BINCOUNT_MAX_CELLS = 1 << 24
+
+
+def hour_of(value, ceil=False):
+    """
+    Epoch hour (UTC) of a datetime / ISO string, rounded down (up with ceil=True, for
+    exclusive window ends); naive values are taken as UTC.
+    """
+    ts = pd.Timestamp(value)
+    if ts is pd.NaT:
+        raise ValueError(f"not a time: {value!r}")
+    ts = ts.tz_localize('UTC') if ts.tzinfo is None else ts.tz_convert('UTC')
+    hour, rest = divmod(ts.as_unit('ns').value, 3_600_000_000_000)
+    return int(hour + (1 if ceil and rest else 0))
+
+
+def month_of_hour(hour):
+    return int(np.datetime64(int(hour), 'h').astype('datetime64[M]').astype(np.int64))
+
+
+def month_start_hour(month):
+    return int(np.datetime64(int(month), 'M').astype('datetime64[h]').astype(np.int64))
+
+
+def bucket_label(granularity, bucket):
+    if granularity == 'hour':
+        return str(np.datetime64(int(bucket), 'h')) + ':00Z'
+    if granularity == 'day':
+        return str(np.datetime64(int(bucket), 'D'))
+    return str(np.datetime64(int(bucket), 'M'))
+
+
+def bucket_span(granularity, bucket):
+    """[start, end) of one bucket in epoch hours."""
+    if granularity == 'hour':
+        return bucket, bucket + 1
+    if granularity == 'day':
+        return bucket * 24, bucket * 24 + 24
+    return month_start_hour(bucket), month_start_hour(bucket + 1)
+
+
+def cover(start_hour, end_hour):
+    """[(granularity, bucket), ...] exactly tiling the hours [start_hour, end_hour), coarsest first."""
+    out = []
+    h = start_hour
+    while h < end_hour:
+        month = month_of_hour(h)
+        month_start, month_end = month_start_hour(month), month_start_hour(month + 1)
+        if h == month_start and month_end <= end_hour:
+            out.append(('month', month))
+            h = month_end
+        elif h % 24 == 0 and h + 24 <= end_hour:
+            out.append(('day', h // 24))
+            h += 24
+        else:
+            out.append(('hour', h))
+            h += 1
+    return out
+
+
+def _count(buckets, codes, n_values):
+    """(bucket, value code, count) of every non-empty cell."""
+    if len(buckets) == 0:
+        return []
+    lo = int(buckets.min())
+    span = int(buckets.max()) - lo + 1
+    if span * n_values <= BINCOUNT_MAX_CELLS:
+        counts = np.bincount((buckets - lo) * n_values + codes, minlength=span * n_values)
+        cells = np.flatnonzero(counts)
+        return zip(cells // n_values + lo, cells % n_values, counts[cells])
+    keys, counts = np.unique(np.stack([buckets, codes], axis=1), axis=0, return_counts=True)
+    return zip(keys[:, 0], keys[:, 1], counts)
+
+
+_pa_csv = False
+
+
+def _arrow_csv():
+    """pyarrow.csv (about 4x faster than the pandas parser here), None when not installed."""
+    global _pa_csv
+    if _pa_csv is False:
+        try:
+            import pyarrow.csv as pa_csv
+        except ImportError:
+            pa_csv = None
+        _pa_csv = pa_csv
+    return _pa_csv
+
+
+class AdmissionsRollup:
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._reset(None)
+        self._refreshes = 0
+        self._refresh_seconds = 0.0
+        self._queries = 0
+        self._query_seconds = 0.0
+
+    def _reset(self, inode):
+        self._counts = {g: {d: {} for d in DIMENSIONS} for g in GRANULARITIES}
+        self._inode = inode
+        self._offset = 0
+        self._header = None
+        self._events = 0
+        self._skipped = 0
+        self._first_hour = None
+        self._last_hour = None
+
+    # ---- startup ----
+    def load(self):
+        """Rebuild the counts from the whole log."""
+        with self._lock:
+            self._reset(None)
+        return self.refresh()
+
+    # ---- tailing ----
+    def refresh(self):
+        """Fold in whatever was appended to the log since the last call. Returns events added."""
+        t0 = time.perf_counter()
+        with self._lock:
+            try:
+                f = open(self.path, 'rb')
+            except FileNotFoundError:
+                if self._inode is not None:
+                    self._reset(None)
+                return 0
+            with f:
+                added = self._consume(f)
+            self._refreshes += 1
+            self._refresh_seconds += time.perf_counter() - t0
+        return added
+
+    def _consume(self, f):
+        st = os.fstat(f.fileno())
+        if st.st_ino != self._inode or st.st_size < self._offset:
+            # a different (rotated-in or truncated) file: start over from its first byte
+            self._reset(st.st_ino)
+        added = 0
+        while True:
+            f.seek(self._offset)
+            data = f.read(READ_CHUNK_BYTES)
+            end = data.rfind(b'\n')
+            if end < 0:
+                return added
+            # only whole lines; a partly flushed last line is picked up next time (a line is
+            # a whole record: EventLogWriter never writes a newline inside a field)
+            chunk = data[:end + 1]
+            self._offset += len(chunk)
+            if self._header is None:
+                first = chunk.index(b'\n') + 1
+                self._header = next(csv.reader([chunk[:first].decode('utf-8')]), [])
+                chunk = chunk[first:]
+            if chunk:
+                added += self._fold(chunk)
+            if len(data) < READ_CHUNK_BYTES:
+                return added
+
+    def _read(self, chunk):
+        wanted = [c for c in TIME_COLUMNS + DIMENSIONS[1:] if c in self._header]
+        pa_csv = _arrow_csv()
+        if pa_csv is not None:
+            import pyarrow as pa
+            table = pa_csv.read_csv(
+                pa.py_buffer(chunk), read_options=pa_csv.ReadOptions(column_names=self._header),
+                convert_options=pa_csv.ConvertOptions(
+                    include_columns=wanted, column_types={c: pa.string() for c in wanted},
+                    strings_can_be_null=False, quoted_strings_can_be_null=False))
+            return table.to_pandas()
+        return pd.read_csv(io.BytesIO(chunk), names=self._header, header=None, usecols=wanted, dtype=object,
+                           keep_default_na=False, na_filter=False, index_col=False)
+
+    def _fold(self, chunk):
+        if not set(TIME_COLUMNS) & set(self._header):
+            return 0
+        frame = self._read(chunk)
+        when = None
+        for col in TIME_COLUMNS:
+            if col in frame:
+                when = frame[col] if when is None else when.where(when != '', frame[col])
+        # only the hour matters: parse each distinct "YYYY-MM-DDTHH" prefix once (whole
+        # strings when they carry a UTC offset, which can move the hour)
+        offset = when.str.contains(r'[+-]\d\d:?\d\d$', regex=True)
+        codes, keys = pd.factorize(when.str.slice(0, 13).where(~offset, when))
+        parsed = pd.to_datetime(pd.Series(keys, dtype=object), utc=True, format='ISO8601', errors='coerce')
+        key_ok = parsed.notna().to_numpy()
+        key_hours = parsed.dt.tz_convert(None).to_numpy().astype('datetime64[h]').astype(np.int64)
+        valid = (codes >= 0) & key_ok[codes]
+        self._skipped += int((~valid).sum())
+        if not valid.any():
+            return 0
+        hours = key_hours[codes[valid]]
+        buckets = {
+            'hour': hours,
+            'day': hours // 24,
+            'month': hours.astype('datetime64[h]').astype('datetime64[M]').astype(np.int64),
+        }
+        for dim in DIMENSIONS:
+            if dim == 'all':
+                codes, values = np.zeros(len(hours), dtype=np.int64), ['all']
+            else:
+                column = frame[dim] if dim in frame else pd.Series([''] * len(frame))
+                codes, values = pd.factorize(column)
+                codes, values = codes[valid], [v or UNKNOWN for v in values]
+            for granularity, b in buckets.items():
+                table = self._counts[granularity][dim]
+                for bucket, code, n in _count(b, codes, len(values)):
+                    cell = table.setdefault(int(bucket), {})
+                    value = values[code]
+                    cell[value] = cell.get(value, 0) + int(n)
+        n = len(hours)
+        self._events += n
+        lo, hi = int(hours.min()), int(hours.max())
+        self._first_hour = lo if self._first_hour is None else min(self._first_hour, lo)
+        self._last_hour = hi if self._last_hour is None else max(self._last_hour, hi)
+        return n
+
+    # ---- queries ----
+    def window(self, dimension, start_hour, end_hour):
+        """({value: count}, buckets read) over the hours [start_hour, end_hour)."""
+        if dimension not in DIMENSIONS:
+            raise ValueError(f"unknown dimension {dimension!r}; expected one of {', '.join(DIMENSIONS)}")
+        t0 = time.perf_counter()
+        totals = {}
+        parts = cover(start_hour, end_hour)
+        with self._lock:
+            for granularity, bucket in parts:
+                cell = self._counts[granularity][dimension].get(bucket)
+                if cell:
+                    for value, n in cell.items():
+                        totals[value] = totals.get(value, 0) + n
+            self._queries += 1
+            self._query_seconds += time.perf_counter() - t0
+        return totals, len(parts)
+
+    def series(self, dimension, start_hour, end_hour, granularity):
+        """[(label, {value: count}), ...] per `granularity` bucket overlapping [start_hour, end_hour)."""
+        if granularity not in GRANULARITIES:
+            raise ValueError(f"unknown bucket {granularity!r}; expected one of {', '.join(GRANULARITIES)}")
+        out = []
+        h = start_hour
+        while h < end_hour:
+            if granularity == 'hour':
+                bucket = h
+            elif granularity == 'day':
+                bucket = h // 24
+            else:
+                bucket = month_of_hour(h)
+            lo, hi = bucket_span(granularity, bucket)
+            counts, _ = self.window(dimension, max(lo, start_hour), min(hi, end_hour))
+            out.append((bucket_label(granularity, bucket), counts))
+            h = hi
+        return out
+
+    def stats(self):
+        with self._lock:
+            return {
+                'path': os.path.basename(self.path),
+                'events': self._events,
+                'skipped_rows': self._skipped,
+                'offset_bytes': self._offset,
+                'first_hour': bucket_label('hour', self._first_hour) if self._first_hour is not None else None,
+                'last_hour': bucket_label('hour', self._last_hour) if self._last_hour is not None else None,
+                'buckets': {g: len(self._counts[g]['all']) for g in GRANULARITIES},
+                'refreshes': self._refreshes,
+                'mean_refresh_ms': round(self._refresh_seconds / self._refreshes * 1000.0, 4) if self._refreshes else 0.0,
+                'queries': self._queries,
+                'mean_query_ms': round(self._query_seconds / self._queries * 1000.0, 4) if self._queries else 0.0,
+            }
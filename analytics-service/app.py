@@ -1,18 +1,40 @@
 # analytics-service/app.py
-from flask import Flask, request, jsonify
+import time
+from startup import StartupTimer
+
+# checkpoints between the import groups feed the start-up report on /readyz; sklearn,
+# joblib, pyarrow and camelot are imported where they are first used, not here
+startup = StartupTimer()
+
+from flask import Flask, request, jsonify, g, send_file
 from flask_cors import CORS
+startup.imported('flask')
 import pandas as pd
 import numpy as np
+startup.imported('pandas_numpy')
 import traceback
 import os
-from sklearn.ensemble import RandomForestRegressor
-from sklearn.linear_model import LogisticRegression
-from sklearn.preprocessing import OneHotEncoder
-from sklearn.pipeline import make_pipeline
-from sklearn.compose import ColumnTransformer
-import csv
+import re
 from datetime import datetime
-import shutil
+from importlib.metadata import version as package_version
+
+from training_engine import fit_series_models
+from seasonal_engine import fit_seasonal_models
+from model_store import source_fingerprint, load_artifact, save_artifact, artifact_lock
+from model_registry import ModelRegistry
+from risk_scoring import (build_risk_features, score_features, iter_chunks, bp_is_high, condition_value,
+                          CompiledRiskScorer, RISK_FEATURE_COLUMNS)
+from coalescer import RequestCoalescer
+from event_writer import EventLogWriter, FSYNC_POLICIES
+from demand_aggregate import DemandAggregate
+from admissions_rollup import AdmissionsRollup, DIMENSIONS as ADMISSION_DIMENSIONS, hour_of, bucket_label
+from response_cache import ResponseCache
+from medicine_matcher import MedicineMatcher
+from columnar_store import (UNKNOWN_MONTH, PartitionedStore, columnar_available, compact_event_archives,
+                            partition_values, valid_partition_value)
+from request_profiler import RequestProfiler, PROFILE_KINDS
+from metrics import REGISTRY as metrics_registry, CONTENT_TYPE as METRICS_CONTENT_TYPE, FAST_BUCKETS, SLOW_BUCKETS
+startup.imported('service_modules')
 
 # Attempt to import invoice_service (may be a module with Blueprint / register function / handler)
 try:
@@ -21,6 +43,7 @@ try:
 except Exception as e:
     invoice_service = None
     invoice_import_error = e
+startup.imported('invoice_service')
 
 app = Flask(__name__)
 
@@ -43,16 +66,68 @@ if backend_url and backend_url not in allowed_origins:
 
 CORS(app, origins=allowed_origins, supports_credentials=True)
 
+# -------------------------
+# Metrics: GET /metrics serves everything below in the Prometheus text format.
+# Values are per worker process (see metrics.py).
+# -------------------------
+HTTP_REQUEST_SECONDS = metrics_registry.histogram(
+    'http_request_duration_seconds', 'Request latency by route, method and status.', ['route', 'method', 'status'])
+PREDICT_STAGE_SECONDS = metrics_registry.histogram(
+    'analytics_predict_stage_seconds', 'Time spent building features vs running the model, per endpoint.',
+    ['endpoint', 'stage'], buckets=FAST_BUCKETS)
+TRAIN_PHASE_SECONDS = metrics_registry.histogram(
+    'analytics_train_phase_seconds', 'Wall-clock time of each training phase.', ['phase', 'mode'],
+    buckets=SLOW_BUCKETS)
+TRAIN_ENTITY_FIT_SECONDS = metrics_registry.histogram(
+    'analytics_train_entity_fit_seconds', 'Fit time of one per-medicine / per-disease model.', ['phase'],
+    buckets=FAST_BUCKETS + (0.25, 0.5, 1.0, 5.0))
+TRAIN_ENTITIES = metrics_registry.counter(
+    'analytics_train_entities_total', 'Entities considered by training, by whether a model was fitted.',
+    ['phase', 'result'])
+INGEST_EVENTS = metrics_registry.counter(
+    'analytics_update_events_total', 'Events accepted by /api/analytics/update, by payload type.', ['type'])
+
+@app.before_request
+def _start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def _observe_request(response):
+    started = getattr(g, 'request_started', None)
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        HTTP_REQUEST_SECONDS.labels(route, request.method, response.status_code).observe(
+            time.perf_counter() - started)
+    return response
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    return app.response_class(metrics_registry.render(), content_type=METRICS_CONTENT_TYPE)
+
+def observe_training(report, mode):
+    """Record one build's phase timings and per-entity fits (report as in training_report)."""
+    for phase, rep in report.items():
+        if not isinstance(rep, dict) or 'wall_seconds' not in rep:
+            continue
+        TRAIN_PHASE_SECONDS.labels(phase, mode).observe(rep['wall_seconds'])
+        if 'entities' in rep:
+            TRAIN_ENTITIES.labels(phase, 'fitted').inc(rep['fitted'])
+            TRAIN_ENTITIES.labels(phase, 'unfitted').inc(rep['entities'] - rep['fitted'])
+            child = TRAIN_ENTITY_FIT_SECONDS.labels(phase)
+            for seconds in rep.get('per_entity_seconds', {}).values():
+                child.observe(seconds)
+
 
 # -------------------------
 # Helper utilities (you already had parse_month_to_index etc.)
 # -------------------------
-def parse_month_to_index(month_input, months_index_map):
+def parse_month_to_index(month_input, months_index_map, anchor_month=None):
     if month_input is None:
         return None
     try:
         if isinstance(month_input, int):
-            last_month = max(months_index_map.keys()) if months_index_map else None
+            # bare month numbers resolve against the anchor year (default: last month in the map)
+            last_month = anchor_month or (max(months_index_map.keys()) if months_index_map else None)
             if not last_month:
                 return None
             y = int(last_month.split('-')[0])
@@ -64,7 +139,7 @@ def parse_month_to_index(month_input, months_index_map):
             if alt_key in months_index_map:
                 return months_index_map[alt_key]
         if isinstance(month_input, str) and month_input.isdigit():
-            return parse_month_to_index(int(month_input), months_index_map)
+            return parse_month_to_index(int(month_input), months_index_map, anchor_month)
     except Exception:
         pass
     if isinstance(month_input, str):
@@ -84,10 +159,24 @@ def month_index_to_label(idx, months_list):
         return None
     return months_list[idx]
 
+def extend_months(months, horizon):
+    """Return `months` followed by `horizon` consecutive YYYY-MM labels after the last one."""
+    out = list(months)
+    if not out or horizon <= 0:
+        return out
+    y, m = int(out[-1][:4]), int(out[-1][5:7])
+    for _ in range(horizon):
+        m += 1
+        if m > 12:
+            y, m = y + 1, 1
+        out.append(f"{y:04d}-{m:02d}")
+    return out
+
 # -------------------------
-# Paths / CSV locations
+# Paths / CSV locations (ANALYTICS_DATA_DIR moves the CSVs and everything written
+# next to them, e.g. to run the service against a copy of the data)
 # -------------------------
-DATA_DIR = os.path.dirname(__file__) or '.'
+DATA_DIR = os.environ.get('ANALYTICS_DATA_DIR') or os.path.dirname(__file__) or '.'
 demand_csv = os.path.join(DATA_DIR, "synthetic_medicine_demand.csv")
 risk_csv = os.path.join(DATA_DIR, "synthetic_patient_risk.csv")
 disease_csv = os.path.join(DATA_DIR, "synthetic_disease_trends.csv")
@@ -98,40 +187,200 @@ os.makedirs(EVENT_DATA_DIR, exist_ok=True)
 DEMAND_EVENTS_CSV = os.path.join(EVENT_DATA_DIR, "synthetic_medicine_demand_events.csv")
 ADMISSIONS_EVENTS_CSV = os.path.join(EVENT_DATA_DIR, "admissions_events.csv")
 
-# Simple containers
-demand_models = {}
-disease_models = {}
-months_list = []
-months_index_map = {}
-medicine_catalog = []
-disease_catalog = []
+# -------------------------
+# Columnar store: demand history, disease trends and processed demand events as
+# month-partitioned Parquet (data/store/<dataset>/month=YYYY-MM/part-0.parquet).
+# The CSVs seed an empty store once; after that merges rewrite only the partitions
+# they touch and training reads only the columns it needs. COLUMNAR_STORE=0, or
+# pyarrow not being installed, keeps everything on the CSVs.
+# -------------------------
+STORE_DIR = os.path.join(EVENT_DATA_DIR, "store")
+USE_COLUMNAR_STORE = columnar_available() and os.environ.get('COLUMNAR_STORE', '1').lower() not in ('0', 'false', 'no')
+demand_store = PartitionedStore(os.path.join(STORE_DIR, "demand"))
+disease_store = PartitionedStore(os.path.join(STORE_DIR, "disease"))
+events_store = PartitionedStore(os.path.join(STORE_DIR, "events"))
+
+def bootstrap_stores():
+    if not USE_COLUMNAR_STORE:
+        return
+    for store, csv_path in ((demand_store, demand_csv), (disease_store, disease_csv)):
+        if store.is_empty():
+            n = store.import_csv(csv_path)
+            print(f"[analytics] Imported {n} rows from {os.path.basename(csv_path)} into {store.root}")
+
+def dated_partitions(store):
+    """
+    The store's month partitions without `unknown`: rows that arrived without a month
+    are kept there but can't be placed on the timeline, so nothing trains on them.
+    """
+    return [p for p in store.partitions() if p != UNKNOWN_MONTH]
+
+def load_demand_frame():
+    """month, medicine, demand rows from the store (or the CSV); None if there is no data."""
+    columns = ['month', 'medicine', 'demand']
+    if USE_COLUMNAR_STORE and not demand_store.is_empty():
+        return demand_store.read(columns, dated_partitions(demand_store))
+    if os.path.exists(demand_csv):
+        return pd.read_csv(demand_csv, usecols=columns)
+    return None
+
+def load_disease_frame():
+    columns = ['month', 'disease', 'cases']
+    if USE_COLUMNAR_STORE and not disease_store.is_empty():
+        return disease_store.read(columns, dated_partitions(disease_store))
+    if os.path.exists(disease_csv):
+        return pd.read_csv(disease_csv, usecols=columns)
+    return None
+
+def disease_months():
+    if USE_COLUMNAR_STORE and not disease_store.is_empty():
+        return set(dated_partitions(disease_store))
+    if os.path.exists(disease_csv):
+        return set(pd.read_csv(disease_csv, usecols=['month'])['month'].astype(str))
+    return set()
+
+# Trained state lives in the model registry: every retrain builds a complete new
+# ModelGeneration (models, catalogs, month maps, forecast matrices) and publishes it
+# with one atomic swap. Request handlers grab registry.current() once and use only
+# that generation, so they never mix a new months_index_map with old models.
+registry = ModelRegistry()
+
+def _generation_metric(field):
+    gen = registry.current()
+    if gen is None:
+        return {}
+    return {(gen.source,): gen.version if field == 'version' else round(time.time() - gen.created_at, 3)}
 
-risk_pipeline = None
+metrics_registry.callback('analytics_model_generation', 'Version of the model generation being served.',
+                          ['source'], lambda: _generation_metric('version'))
+metrics_registry.callback('analytics_model_age_seconds', 'Seconds since the served generation was published.',
+                          ['source'], lambda: _generation_metric('age'))
+
+# Pre-computed forecasts: one row per catalog entry, one column per month in
+# forecast_months (the trained history followed by FORECAST_HORIZON_MONTHS future months)
+FORECAST_HORIZON_MONTHS = int(os.environ.get('FORECAST_HORIZON_MONTHS', 12))
+
+# Which models produce the demand / disease forecasts, per deployment:
+#   forest    one RandomForestRegressor per series on the month index (training_engine.py);
+#             future months repeat the last trained month
+#   seasonal  damped Holt-Winters with a 12-month season, all series fitted at once as a
+#             matrix (seasonal_engine.py); extrapolates trend and season over the horizon
+FORECAST_ENGINES = ('forest', 'seasonal')
+FORECAST_ENGINE = os.environ.get('FORECAST_ENGINE', 'forest').strip().lower()
+if FORECAST_ENGINE not in FORECAST_ENGINES:
+    print(f"[analytics] Unknown FORECAST_ENGINE {FORECAST_ENGINE!r}, using 'forest'")
+    FORECAST_ENGINE = 'forest'
+
+def fit_forecast_models(df, key_col, value_col, months_index_map, n_estimators, entities=None):
+    """fit_series_models / fit_seasonal_models, whichever FORECAST_ENGINE selects."""
+    if FORECAST_ENGINE == 'seasonal':
+        models, report = fit_seasonal_models(df, key_col, value_col, months_index_map, entities=entities)
+    else:
+        models, report = fit_series_models(df, key_col, value_col, months_index_map, n_estimators,
+                                           entities=entities)
+    report['engine'] = FORECAST_ENGINE
+    return models, report
+
+# rows timed on each path when reporting compiled vs sklearn risk scoring latency
+RISK_LATENCY_SAMPLES = int(os.environ.get('RISK_LATENCY_SAMPLES', 100))
+
+def build_forecast_matrix(catalog, models, n_months, fallback, default, reuse=None):
+    """
+    Predict every month index in [0, n_months) for every entry of `catalog` in one
+    model.predict call per entry. Entries without a model get their fallback value.
+    Returns (matrix, trained_mask).
+
+    `reuse` = (old_catalog, old_matrix, old_trained, refit_names) keeps the old row of
+    every entry that was not refit; when the old matrix has fewer columns (the month
+    axis grew) only the missing tail columns are predicted.
+    """
+    matrix = np.zeros((len(catalog), n_months), dtype=float)
+    trained = np.zeros(len(catalog), dtype=bool)
+    X = np.arange(n_months).reshape(-1, 1)
+    old_rows, old_cols = {}, 0
+    if reuse is not None:
+        old_catalog, old_matrix, old_trained, refit_names = reuse
+        old_rows = {name: i for i, name in enumerate(old_catalog) if name not in refit_names}
+        old_cols = min(old_matrix.shape[1], n_months)
+    for row, name in enumerate(catalog):
+        model = models.get(name)
+        start = 0
+        if name in old_rows:
+            matrix[row, :old_cols] = old_matrix[old_rows[name], :old_cols]
+            trained[row] = old_trained[old_rows[name]]
+            start = old_cols
+        if start >= n_months:
+            continue
+        if model is not None:
+            matrix[row, start:] = np.maximum(0, np.round(model.predict(X[start:])))
+            trained[row] = True
+        else:
+            matrix[row, start:] = fallback.get(name, default)
+    return matrix, trained
+
+YEAR_MONTH_RE = re.compile(r'^\d{4}-(0[1-9]|1[0-2])$')
+
+def resolve_month(gen, month_input):
+    """
+    Map a request month ("2025-11", "11", 11) to a column of the generation's forecast
+    matrices. Exact future labels hit the forecast horizon; anything else resolves
+    against the trained history first (same as before) and only then the horizon.
+    A full YYYY-MM label must name a month of the history or horizon; one outside
+    them raises ValueError rather than being matched to some other year's month.
+    """
+    if isinstance(month_input, str) and month_input.strip() in gen.forecast_index_map:
+        return gen.forecast_index_map[month_input.strip()]
+    if isinstance(month_input, str) and YEAR_MONTH_RE.match(month_input.strip()) and gen.forecast_months:
+        label, first, last = month_input.strip(), gen.forecast_months[0], gen.forecast_months[-1]
+        if label > last:
+            raise ValueError(f"{label} is beyond forecast horizon (last: {last})")
+        if label < first:
+            raise ValueError(f"{label} is before the history (first: {first})")
+        raise ValueError(f"{label} has no history data")
+    idx = parse_month_to_index(month_input, gen.months_index_map)
+    if idx is None:
+        anchor = gen.months_list[-1] if gen.months_list else None
+        idx = parse_month_to_index(month_input, gen.forecast_index_map, anchor)
+    return idx
+
+def with_forecasts(state):
+    """Add the month maps and forecast matrices derived from the models in `state`."""
+    forecast_months = extend_months(state['months_list'], FORECAST_HORIZON_MONTHS)
+    state['forecast_months'] = forecast_months
+    state['forecast_index_map'] = {m: i for i, m in enumerate(forecast_months)}
+    state['medicine_row_map'] = {med: i for i, med in enumerate(state['medicine_catalog'])}
+    state['demand_forecast'], state['demand_forecast_trained'] = build_forecast_matrix(
+        state['medicine_catalog'], state['demand_models'], len(forecast_months), state.pop('demand_fallback'), 50)
+    state['disease_forecast'], state['disease_forecast_trained'] = build_forecast_matrix(
+        state['disease_catalog'], state['disease_models'], len(forecast_months), {}, 20)
+    return state
 
 # -------------------------
-# Training logic (same as you had)
+# Training: build a complete model state from the stored history
 # -------------------------
-def train_models():
-    global demand_models, disease_models, months_list, months_index_map, medicine_catalog, disease_catalog, risk_pipeline
+def build_model_state():
+    """Train every model from the current CSVs and return the new state dict (no side effects)."""
+    training_report = {}
+    train_started = time.perf_counter()
+    # taken before reading, so data written meanwhile makes the generation look stale, never fresh
+    data_fingerprint = current_fingerprint()
+    load_seconds = {}
 
     # demand
     demand_models = {}
-    if os.path.exists(demand_csv):
-        df = pd.read_csv(demand_csv)
+    demand_fallback = {}
+    load_started = time.perf_counter()
+    df = load_demand_frame()
+    load_seconds['demand_seconds'] = round(time.perf_counter() - load_started, 6)
+    if df is not None:
         df['month'] = df['month'].astype(str)
         months_list = sorted(df['month'].unique())
         months_index_map = {m: i for i, m in enumerate(months_list)}
         medicine_catalog = sorted(df['medicine'].unique())
-        for med in medicine_catalog:
-            mdf = df[df['medicine'] == med].copy()
-            X = mdf['month'].map(months_index_map).values.reshape(-1, 1)
-            y = mdf['demand'].values
-            if len(X) >= 3:
-                model = RandomForestRegressor(n_estimators=50, random_state=42)
-                model.fit(X, y)
-                demand_models[med] = model
-            else:
-                demand_models[med] = None
+        for med, mean in df.groupby('medicine')['demand'].mean().items():
+            demand_fallback[med] = int(mean) if pd.notna(mean) else 50
+        demand_models, training_report['demand'] = fit_forecast_models(
+            df, 'medicine', 'demand', months_index_map, n_estimators=50)
     else:
         months_list = [f"2025-{m:02d}" for m in range(1, 13)]
         months_index_map = {m: i for i, m in enumerate(months_list)}
@@ -141,46 +390,32 @@ def train_models():
 
     # disease
     disease_models = {}
-    if os.path.exists(disease_csv):
-        ddf = pd.read_csv(disease_csv)
+    load_started = time.perf_counter()
+    ddf = load_disease_frame()
+    load_seconds['disease_seconds'] = round(time.perf_counter() - load_started, 6)
+    if ddf is not None:
         ddf['month'] = ddf['month'].astype(str)
         disease_catalog = sorted(ddf['disease'].unique())
-        for dis in disease_catalog:
-            sdf = ddf[ddf['disease'] == dis].copy()
-            X = sdf['month'].map(months_index_map).values.reshape(-1, 1)
-            y = sdf['cases'].values
-            if len(X) >= 3:
-                model = RandomForestRegressor(n_estimators=40, random_state=42)
-                model.fit(X, y)
-                disease_models[dis] = model
-            else:
-                disease_models[dis] = None
+        disease_models, training_report['disease'] = fit_forecast_models(
+            ddf, 'disease', 'cases', months_index_map, n_estimators=40)
     else:
         disease_catalog = ["Influenza", "Dengue"]
         for dis in disease_catalog:
             disease_models[dis] = None
 
     # patient risk
-    if os.path.exists(risk_csv):
-        rdf = pd.read_csv(risk_csv)
-        def make_features(df):
-            X = pd.DataFrame()
-            X['age'] = df['age'].fillna(50).astype(float)
-            X['isSmoker'] = df['isSmoker'].astype(bool).astype(int)
-            X['hr'] = df['hr'].fillna(75).astype(float)
-            def bp_flag(bp):
-                try:
-                    s = str(bp)
-                    s_sys = int(s.split('/')[0])
-                    s_dia = int(s.split('/')[1])
-                    return 1 if (s_sys > 140 or s_dia > 90) else 0
-                except:
-                    return 0
-            X['high_bp'] = df['bp'].apply(bp_flag)
-            X['condition'] = df['condition'].fillna('None').astype(str)
-            return X
-
-        X = make_features(rdf)
+    load_started = time.perf_counter()
+    rdf = pd.read_csv(risk_csv) if os.path.exists(risk_csv) else None
+    load_seconds['risk_seconds'] = round(time.perf_counter() - load_started, 6)
+    training_report['data_load'] = dict(load_seconds, wall_seconds=round(sum(load_seconds.values()), 6))
+    risk_started = time.perf_counter()
+    if rdf is not None:
+        # sklearn takes over a second to import, so it is only pulled in once training starts
+        from sklearn.linear_model import LogisticRegression
+        from sklearn.preprocessing import OneHotEncoder
+        from sklearn.pipeline import make_pipeline
+        from sklearn.compose import ColumnTransformer
+        X = build_risk_features(rdf)
         y = rdf['readmitted'].astype(int).values
         categorical_features = ['condition']
         preprocessor = ColumnTransformer(transformers=[
@@ -195,13 +430,176 @@ def train_models():
             risk_pipeline = None
     else:
         risk_pipeline = None
+    training_report['risk'] = {'wall_seconds': round(time.perf_counter() - risk_started, 6)}
+
+    # export the fitted pipeline to the compiled single-patient scorer (parity-checked on the training set)
+    risk_scorer = None
+    if risk_pipeline is not None:
+        try:
+            risk_scorer = CompiledRiskScorer.from_pipeline(risk_pipeline)
+            training_report['risk']['compiled'] = risk_scorer.verify(
+                risk_pipeline, X, latency_samples=RISK_LATENCY_SAMPLES)
+        except Exception as e:
+            print("Warning: compiled risk scorer disabled:", e)
+            risk_scorer = None
+
+    # fuzzy matcher from free-text invoice descriptions to catalog names
+    matcher_started = time.perf_counter()
+    medicine_matcher = MedicineMatcher(medicine_catalog)
+    training_report['matcher'] = {'skus': len(medicine_catalog),
+                                  'wall_seconds': round(time.perf_counter() - matcher_started, 6)}
 
-# initial train
-train_models()
-print("Analytics service: models trained/loaded.")
-print("Medicines:", medicine_catalog)
-print("Diseases:", disease_catalog)
-print("Months:", len(months_list))
+    state = with_forecasts({
+        'demand_models': demand_models,
+        'disease_models': disease_models,
+        'months_list': months_list,
+        'months_index_map': months_index_map,
+        'medicine_catalog': medicine_catalog,
+        'disease_catalog': disease_catalog,
+        'risk_pipeline': risk_pipeline,
+        'risk_scorer': risk_scorer,
+        'medicine_matcher': medicine_matcher,
+        'demand_fallback': demand_fallback,
+        'forecast_engine': FORECAST_ENGINE,
+        'data_fingerprint': data_fingerprint,
+    })
+    training_report['total_seconds'] = round(time.perf_counter() - train_started, 6)
+    state['training_report'] = training_report
+    observe_training(training_report, 'full')
+    return state
+
+def train_models():
+    """Full retrain from the CSVs; publishes and returns the new generation."""
+    return registry.publish(build_model_state(), 'trained')
+
+def retrain_demand_incremental(gen, df, touched_medicines):
+    """
+    Build a new state from generation `gen` that refits only the demand models of
+    `touched_medicines` against the merged frame `df` and reuses every other model
+    and forecast row. Returns (state, stats), or (None, None) when the change can't
+    be applied incrementally (the month axis was re-ordered, or newly added months
+    change how disease history maps onto it) and a full retrain is needed instead.
+    """
+    df = df.copy()
+    df['month'] = df['month'].astype(str)
+    new_months = sorted(df['month'].unique())
+    # existing month indices must stay put, otherwise every model sees shifted features
+    if new_months[:len(gen.months_list)] != list(gen.months_list):
+        return None, None
+    added_months = set(new_months[len(gen.months_list):])
+    if added_months and disease_months() & added_months:
+        return None, None
+
+    new_index_map = {m: i for i, m in enumerate(new_months)}
+    new_catalog = sorted(df['medicine'].unique())
+    refit = set(touched_medicines) | (set(new_catalog) - set(gen.medicine_catalog))
+
+    refit_models, report = fit_forecast_models(
+        df, 'medicine', 'demand', new_index_map, n_estimators=50, entities=refit)
+    observe_training({'demand': report}, 'incremental')
+    new_models = {med: gen.demand_models.get(med) for med in new_catalog}
+    new_models.update(refit_models)
+    # untrained medicines fall back to their mean demand
+    means = df.groupby('medicine')['demand'].mean()
+    fallback = {med: int(mean) if pd.notna(mean) else 50 for med, mean in means.items()}
+
+    new_forecast_months = extend_months(new_months, FORECAST_HORIZON_MONTHS)
+    state = dict(gen.state)
+    state['demand_models'] = new_models
+    state['months_list'] = new_months
+    state['months_index_map'] = new_index_map
+    state['medicine_catalog'] = new_catalog
+    state['forecast_months'] = new_forecast_months
+    state['forecast_index_map'] = {m: i for i, m in enumerate(new_forecast_months)}
+    state['medicine_row_map'] = {med: i for i, med in enumerate(new_catalog)}
+    state['demand_forecast'], state['demand_forecast_trained'] = build_forecast_matrix(
+        new_catalog, new_models, len(new_forecast_months), fallback, 50,
+        reuse=(gen.medicine_catalog, gen.demand_forecast, gen.demand_forecast_trained, refit))
+    state['disease_forecast'], state['disease_forecast_trained'] = build_forecast_matrix(
+        gen.disease_catalog, gen.disease_models, len(new_forecast_months), {}, 20,
+        reuse=(gen.disease_catalog, gen.disease_forecast, gen.disease_forecast_trained, set()))
+    state['training_report'] = dict(gen.training_report, demand=report)
+    if new_catalog != list(gen.medicine_catalog):
+        matcher_started = time.perf_counter()
+        state['medicine_matcher'] = MedicineMatcher(new_catalog)
+        state['training_report']['matcher'] = {'skus': len(new_catalog),
+                                               'wall_seconds': round(time.perf_counter() - matcher_started, 6)}
+        observe_training({'matcher': state['training_report']['matcher']}, 'incremental')
+
+    stats = {
+        'refit_models': len(refit_models),
+        'reused_models': len(new_catalog) - len(refit_models) + len(gen.disease_models) + (1 if gen.risk_pipeline else 0),
+        'refit_medicines': sorted(refit_models),
+    }
+    return state, stats
+
+# -------------------------
+# Model artifacts: trained state persisted under a hash of the source CSVs so a
+# restart (or another gunicorn worker) loads a file instead of retraining
+# -------------------------
+MODEL_ARTIFACT_DIR = os.environ.get('MODEL_ARTIFACT_DIR') or os.path.join(DATA_DIR, 'models')
+MODEL_ARTIFACT_KEEP = int(os.environ.get('MODEL_ARTIFACT_KEEP', 3))
+USE_MODEL_ARTIFACTS = os.environ.get('MODEL_ARTIFACTS', '1').lower() not in ('0', 'false', 'no')
+
+# everything a generation holds; this is what gets saved / restored
+MODEL_STATE_KEYS = (
+    'demand_models', 'disease_models', 'months_list', 'months_index_map',
+    'medicine_catalog', 'disease_catalog', 'risk_pipeline', 'risk_scorer', 'medicine_matcher',
+    'forecast_months', 'forecast_index_map', 'medicine_row_map',
+    'demand_forecast', 'demand_forecast_trained', 'disease_forecast', 'disease_forecast_trained',
+    'training_report', 'forecast_engine', 'data_fingerprint',
+)
+
+model_artifact_info = {}
+
+def current_fingerprint():
+    extra = {'horizon': FORECAST_HORIZON_MONTHS, 'engine': FORECAST_ENGINE,
+             'sklearn': package_version('scikit-learn')}
+    if USE_COLUMNAR_STORE:
+        extra['demand_store'] = demand_store.fingerprint()
+        extra['disease_store'] = disease_store.fingerprint()
+        return source_fingerprint([risk_csv], extra=extra)
+    return source_fingerprint([demand_csv, disease_csv, risk_csv], extra=extra)
+
+def save_models(gen, fingerprint=None):
+    """
+    Persist generation `gen` under the fingerprint of the data it was trained on (no-op
+    when artifacts are disabled).
+    """
+    global model_artifact_info
+    if not USE_MODEL_ARTIFACTS:
+        return None
+    fingerprint = fingerprint or gen.data_fingerprint
+    try:
+        state = {k: gen.state[k] for k in MODEL_STATE_KEYS}
+        path = save_artifact(state, MODEL_ARTIFACT_DIR, fingerprint, keep=MODEL_ARTIFACT_KEEP)
+    except Exception as e:
+        print("[analytics] Warning: could not save model artifact:", e)
+        return None
+    model_artifact_info = {'fingerprint': fingerprint, 'source': 'trained', 'path': path}
+    return path
+
+def load_or_train_models():
+    """Publish the artifact matching the current CSVs, or train, publish and save a new one."""
+    global model_artifact_info
+    if not USE_MODEL_ARTIFACTS:
+        model_artifact_info = {'source': 'trained'}
+        return train_models()
+    t0 = time.perf_counter()
+    fingerprint = current_fingerprint()
+    with artifact_lock(MODEL_ARTIFACT_DIR):
+        state = load_artifact(MODEL_ARTIFACT_DIR, fingerprint)
+        if state is not None:
+            gen = registry.publish({k: state[k] for k in MODEL_STATE_KEYS}, 'artifact')
+            model_artifact_info = {
+                'fingerprint': fingerprint,
+                'source': 'artifact',
+                'load_seconds': round(time.perf_counter() - t0, 6),
+            }
+            return gen
+        gen = train_models()
+        save_models(gen)
+        return gen
 
 # -------------------------
 # Try to register invoice_service routes if available
@@ -264,32 +662,207 @@ def register_invoice_routes_if_possible(app):
 register_invoice_routes_if_possible(app)
 
 # -------------------------
-# Existing predict endpoints (unchanged)
+# Description -> catalog matching. Each generation carries a MedicineMatcher built
+# from its medicine_catalog at train time. /api/analytics/match exposes it directly,
+# parsed invoice rows get candidates with ?match=1, and demand_batch events can be
+# mapped onto catalog names ("match": true, or DEMAND_AUTO_MATCH=1) when the best
+# candidate scores at least MEDICINE_MATCH_THRESHOLD.
 # -------------------------
+MEDICINE_MATCH_THRESHOLD = float(os.environ.get('MEDICINE_MATCH_THRESHOLD', 0.6))
+DEMAND_AUTO_MATCH = os.environ.get('DEMAND_AUTO_MATCH', '0').lower() in ('1', 'true', 'yes')
+
+def match_descriptions(descriptions, k=3):
+    gen = registry.current()
+    if gen is None:
+        # still warming up: no catalog to match against yet
+        return [[] for _ in descriptions]
+    return gen.medicine_matcher.match_many(descriptions, k)
+
+if invoice_service is not None and hasattr(invoice_service, 'set_row_matcher'):
+    invoice_service.set_row_matcher(match_descriptions)
+
+@app.route('/api/analytics/match', methods=['POST'])
+def analytics_match():
+    """
+    Expects JSON: { "descriptions": ["PARACETAMOL 500 MG TAB", ...] } (or "description")
+    and optional "k" (default 3). Returns the top-k catalog candidates with scores.
+    """
+    try:
+        gen = registry.current()
+        payload = request.get_json(force=True, silent=True) or {}
+        descriptions = payload.get('descriptions')
+        if descriptions is None and 'description' in payload:
+            descriptions = [payload['description']]
+        if not isinstance(descriptions, list):
+            return jsonify({'error': 'Expected "descriptions" (list) or "description"'}), 400
+        try:
+            k = max(1, min(int(payload.get('k', 3)), 50))
+        except (TypeError, ValueError):
+            return jsonify({'error': 'k must be an integer'}), 400
+        matches = gen.medicine_matcher.match_many(descriptions, k)
+        return jsonify({
+            'matches': [{'description': d, 'candidates': m} for d, m in zip(descriptions, matches)],
+            'model_version': gen.version
+        })
+    except Exception as e:
+        traceback.print_exc()
+        return jsonify({'error': str(e)}), 500
+
+# -------------------------
+# Opt-in request coalescing for /api/predict/risk: concurrent calls within a short
+# window are scored with one vectorised call (PREDICT_COALESCE=1 to enable).
+# Demand / disease predictions are already a column slice of a pre-computed matrix,
+# so there is no per-call model invocation left to amortise there.
+# -------------------------
+PREDICT_COALESCE = os.environ.get('PREDICT_COALESCE', '0').lower() in ('1', 'true', 'yes')
+COALESCE_WINDOW_MS = float(os.environ.get('COALESCE_WINDOW_MS', 2.0))
+COALESCE_MAX_BATCH = int(os.environ.get('COALESCE_MAX_BATCH', 32))
+
+def score_risk_items(items):
+    """Coalescer batch function: items are (generation, age, isSmoker, hr, high_bp, condition)."""
+    results = [None] * len(items)
+    by_version = {}
+    for i, item in enumerate(items):
+        by_version.setdefault(item[0].version, (item[0], []))[1].append(i)
+    # a batch can straddle a model swap; each caller is scored by the generation it saw
+    for gen, positions in by_version.values():
+        X = pd.DataFrame([items[i][1:] for i in positions], columns=RISK_FEATURE_COLUMNS)
+        probs = score_features(gen.risk_pipeline, X, gen.risk_scorer)
+        for i, prob in zip(positions, probs.tolist()):
+            results[i] = prob
+    return results
+
+risk_coalescer = RequestCoalescer(
+    score_risk_items, COALESCE_WINDOW_MS, COALESCE_MAX_BATCH, name='predict_risk') if PREDICT_COALESCE else None
+
+@app.route('/api/analytics/coalescer', methods=['GET'])
+def analytics_coalescer_stats():
+    """Batch-size distribution and added queueing delay of the prediction coalescer."""
+    if risk_coalescer is None:
+        return jsonify({'enabled': False})
+    return jsonify({'enabled': True, 'predict_risk': risk_coalescer.stats()})
+
+def forecast_value(matrix, trained, row, col):
+    v = matrix[row, col]
+    return float(v) if trained[row] else int(v)
+
+# -------------------------
+# Response cache for demand / disease predictions and metadata. Entries are keyed by
+# endpoint + normalized input (the resolved forecast column, so "11" and "2025-11"
+# share one) + model generation, and dropped whenever a generation is published.
+# Responses carry a weak ETag; a matching If-None-Match gets a 304 without the body
+# being rebuilt. RESPONSE_CACHE_SIZE=0 disables the cache (ETags are still sent).
+# -------------------------
+RESPONSE_CACHE_SIZE = int(os.environ.get('RESPONSE_CACHE_SIZE', 512))
+response_cache = ResponseCache(RESPONSE_CACHE_SIZE)
+registry.add_listener(lambda gen: response_cache.invalidate())
+
+def cached_json(gen, endpoint, normalized, build, echo=None, live=None):
+    """
+    Serve build() (a JSON-able dict) through the response cache. `echo` fields (e.g.
+    the raw request month) are added to every response and covered by the ETag but
+    not by the cache key; `live` fields are added to every response and ignored by
+    the (weak) ETag.
+    """
+    echo = echo or {}
+    # created_at keeps tags from different worker processes (each numbers its own
+    # generations) from colliding
+    tag = response_cache.etag(endpoint, normalized, gen.version, gen.created_at, sorted(echo.items(), key=str))
+    if request.if_none_match.contains_weak(tag):
+        response_cache.record_not_modified()
+        resp = app.response_class(status=304)
+        resp.set_etag(tag, weak=True)
+        return resp
+    key = (endpoint, normalized, gen.version)
+    body = response_cache.get(key) if response_cache.enabled else None
+    if body is None:
+        body = build()
+        response_cache.put(key, body)
+    resp = jsonify(dict(body, **echo, **(live or {})))
+    resp.set_etag(tag, weak=True)
+    return resp
+
+@app.route('/api/analytics/cache', methods=['GET'])
+def analytics_cache_stats():
+    return jsonify(dict(response_cache.stats(), model_version=registry.current().version))
+
 @app.route('/api/predict/demand', methods=['POST'])
 def predict_demand():
     try:
+        started = time.perf_counter()
+        gen = registry.current()
         payload = request.get_json(force=True, silent=True) or {}
         month = payload.get('month')
-        idx = parse_month_to_index(month, months_index_map)
+        try:
+            idx = resolve_month(gen, month)
+        except ValueError as e:
+            return jsonify({'error': str(e), 'available_months': gen.forecast_months}), 400
+        PREDICT_STAGE_SECONDS.labels('predict_demand', 'features').observe(time.perf_counter() - started)
         if idx is None:
-            return jsonify({'error': 'Invalid or out-of-range month', 'available_months': months_list}), 400
+            return jsonify({'error': 'Invalid or out-of-range month', 'available_months': gen.forecast_months}), 400
+
+        # O(1) column slice of the matrix pre-computed by train_models (not run on cache hits)
+        def build():
+            with PREDICT_STAGE_SECONDS.labels('predict_demand', 'inference').time():
+                results = [
+                    {'medicine': med, 'predicted_demand': forecast_value(gen.demand_forecast, gen.demand_forecast_trained, row, idx)}
+                    for row, med in enumerate(gen.medicine_catalog)
+                ]
+            return {'predictions': results, 'model_version': gen.version}
+        return cached_json(gen, 'predict_demand', idx, build, echo={'month': month})
+    except Exception as e:
+        traceback.print_exc()
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/predict/demand/range', methods=['POST'])
+def predict_demand_range():
+    """
+    Expects JSON: { "start": "2025-11", "end": "2026-06", "medicines": [...] (optional) }.
+    Returns the whole horizon for the requested (default: all) medicines in one response.
+    """
+    try:
+        gen = registry.current()
+        payload = request.get_json(force=True, silent=True) or {}
+        start, end = payload.get('start'), payload.get('end')
+        try:
+            start_idx = resolve_month(gen, start)
+            end_idx = resolve_month(gen, end) if end is not None else start_idx
+        except ValueError as e:
+            return jsonify({'error': str(e), 'available_months': gen.forecast_months}), 400
+        if start_idx is None or end_idx is None:
+            return jsonify({'error': 'Invalid or out-of-range month', 'available_months': gen.forecast_months}), 400
+        if end_idx < start_idx:
+            return jsonify({'error': 'end month is before start month'}), 400
+
+        wanted = payload.get('medicines')
+        if isinstance(wanted, str):
+            wanted = [wanted]
+        if wanted is not None and (not isinstance(wanted, list) or not all(isinstance(m, str) for m in wanted)):
+            return jsonify({'error': 'medicines must be a string or a list of strings'}), 400
+        if wanted:
+            unknown = [med for med in wanted if med not in gen.medicine_row_map]
+            selected = [med for med in wanted if med in gen.medicine_row_map]
+        else:
+            unknown = []
+            selected = gen.medicine_catalog
 
         results = []
-        for med in medicine_catalog:
-            model = demand_models.get(med)
-            if model:
-                pred = model.predict(np.array([[idx]]))[0]
-                pred = float(max(0, round(pred)))
+        for med in selected:
+            row = gen.medicine_row_map[med]
+            values = gen.demand_forecast[row, start_idx:end_idx + 1]
+            if gen.demand_forecast_trained[row]:
+                values = [float(v) for v in values]
             else:
-                pred = None
-                try:
-                    df = pd.read_csv(demand_csv)
-                    pred = int(df[df['medicine'] == med]['demand'].mean())
-                except Exception:
-                    pred = 50
-            results.append({'medicine': med, 'predicted_demand': pred})
-        return jsonify({'month': month, 'predictions': results})
+                values = [int(v) for v in values]
+            results.append({'medicine': med, 'predicted_demand': values})
+        return jsonify({
+            'start': gen.forecast_months[start_idx],
+            'end': gen.forecast_months[end_idx],
+            'months': gen.forecast_months[start_idx:end_idx + 1],
+            'predictions': results,
+            'unknown_medicines': unknown,
+            'model_version': gen.version
+        })
     except Exception as e:
         traceback.print_exc()
         return jsonify({'error': str(e)}), 500
@@ -297,22 +870,23 @@ def predict_demand():
 @app.route('/api/predict/disease', methods=['POST'])
 def predict_disease_trends():
     try:
+        gen = registry.current()
         payload = request.get_json(force=True, silent=True) or {}
         month = payload.get('month')
-        idx = parse_month_to_index(month, months_index_map)
+        try:
+            idx = resolve_month(gen, month)
+        except ValueError as e:
+            return jsonify({'error': str(e), 'available_months': gen.forecast_months}), 400
         if idx is None:
-            return jsonify({'error': 'Invalid or out-of-range month', 'available_months': months_list}), 400
+            return jsonify({'error': 'Invalid or out-of-range month', 'available_months': gen.forecast_months}), 400
 
-        results = []
-        for dis in disease_catalog:
-            model = disease_models.get(dis)
-            if model:
-                pred = model.predict(np.array([[idx]]))[0]
-                pred = float(max(0, round(pred)))
-            else:
-                pred = 20
-            results.append({'disease': dis, 'predicted_cases': pred})
-        return jsonify({'month': month, 'predictions': results})
+        def build():
+            results = [
+                {'disease': dis, 'predicted_cases': forecast_value(gen.disease_forecast, gen.disease_forecast_trained, row, idx)}
+                for row, dis in enumerate(gen.disease_catalog)
+            ]
+            return {'predictions': results, 'model_version': gen.version}
+        return cached_json(gen, 'predict_disease', idx, build, echo={'month': month})
     except Exception as e:
         traceback.print_exc()
         return jsonify({'error': str(e)}), 500
@@ -320,56 +894,289 @@ def predict_disease_trends():
 @app.route('/api/predict/risk', methods=['POST'])
 def predict_risk():
     try:
+        started = time.perf_counter()
+        gen = registry.current()
         payload = request.get_json(force=True, silent=True) or {}
-        df_in = pd.DataFrame([{
-            'age': float(payload.get('age', 50)),
-            'isSmoker': bool(payload.get('isSmoker', False)),
-            'hr': float(payload.get('hr', 75)),
-            'bp': payload.get('bp', '120/80'),
-            'condition': payload.get('condition', 'None')
-        }])
-        def bp_flag(bp):
-            try:
-                s = str(bp)
-                s_sys = int(s.split('/')[0])
-                s_dia = int(s.split('/')[1])
-                return 1 if (s_sys > 140 or s_dia > 90) else 0
-            except:
-                return 0
-        X = pd.DataFrame()
-        X['age'] = df_in['age']
-        X['isSmoker'] = df_in['isSmoker'].astype(int)
-        X['hr'] = df_in['hr']
-        X['high_bp'] = df_in['bp'].apply(bp_flag)
-        X['condition'] = df_in['condition']
-
-        if risk_pipeline:
-            prob = float(risk_pipeline.predict_proba(X)[0][1])
+        age = float(payload.get('age', 50))
+        is_smoker = int(bool(payload.get('isSmoker', False)))
+        hr = float(payload.get('hr', 75))
+        high_bp = bp_is_high(payload.get('bp', '120/80'))
+        # a JSON null is the 'None' condition on every path, as in the batch endpoint
+        condition = condition_value(payload.get('condition'))
+        features_done = time.perf_counter()
+        PREDICT_STAGE_SECONDS.labels('predict_risk', 'features').observe(features_done - started)
+        inference = PREDICT_STAGE_SECONDS.labels('predict_risk', 'inference')
+
+        if gen.risk_pipeline:
+            if risk_coalescer is not None:
+                prob = risk_coalescer.submit((gen, age, is_smoker, hr, high_bp, condition))
+            elif gen.risk_scorer is not None:
+                # compiled path: dict lookup + dot product, no pandas / sklearn dispatch
+                prob = gen.risk_scorer.score(age, is_smoker, hr, high_bp, condition)
+            else:
+                X = pd.DataFrame([{'age': age, 'isSmoker': is_smoker, 'hr': hr,
+                                   'high_bp': high_bp, 'condition': condition}])
+                prob = float(gen.risk_pipeline.predict_proba(X)[0][1])
+            inference.observe(time.perf_counter() - features_done)
             pred = int(prob > 0.5)
-            return jsonify({'explanation': 'logistic risk probability (trained on synthetic data)', 'risk_score': prob, 'risk_flag': pred})
+            return jsonify({'explanation': 'logistic risk probability (trained on synthetic data)', 'risk_score': prob, 'risk_flag': pred, 'model_version': gen.version})
         else:
             score = 0.0
-            score += X['age'].iloc[0] / 100.0
-            score += 0.8 if X['isSmoker'].iloc[0] else 0.0
-            score += 1.2 if X['high_bp'].iloc[0] else 0.0
-            score += 1.5 if X['condition'].iloc[0] != 'None' else 0.0
+            score += age / 100.0
+            score += 0.8 if is_smoker else 0.0
+            score += 1.2 if high_bp else 0.0
+            score += 1.5 if condition != 'None' else 0.0
             prob = min(0.99, score / 6.0)
-            return jsonify({'explanation': 'rule based fallback', 'risk_score': float(prob), 'risk_flag': int(prob > 0.5)})
+            inference.observe(time.perf_counter() - features_done)
+            return jsonify({'explanation': 'rule based fallback', 'risk_score': float(prob), 'risk_flag': int(prob > 0.5), 'model_version': gen.version})
+    except Exception as e:
+        traceback.print_exc()
+        return jsonify({'error': str(e)}), 500
+
+# max patients per predict_proba call in the batch endpoint (bounds peak memory)
+RISK_BATCH_CHUNK_SIZE = int(os.environ.get('RISK_BATCH_CHUNK_SIZE', 5000))
+# marks a JSON patient that sent no id (as opposed to "id": null)
+_NO_ID = object()
+
+@app.route('/api/predict/risk/batch', methods=['POST'])
+def predict_risk_batch():
+    """
+    Score many patients in one call. Accepts a JSON array of patient objects (or
+    {"patients": [...]}) or a CSV upload in the `file` form field with the same
+    columns (age, isSmoker, hr, bp, condition; an optional id column is echoed back).
+    Results come back in input order. ?chunk_size=N overrides RISK_BATCH_CHUNK_SIZE.
+    """
+    try:
+        gen = registry.current()
+        try:
+            chunk_size = int(request.args.get('chunk_size', RISK_BATCH_CHUNK_SIZE))
+        except ValueError:
+            return jsonify({'error': 'chunk_size must be an integer'}), 400
+        chunk_size = max(1, chunk_size)
+
+        if 'file' in request.files:
+            f = request.files['file']
+            if f.filename == '':
+                return jsonify({'error': 'No selected file'}), 400
+            records = None
+            try:
+                # ids are echoed back exactly as written, not parsed into floats
+                source = pd.read_csv(f.stream, chunksize=chunk_size, dtype={'id': object})
+            except (pd.errors.EmptyDataError, pd.errors.ParserError) as e:
+                return jsonify({'error': f'Could not read the CSV upload: {e}'}), 400
+        else:
+            payload = request.get_json(force=True, silent=True)
+            if isinstance(payload, dict):
+                payload = payload.get('patients')
+            if not isinstance(payload, list) or not all(isinstance(p, dict) for p in payload):
+                return jsonify({'error': 'Expected a JSON array of patient objects or a CSV file upload'}), 400
+            records = source = payload
+
+        results = []
+        chunks = 0
+        try:
+            for chunk in iter_chunks(source, chunk_size):
+                if chunk.empty:
+                    continue
+                probs = score_features(gen.risk_pipeline, build_risk_features(chunk), gen.risk_scorer)
+                if records is not None:
+                    # each caller's own id value (and only where it sent one), not the frame's
+                    # NaN-padded float column
+                    start = len(results)
+                    ids = [p.get('id', _NO_ID) for p in records[start:start + len(chunk)]]
+                elif 'id' in chunk.columns:
+                    ids = chunk['id'].astype(object).where(chunk['id'].notna(), None).tolist()
+                else:
+                    ids = None
+                for i, prob in enumerate(probs.tolist()):
+                    item = {'risk_score': prob, 'risk_flag': int(prob > 0.5)}
+                    if ids is not None and ids[i] is not _NO_ID:
+                        item['id'] = ids[i]
+                    results.append(item)
+                chunks += 1
+        except pd.errors.ParserError as e:
+            return jsonify({'error': f'Could not read the CSV upload: {e}'}), 400
+
+        explanation = ('logistic risk probability (trained on synthetic data)'
+                       if gen.risk_pipeline else 'rule based fallback')
+        return jsonify({
+            'explanation': explanation,
+            'count': len(results),
+            'chunks': chunks,
+            'results': results,
+            'model_version': gen.version
+        })
     except Exception as e:
         traceback.print_exc()
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/analytics/metadata', methods=['GET'])
 def analytics_metadata():
-    return jsonify({
-        'medicines': medicine_catalog,
-        'diseases': disease_catalog,
-        'months': months_list
-    })
+    gen = registry.current()
+    def build():
+        return {
+            'medicines': gen.medicine_catalog,
+            'diseases': gen.disease_catalog,
+            'months': gen.months_list,
+            'forecast_months': gen.forecast_months,
+            'storage': 'columnar' if USE_COLUMNAR_STORE else 'csv',
+            'forecast_engine': gen.forecast_engine,
+            'model_version': gen.version,
+        }
+    # the artifact info can change within a generation (it is saved after publishing)
+    # and the generation age changes on every call
+    return cached_json(gen, 'metadata', None, build,
+                       echo={'model_artifact': model_artifact_info},
+                       live={'model_generation': gen.info()})
+
+@app.route('/api/analytics/training_report', methods=['GET'])
+def analytics_training_report():
+    """Timings of the last train_models() run; ?per_entity=1 includes per-entity fit seconds."""
+    include_entities = request.args.get('per_entity') in ('1', 'true', 'yes')
+    gen = registry.current()
+    out = {'model_version': gen.version}
+    for phase, rep in gen.training_report.items():
+        if isinstance(rep, dict) and not include_entities:
+            rep = {k: v for k, v in rep.items() if k != 'per_entity_seconds'}
+        out[phase] = rep
+    return jsonify(out)
 
 # -------------------------
 # New: event ingestion endpoints (you already added earlier)
 # -------------------------
+# Event logs are appended through EventLogWriter: one flock-protected write per batch,
+# safe with several gunicorn workers. INGEST_FLUSH_INTERVAL_MS > 0 turns on group
+# commit (batches from many requests are buffered and flushed together);
+# INGEST_FSYNC is never / always / interval (at most every INGEST_FSYNC_INTERVAL_MS).
+INGEST_FLUSH_INTERVAL_MS = float(os.environ.get('INGEST_FLUSH_INTERVAL_MS', 0))
+INGEST_FSYNC = os.environ.get('INGEST_FSYNC', 'never').strip().lower()
+if INGEST_FSYNC not in FSYNC_POLICIES:
+    print(f"[analytics] Unknown INGEST_FSYNC {INGEST_FSYNC!r}, using 'never'")
+    INGEST_FSYNC = 'never'
+INGEST_FSYNC_INTERVAL_MS = float(os.environ.get('INGEST_FSYNC_INTERVAL_MS', 1000))
+
+DEMAND_EVENT_FIELDS = ['timestamp', 'month', 'medicine', 'quantity', 'invoiceId']
+ADMISSION_EVENT_FIELDS = ['timestamp','admittedAt','patientName','age','gender','roomType','doctor','admissionId']
+
+demand_event_writer = EventLogWriter(
+    DEMAND_EVENTS_CSV, DEMAND_EVENT_FIELDS, INGEST_FLUSH_INTERVAL_MS, INGEST_FSYNC, INGEST_FSYNC_INTERVAL_MS)
+admission_event_writer = EventLogWriter(
+    ADMISSIONS_EVENTS_CSV, ADMISSION_EVENT_FIELDS, INGEST_FLUSH_INTERVAL_MS, INGEST_FSYNC, INGEST_FSYNC_INTERVAL_MS)
+
+# Running totals of the demand events not merged yet, kept by tailing the event log
+# (so batches written by other workers are included). Snapshotted on shutdown and
+# restored on startup; the merge consumes it instead of re-reading the log.
+demand_aggregate = DemandAggregate(
+    DEMAND_EVENTS_CSV, os.path.join(EVENT_DATA_DIR, 'demand_aggregate.snapshot.json'))
+
+# Admission counts per hour / day / month and room type / doctor / gender, kept by
+# tailing the admissions log (rebuilt from it on startup) so window queries read a
+# few dozen buckets instead of the whole log.
+admissions_rollup = AdmissionsRollup(ADMISSIONS_EVENTS_CSV)
+# most buckets one ?bucket= series may return
+ADMISSIONS_MAX_SERIES_POINTS = int(os.environ.get('ADMISSIONS_MAX_SERIES_POINTS', 2000))
+WINDOW_UNIT_HOURS = {'h': 1, 'd': 24, 'w': 24 * 7}
+BUCKET_HOURS = {'hour': 1, 'day': 24, 'month': 24 * 28}
+
+metrics_registry.callback(
+    'analytics_event_log_bytes_total', 'Bytes appended to the event logs by this worker.', ['log'],
+    lambda: {('demand',): demand_event_writer.stats()['bytes_total'],
+             ('admissions',): admission_event_writer.stats()['bytes_total']}, kind='counter')
+
+@app.route('/api/analytics/ingest/stats', methods=['GET'])
+def analytics_ingest_stats():
+    """Ingestion throughput of this worker's event writers."""
+    return jsonify({
+        'demand': demand_event_writer.stats(),
+        'admissions': admission_event_writer.stats(),
+        'demand_aggregate': demand_aggregate.stats(),
+        'admissions_rollup': admissions_rollup.stats()
+    })
+
+@app.route('/api/analytics/demand/actual', methods=['GET'])
+def analytics_demand_actual():
+    """
+    Actual demand recorded since the last merge, per month and medicine.
+    Optional ?month=YYYY-MM and ?medicine= filters.
+    """
+    try:
+        demand_event_writer.flush()
+        demand_aggregate.refresh()
+        month = (request.args.get('month') or '').strip() or None
+        medicine = (request.args.get('medicine') or '').strip() or None
+        items = demand_aggregate.query(month, medicine)
+        by_month = {}
+        for m, _, q in items:
+            by_month[m] = by_month.get(m, 0) + q
+        return jsonify({
+            'actual': [{'month': m, 'medicine': med, 'quantity': q} for m, med, q in items],
+            'totals_by_month': by_month,
+            'events': demand_aggregate.stats()['events'],
+            'model_version': registry.current().version
+        })
+    except Exception as e:
+        traceback.print_exc()
+        return jsonify({'error': str(e)}), 500
+
+def parse_window_hours(text):
+    """'36h', '7d', '2w' -> hours."""
+    text = (text or '').strip().lower()
+    unit = WINDOW_UNIT_HOURS.get(text[-1:])
+    if unit is None or not text[:-1].isdigit() or int(text[:-1]) <= 0:
+        raise ValueError(f"window must look like 36h, 7d or 2w, got {text!r}")
+    return int(text[:-1]) * unit
+
+@app.route('/api/analytics/admissions/rollup', methods=['GET'])
+def analytics_admissions_rollup():
+    """
+    Admissions in a time window, broken down by ?by=roomType|doctor|gender|all.
+    The window is ?start=&end= (ISO times, end exclusive, default now) or the last
+    ?window=7d (h / d / w) before end; whole hours, UTC. ?bucket=hour|day|month adds a
+    per-bucket series.
+    """
+    try:
+        by = request.args.get('by', 'roomType')
+        if by not in ADMISSION_DIMENSIONS:
+            return jsonify({'error': f"by must be one of {', '.join(ADMISSION_DIMENSIONS)}"}), 400
+        try:
+            end_hour = hour_of(request.args.get('end') or datetime.utcnow(), ceil=True)
+            if request.args.get('start'):
+                start_hour = hour_of(request.args['start'])
+            else:
+                start_hour = end_hour - parse_window_hours(request.args.get('window', '7d'))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        if start_hour >= end_hour:
+            return jsonify({'error': 'start must be before end'}), 400
+        bucket = request.args.get('bucket')
+        if bucket and bucket not in BUCKET_HOURS:
+            return jsonify({'error': 'bucket must be hour, day or month'}), 400
+        if bucket and (end_hour - start_hour) // BUCKET_HOURS[bucket] > ADMISSIONS_MAX_SERIES_POINTS:
+            return jsonify({'error': f"more than {ADMISSIONS_MAX_SERIES_POINTS} {bucket} buckets; "
+                                     "narrow the window or use a coarser bucket"}), 400
+
+        admission_event_writer.flush()
+        admissions_rollup.refresh()
+        counts, buckets_read = admissions_rollup.window(by, start_hour, end_hour)
+        out = {
+            'by': by,
+            'start': bucket_label('hour', start_hour),
+            'end': bucket_label('hour', end_hour),
+            'hours': end_hour - start_hour,
+            'total': sum(counts.values()),
+            'counts': dict(sorted(counts.items())),
+            'buckets_read': buckets_read,
+            'events': admissions_rollup.stats()['events'],
+        }
+        if bucket:
+            out['bucket'] = bucket
+            out['series'] = [{'bucket': label, 'total': sum(c.values()), 'counts': dict(sorted(c.items()))}
+                             for label, c in admissions_rollup.series(by, start_hour, end_hour, bucket)]
+        return jsonify(out)
+    except Exception as e:
+        traceback.print_exc()
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/analytics/update', methods=['POST'])
 def analytics_update():
     try:
@@ -378,24 +1185,39 @@ def analytics_update():
 
         if ptype == 'demand_batch':
             events = payload.get('events', [])
-            written = 0
-            for ev in events:
-                row = {
-                    'timestamp': datetime.utcnow().isoformat(),
-                    'month': ev.get('month') or '',
-                    'medicine': ev.get('medicine') or '',
-                    'quantity': ev.get('quantity') or 0,
-                    'invoiceId': ev.get('invoiceId') or ''
-                }
-                headers = ['timestamp', 'month', 'medicine', 'quantity', 'invoiceId']
-                write_header = not os.path.exists(DEMAND_EVENTS_CSV)
-                with open(DEMAND_EVENTS_CSV, 'a', newline='', encoding='utf-8') as f:
-                    writer = csv.DictWriter(f, fieldnames=headers)
-                    if write_header:
-                        writer.writeheader()
-                    writer.writerow(row)
-                written += 1
-            return jsonify({'status': 'ok', 'written': written}), 200
+            now = datetime.utcnow().isoformat()
+            rows = [{
+                'timestamp': now,
+                'month': ev.get('month') or '',
+                'medicine': ev.get('medicine') or '',
+                'quantity': ev.get('quantity') or 0,
+                'invoiceId': ev.get('invoiceId') or ''
+            } for ev in events]
+            matched, unmatched = [], []
+            if payload.get('match', DEMAND_AUTO_MATCH):
+                gen = registry.current()
+                if gen is None:
+                    return models_loading_response()
+                for row in rows:
+                    med = row['medicine']
+                    if not med or med in gen.medicine_row_map:
+                        continue
+                    best = gen.medicine_matcher.best(med, MEDICINE_MATCH_THRESHOLD)
+                    if best is None:
+                        unmatched.append(med)
+                    else:
+                        row['medicine'] = best[0]
+                        matched.append({'input': med, 'medicine': best[0], 'score': best[1]})
+            # whole batch in one locked append (or queued for the next group commit)
+            written = demand_event_writer.append(rows)
+            INGEST_EVENTS.labels('demand').inc(len(rows))
+            if INGEST_FLUSH_INTERVAL_MS <= 0:
+                demand_aggregate.refresh()
+            out = {'status': 'ok', 'written': written, 'buffered': INGEST_FLUSH_INTERVAL_MS > 0}
+            if matched or unmatched:
+                out['matched'] = matched
+                out['unmatched'] = unmatched
+            return jsonify(out), 200
 
         if ptype == 'admission':
             row = {
@@ -408,18 +1230,14 @@ def analytics_update():
                 'doctor': payload.get('doctor') or '',
                 'admissionId': payload.get('admissionId') or ''
             }
-            headers = ['timestamp','admittedAt','patientName','age','gender','roomType','doctor','admissionId']
-            write_header = not os.path.exists(ADMISSIONS_EVENTS_CSV)
-            with open(ADMISSIONS_EVENTS_CSV, 'a', newline='', encoding='utf-8') as f:
-                writer = csv.DictWriter(f, fieldnames=headers)
-                if write_header:
-                    writer.writeheader()
-                writer.writerow(row)
+            admission_event_writer.append([row])
+            INGEST_EVENTS.labels('admission').inc()
             return jsonify({'status': 'ok'}), 200
 
         raw_path = os.path.join(EVENT_DATA_DIR, 'raw_events.log')
         with open(raw_path, 'a', encoding='utf-8') as f:
             f.write(f"{datetime.utcnow().isoformat()} {payload}\n")
+        INGEST_EVENTS.labels('raw').inc()
         return jsonify({'status': 'ok', 'note': 'stored raw'}), 200
 
     except Exception as e:
@@ -429,52 +1247,312 @@ def analytics_update():
 # -------------------------
 # New: merge events and retrain
 # -------------------------
+def merge_and_retrain(force_full=False):
+    """
+    Merge demand events into the main demand CSV, archive events file, then retrain
+    models. Runs on the registry's background worker; the new generation is built off
+    to the side and published in one swap at the end.
+    """
+    # one merge at a time across gunicorn workers: merges are the only writers of the
+    # demand history, so the fingerprints taken around ours see no one else's rows
+    with artifact_lock(MODEL_ARTIFACT_DIR):
+        return _merge_and_retrain(force_full)
+
+def _merge_and_retrain(force_full):
+    merged = 0
+    quarantined = 0
+    combined = None
+    touched_groups = []
+    # what the data looked like before this merge: another worker may have merged and
+    # retrained since this worker's generation was built, and then that generation is
+    # no base to apply only our own events to
+    base_fingerprint = current_fingerprint()
+    # If demand events exists, append them to main demand_csv in required format:
+    # expected columns in demand_csv: month,medicine,demand (or similar)
+    # move the events file aside first (under the writers' file lock) so events that
+    # arrive while we merge land in a fresh file instead of being archived unread
+    archive = DEMAND_EVENTS_CSV + f".processed.{datetime.utcnow().strftime('%Y%m%d%H%M%S')}"
+    # the running aggregate already holds the (month, medicine) sums; draining it only
+    # parses whatever it hadn't seen yet
+    totals = demand_aggregate.rotate_and_drain(demand_event_writer, archive)
+    if totals is not None:
+        agg = pd.DataFrame([(m, med, q) for (m, med), q in sorted(totals.items())],
+                           columns=['month', 'medicine', 'quantity'])
+        if USE_COLUMNAR_STORE:
+            # demand_store.append() quarantines months that can't name a partition
+            # ('2025/12', '../x'); they are not merged history, so don't report them as such
+            bad = ~partition_values(agg['month']).map(valid_partition_value).astype(bool)
+            quarantined = int(bad.sum())
+        touched_groups = list(zip(agg['month'].astype(str), agg['medicine']))
+        agg2 = agg.rename(columns={'quantity':'demand'})
+        agg2 = agg2[['month','medicine','demand']]
+        if USE_COLUMNAR_STORE:
+            # rewrite only the month partitions the new aggregates fall in
+            demand_store.append(agg2)
+            combined = load_demand_frame()
+            if quarantined:
+                touched_groups = [tg for tg, ok in zip(touched_groups, ~bad) if ok]
+        # ensure demand_csv exists: if not, create with header
+        elif os.path.exists(demand_csv):
+            base_df = pd.read_csv(demand_csv)
+            # append aggregated rows (rename quantity -> demand)
+            combined = pd.concat([base_df, agg2], ignore_index=True, sort=False)
+            combined.to_csv(demand_csv, index=False)
+        else:
+            # produce a minimal demand_csv with header month,medicine,demand
+            agg2.to_csv(demand_csv, index=False)
+        merged = len(agg) - quarantined
+    # admission events are not merged: no model trains on them, the admissions rollup
+    # serves them straight from their log
+
+    # Retrain only what the merge touched; fall back to a full retrain when the
+    # change can't be applied incrementally (or the caller asks for it)
+    t0 = time.perf_counter()
+    gen = registry.current()
+    total_models = len(gen.demand_models) + len(gen.disease_models) + (1 if gen.risk_pipeline else 0)
+    state, stats = None, None
+    base_current = gen.state.get('data_fingerprint') == base_fingerprint
+    if not force_full and base_current and combined is not None:
+        state, stats = retrain_demand_incremental(gen, combined, {med for _, med in touched_groups})
+        if state is not None:
+            state['data_fingerprint'] = current_fingerprint()
+    elif not force_full and base_current and merged == 0:
+        stats = {'refit_models': 0, 'reused_models': total_models, 'refit_medicines': []}
+
+    if state is not None:
+        mode = 'incremental'
+        gen = registry.publish(state, 'incremental')
+    elif stats is not None:
+        mode = 'incremental'
+    else:
+        mode = 'full'
+        gen = train_models()
+        total_models = len(gen.demand_models) + len(gen.disease_models) + (1 if gen.risk_pipeline else 0)
+        stats = {'refit_models': total_models, 'reused_models': 0, 'refit_medicines': list(gen.medicine_catalog)}
+    retrain_seconds = time.perf_counter() - t0
+    # persist for the next restart
+    if merged or mode == 'full':
+        save_models(gen)
+
+    return {
+        'status': 'ok',
+        'merged_demand_groups': merged,
+        'quarantined_demand_groups': quarantined,
+        'touched_groups': [{'month': m, 'medicine': med} for m, med in touched_groups],
+        'retrain_mode': mode,
+        'refit_models': stats['refit_models'],
+        'reused_models': stats['reused_models'],
+        'refit_medicines': stats['refit_medicines'],
+        'retrain_seconds': round(retrain_seconds, 6),
+        'model_version': gen.version,
+        'medicines': gen.medicine_catalog,
+        'months_count': len(gen.months_list)
+    }
+
 @app.route('/api/analytics/merge_and_retrain', methods=['POST'])
 def analytics_merge_and_retrain():
     """
-    Merge demand events into the main demand CSV, archive events file, then retrain models.
+    Queue a merge + retrain job and return its id right away (202). Poll
+    /api/analytics/jobs/<job_id> for the result. Pass {"wait": true} to block until
+    the job finishes and get the result inline (the old synchronous behaviour).
     """
     try:
-        merged = 0
-        # If demand events exists, append them to main demand_csv in required format:
-        # expected columns in demand_csv: month,medicine,demand (or similar)
-        if os.path.exists(DEMAND_EVENTS_CSV):
-            # read events
-            ev_df = pd.read_csv(DEMAND_EVENTS_CSV)
-            # group by month & medicine to sum quantities
-            agg = ev_df.groupby(['month','medicine'], as_index=False)['quantity'].sum()
-            # ensure demand_csv exists: if not, create with header
-            if os.path.exists(demand_csv):
-                base_df = pd.read_csv(demand_csv)
-                # append aggregated rows (rename quantity -> demand)
-                agg2 = agg.rename(columns={'quantity':'demand'})
-                agg2 = agg2[['month','medicine','demand']]
-                combined = pd.concat([base_df, agg2], ignore_index=True, sort=False)
-                combined.to_csv(demand_csv, index=False)
-            else:
-                # produce a minimal demand_csv with header month,medicine,demand
-                agg2 = agg.rename(columns={'quantity':'demand'})
-                agg2 = agg2[['month','medicine','demand']]
-                agg2.to_csv(demand_csv, index=False)
-            merged = len(agg)
-            # archive events file
-            archive = DEMAND_EVENTS_CSV + f".processed.{datetime.utcnow().strftime('%Y%m%d%H%M%S')}"
-            shutil.move(DEMAND_EVENTS_CSV, archive)
-        # TODO: you can similarly merge admissions/events into other CSVs if desired
-
-        # Retrain models from current CSVs
-        train_models()
-
+        payload = request.get_json(force=True, silent=True) or {}
+        force_full = str(payload.get('full', '')).lower() in ('1', 'true', 'yes')
+        wait = str(payload.get('wait', '')).lower() in ('1', 'true', 'yes')
+        job_id = registry.submit('merge_and_retrain', lambda: merge_and_retrain(force_full))
+        if wait:
+            job = registry.wait(job_id)
+            if job['status'] == 'failed':
+                return jsonify({'error': job['error'], 'job_id': job_id}), 500
+            return jsonify(dict(job['result'], job_id=job_id)), 200
         return jsonify({
-            'status': 'ok',
-            'merged_demand_groups': merged,
-            'medicines': medicine_catalog,
-            'months_count': len(months_list)
-        }), 200
+            'status': 'queued',
+            'job_id': job_id,
+            'status_url': f"/api/analytics/jobs/{job_id}",
+            'model_version': registry.current().version
+        }), 202
+    except Exception as e:
+        traceback.print_exc()
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/analytics/store/compact', methods=['POST'])
+def analytics_store_compact():
+    """Fold processed demand-event archives into the month-partitioned events store."""
+    try:
+        if not USE_COLUMNAR_STORE:
+            return jsonify({'error': 'columnar store is disabled (COLUMNAR_STORE=0 or pyarrow missing)'}), 400
+        demand_event_writer.flush()
+        summary = compact_event_archives(DEMAND_EVENTS_CSV, events_store)
+        return jsonify(dict(summary, status='ok')), 200
     except Exception as e:
         traceback.print_exc()
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/analytics/jobs/<job_id>', methods=['GET'])
+def analytics_job_status(job_id):
+    job = registry.job(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown job id'}), 404
+    gen = registry.current()
+    return jsonify(dict(job, current_model_version=gen.version if gen is not None else None))
+
+# -------------------------
+# On-demand request profiling (off unless configured). With PROFILE_ADMIN_TOKEN set, a
+# request to one of PROFILE_ROUTES sending "X-Profile: 1" and "X-Profile-Token: <token>"
+# is profiled; PROFILE_SAMPLE_EVERY=N also profiles every Nth matching request.
+# Captures (pstats + collapsed stacks for flamegraphs) go to PROFILE_DIR, newest
+# PROFILE_KEEP kept, and are listed / downloaded through /api/admin/profiles with the
+# same token. Neither setting -> no hooks are installed at all.
+# -------------------------
+PROFILE_ADMIN_TOKEN = os.environ.get('PROFILE_ADMIN_TOKEN', '')
+PROFILE_SAMPLE_EVERY = int(os.environ.get('PROFILE_SAMPLE_EVERY', 0))
+PROFILE_DIR = os.environ.get('PROFILE_DIR') or os.path.join(EVENT_DATA_DIR, 'profiles')
+PROFILE_KEEP = int(os.environ.get('PROFILE_KEEP', 50))
+PROFILE_ROUTES = [r.strip() for r in os.environ.get('PROFILE_ROUTES', '/api/predict/,/api/invoice/parse').split(',')]
+PROFILE_SAMPLE_INTERVAL_MS = float(os.environ.get('PROFILE_SAMPLE_INTERVAL_MS', 2.0))
+
+request_profiler = RequestProfiler(PROFILE_DIR, PROFILE_KEEP, PROFILE_SAMPLE_EVERY, PROFILE_ADMIN_TOKEN,
+                                   PROFILE_ROUTES, PROFILE_SAMPLE_INTERVAL_MS)
+PROFILES_CAPTURED = metrics_registry.counter(
+    'analytics_profiles_captured_total', 'Requests profiled, by what triggered the capture.', ['trigger'])
+request_profiler.on_capture = lambda meta: PROFILES_CAPTURED.labels(meta['trigger']).inc()
+if request_profiler.install(app):
+    print("[analytics] Request profiling on:", request_profiler.stats())
+
+def profile_admin_error():
+    """Error response unless the caller sent the profiling admin token."""
+    if not PROFILE_ADMIN_TOKEN:
+        return jsonify({'error': 'profiling admin is disabled (PROFILE_ADMIN_TOKEN is not set)'}), 403
+    supplied = request.headers.get('X-Profile-Token')
+    if not request_profiler.authorized(supplied):
+        return jsonify({'error': 'invalid or missing X-Profile-Token'}), 403
+    return None
+
+@app.route('/api/admin/profiles', methods=['GET'])
+def admin_profiles():
+    """Captured profiles of this worker's profile directory, newest first."""
+    denied = profile_admin_error()
+    if denied:
+        return denied
+    profiles = request_profiler.list()
+    for meta in profiles:
+        meta['files'] = {kind: f"/api/admin/profiles/{meta['id']}/{kind}"
+                         for kind in PROFILE_KINDS if request_profiler.path(meta['id'], kind)}
+    return jsonify({'profiles': profiles, 'profiler': request_profiler.stats()})
+
+@app.route('/api/admin/profiles/<profile_id>/<kind>', methods=['GET'])
+def admin_profile_file(profile_id, kind):
+    """Download one capture: kind is pstats, collapsed (flamegraph input) or json."""
+    denied = profile_admin_error()
+    if denied:
+        return denied
+    path = request_profiler.path(profile_id, kind)
+    if path is None:
+        return jsonify({'error': 'Unknown profile or kind', 'kinds': list(PROFILE_KINDS)}), 404
+    return send_file(path, mimetype=PROFILE_KINDS[kind], as_attachment=True,
+                     download_name=os.path.basename(path))
+
+# -------------------------
+# Warm-up: bootstrapping the stores, catching the demand aggregate up and loading (or
+# training) the models run as the first job on the registry's background worker, so
+# the module loads fast, the port is bound and /healthz answers straight away; merge
+# jobs queue up behind it. Routes that need models answer 503 until /readyz is 200.
+# ANALYTICS_WARMUP=sync does all of it during the import instead (scripts,
+# benchmarks, or gunicorn --preload, whose master can't hand threads to workers).
+# -------------------------
+ANALYTICS_WARMUP = os.environ.get('ANALYTICS_WARMUP', 'background').lower()
+
+# endpoints that work before the first generation is published
+MODEL_FREE_ENDPOINTS = {
+    'healthz', 'readyz', 'static', 'prometheus_metrics', 'admin_profiles', 'admin_profile_file',
+    'analytics_update', 'analytics_ingest_stats', 'analytics_coalescer_stats', 'analytics_job_status',
+}
+
+warmup_job_id = None
+
+def warm_up():
+    with startup.phase('stores'):
+        bootstrap_stores()
+    with startup.phase('demand_aggregate'):
+        source = demand_aggregate.load()
+    print(f"[analytics] Demand aggregate loaded from {source}:", demand_aggregate.stats()['groups'], "groups")
+    with startup.phase('admissions_rollup'):
+        admissions_rollup.load()
+    print("[analytics] Admissions rollup rebuilt:", admissions_rollup.stats()['events'], "events")
+    with startup.phase('models'):
+        gen = load_or_train_models()
+    startup.details['models'] = dict(model_artifact_info)
+    if gen.source == 'trained':
+        startup.details['training'] = {phase: rep['wall_seconds'] for phase, rep in gen.training_report.items()
+                                       if isinstance(rep, dict) and 'wall_seconds' in rep}
+    startup.ready()
+    print("Analytics service: models trained/loaded.", model_artifact_info.get('source'), "generation", gen.version)
+    print("Medicines:", len(gen.medicine_catalog), "Diseases:", len(gen.disease_catalog),
+          "Months:", len(gen.months_list))
+    print("[analytics] Start-up:", startup.report())
+    return {'status': 'ready', 'model_version': gen.version, 'startup': startup.report()}
+
+def wait_until_ready(timeout=None):
+    """Block until the warm-up job has finished; True when a generation is being served."""
+    if warmup_job_id is not None:
+        registry.wait(warmup_job_id, timeout)
+    return registry.current() is not None
+
+def warmup_status():
+    if registry.current() is not None:
+        return 'ready'
+    job = registry.job(warmup_job_id) if warmup_job_id else None
+    if job is not None and job['status'] == 'failed':
+        return 'failed'
+    return 'starting'
+
+def models_loading_response():
+    job = registry.job(warmup_job_id) if warmup_job_id else None
+    resp = jsonify({'error': 'models are still loading', 'status': warmup_status(),
+                    'warmup_error': job['error'] if job else None})
+    resp.status_code = 503
+    resp.headers['Retry-After'] = '5'
+    return resp
+
+@app.before_request
+def _require_models():
+    if registry.current() is not None:
+        return None
+    endpoint = request.endpoint or ''
+    if endpoint in MODEL_FREE_ENDPOINTS or endpoint.startswith('invoice_') or request.url_rule is None:
+        return None
+    return models_loading_response()
+
+@app.route('/healthz', methods=['GET'])
+def healthz():
+    """Liveness: the process is up and serving requests (models may still be loading)."""
+    return jsonify({'status': 'ok', 'pid': os.getpid(),
+                    'uptime_seconds': round(time.time() - startup.started_at, 3)})
+
+@app.route('/readyz', methods=['GET'])
+def readyz():
+    """Readiness: 200 once a model generation is being served, 503 while warming up (or if that failed)."""
+    status = warmup_status()
+    out = {'status': status, 'startup': startup.report()}
+    gen = registry.current()
+    if gen is not None:
+        out['model_generation'] = gen.info()
+    job = registry.job(warmup_job_id) if warmup_job_id else None
+    if job is not None:
+        out['warmup_job'] = {k: job[k] for k in ('id', 'status', 'started_at', 'finished_at', 'error')}
+    return jsonify(out), 200 if status == 'ready' else 503
+
+# a training pool worker started with forkserver/spawn re-imports the script that was
+# run (python app.py) as __mp_main__; it must not load data and train models itself
+if __name__ == '__mp_main__':
+    pass
+elif ANALYTICS_WARMUP == 'sync':
+    warm_up()
+else:
+    warmup_job_id = registry.submit('warmup', warm_up)
+startup.serving()
+
 if __name__ == '__main__':
     port = int(os.environ.get("PORT", 5001))
     app.run(host="0.0.0.0", port=port, debug=False)
\ No newline at end of file
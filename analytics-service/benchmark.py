@@ -0,0 +1,323 @@
+# analytics-service/benchmark.py
+"""
+Offline benchmark suite for the analytics service hot paths.
+
+The service modules, synthetic CSVs and sample PDFs are copied into a scratch
+directory and app.py is imported from there, so nothing under analytics-service/
+is touched. Scenarios:
+
+    train        build_model_state() at several synthetic catalog sizes
+    predict      /api/predict/{demand,disease,risk}: single-call latency and
+                 concurrent throughput through the Flask test client
+    ingest       /api/analytics/update demand_batch throughput
+    merge        /api/analytics/merge_and_retrain end to end (incremental and full)
+    parse        parse_pdf_with_camelot on the bundled sample invoices
+    forecast     forest vs seasonal engine on seasonal synthetic demand: fit time and
+                 error on the held-out last --holdout months
+
+    python benchmark.py --out bench.json
+    python benchmark.py --quick --baseline bench.json --fail-on-regression
+
+Results are JSON. Metrics ending in _ms / _seconds and the forecast errors (mae,
+smape_pct) are lower-is-better and metrics ending in _per_sec higher-is-better;
+--baseline compares those against an earlier run and lists everything that got
+worse by more than --tolerance (max_ms is reported but not compared).
+"""
+import argparse
+import glob
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+SERVICE_DIR = os.path.dirname(os.path.abspath(__file__))
+SAMPLE_PDFS = ('sample_invoice.pdf', 'invoice_sample.pdf')
+
+
+def _latency_stats(samples):
+    arr = np.asarray(samples) * 1000.0
+    return {
+        'calls': len(samples),
+        'mean_ms': round(float(arr.mean()), 4),
+        'p50_ms': round(float(np.percentile(arr, 50)), 4),
+        'p95_ms': round(float(np.percentile(arr, 95)), 4),
+        'max_ms': round(float(arr.max()), 4),
+    }
+
+
+def _timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    return samples
+
+
+def make_scratch():
+    """Copy the service into a temp dir so the benchmark never writes to the real data files."""
+    scratch = tempfile.mkdtemp(prefix='analytics-bench-')
+    for path in glob.glob(os.path.join(SERVICE_DIR, '*.py')) + glob.glob(os.path.join(SERVICE_DIR, '*.csv')):
+        shutil.copy(path, scratch)
+    for name in SAMPLE_PDFS:
+        if os.path.exists(os.path.join(SERVICE_DIR, name)):
+            shutil.copy(os.path.join(SERVICE_DIR, name), scratch)
+    os.makedirs(os.path.join(scratch, 'data'))
+    return scratch
+
+
+def import_app(scratch):
+    os.environ.setdefault('MODEL_ARTIFACTS', '0')
+    os.environ.setdefault('INVOICE_CACHE_MAX_MB', '0')
+    sys.path = [scratch] + [p for p in sys.path if os.path.abspath(p or '.') != SERVICE_DIR]
+    t0 = time.perf_counter()
+    import app
+    imported = time.perf_counter() - t0
+    if not app.wait_until_ready():
+        raise RuntimeError(f"analytics warm-up failed: {app.warmup_status()}")
+    return app, {'import_seconds': round(imported, 4),
+                 'import_and_train_seconds': round(time.perf_counter() - t0, 4)}
+
+
+def bench_train(app, sizes):
+    from training_engine import _synthetic_frame
+    out = {}
+    original = app.load_demand_frame
+    try:
+        for n in sizes:
+            frame, _ = _synthetic_frame(n)
+            app.load_demand_frame = lambda frame=frame: frame.copy()
+            t0 = time.perf_counter()
+            state = app.build_model_state()
+            wall = time.perf_counter() - t0
+            report = state['training_report']
+            out[f'skus_{n}'] = {
+                'wall_seconds': round(wall, 4),
+                'demand_fit_seconds': report.get('demand', {}).get('wall_seconds'),
+                'disease_fit_seconds': report.get('disease', {}).get('wall_seconds'),
+                'risk_seconds': report.get('risk', {}).get('wall_seconds'),
+            }
+    finally:
+        app.load_demand_frame = original
+    return out
+
+
+def bench_predict(app, repeat, threads, concurrent_calls):
+    gen = app.registry.current()
+    months = list(gen.forecast_months)
+    calls = {
+        'demand': ('/api/predict/demand', lambda i: {'month': months[i % len(months)]}),
+        'disease': ('/api/predict/disease', lambda i: {'month': months[i % len(months)]}),
+        'risk': ('/api/predict/risk', lambda i: {'age': 30 + i % 50, 'isSmoker': bool(i % 2), 'hr': 60 + i % 40,
+                                                 'bp': '150/95' if i % 3 == 0 else '120/80',
+                                                 'condition': ('None', 'Diabetes', 'Asthma')[i % 3]}),
+    }
+    out = {}
+    client = app.app.test_client()
+    for name, (url, payload) in calls.items():
+        for label, cache_size in (('', app.response_cache.max_entries), ('_uncached', 0)):
+            if label and name == 'risk':
+                continue  # risk responses are never cached
+            app.response_cache.max_entries = cache_size
+            app.response_cache.invalidate()
+            counter = iter(range(10 ** 9))
+
+            def call():
+                resp = client.post(url, json=payload(next(counter)))
+                assert resp.status_code == 200, resp.get_data(as_text=True)
+
+            call()  # warm-up
+            out[f'{name}{label}_single'] = _latency_stats(_timed(call, repeat))
+
+            def worker(n_calls):
+                local = app.app.test_client()
+                for i in range(n_calls):
+                    local.post(url, json=payload(i))
+
+            per_thread = max(1, concurrent_calls // threads)
+            t0 = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=threads) as pool:
+                list(pool.map(worker, [per_thread] * threads))
+            wall = time.perf_counter() - t0
+            out[f'{name}{label}_concurrent'] = {
+                'threads': threads,
+                'calls': per_thread * threads,
+                'wall_seconds': round(wall, 4),
+                'requests_per_sec': round(per_thread * threads / wall, 2),
+            }
+        app.response_cache.max_entries = app.RESPONSE_CACHE_SIZE
+    return out
+
+
+def bench_ingest(app, batches, batch_size):
+    gen = app.registry.current()
+    meds = list(gen.medicine_catalog)
+    month = gen.months_list[-1]
+    client = app.app.test_client()
+    samples = []
+    for b in range(batches):
+        events = [{'month': month, 'medicine': meds[(b * batch_size + i) % len(meds)], 'quantity': 1 + i % 7}
+                  for i in range(batch_size)]
+        t0 = time.perf_counter()
+        resp = client.post('/api/analytics/update', json={'type': 'demand_batch', 'events': events})
+        samples.append(time.perf_counter() - t0)
+        assert resp.status_code == 200, resp.get_data(as_text=True)
+    app.demand_event_writer.flush()
+    total = sum(samples)
+    return {'demand_batch': dict(_latency_stats(samples), batch_size=batch_size,
+                                 events_per_sec=round(batches * batch_size / total, 2))}
+
+
+def bench_merge(app):
+    client = app.app.test_client()
+    out = {}
+    for label, full in (('incremental', False), ('full', True)):
+        t0 = time.perf_counter()
+        resp = client.post('/api/analytics/merge_and_retrain', json={'wait': True, 'full': full})
+        wall = time.perf_counter() - t0
+        body = resp.get_json() or {}
+        assert resp.status_code == 200, body
+        out[label] = {
+            'wall_seconds': round(wall, 4),
+            'retrain_seconds': body.get('retrain_seconds'),
+            'retrain_mode': body.get('retrain_mode'),
+            'merged_demand_groups': body.get('merged_demand_groups'),
+        }
+    return out
+
+
+def bench_parse(scratch, repeat):
+    import invoice_service
+    out = {}
+    for name in SAMPLE_PDFS:
+        path = os.path.join(scratch, name)
+        if not os.path.exists(path):
+            continue
+        rows = invoice_service.parse_pdf_with_camelot(path)
+        stats = _latency_stats(_timed(lambda: invoice_service.parse_pdf_with_camelot(path), repeat))
+        out[name] = dict(stats, rows=len(rows))
+    return out
+
+
+def bench_forecast(sizes, holdout):
+    from seasonal_engine import compare_engines, seasonal_demand_frame
+    return {f'skus_{n}': compare_engines(seasonal_demand_frame(n), 'medicine', 'demand', holdout)
+            for n in sizes}
+
+
+def _metrics(results, prefix=''):
+    for key, value in results.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            yield from _metrics(value, name + '.')
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            yield name, value
+
+
+def compare(current, baseline, tolerance):
+    """Regressions (and improvements) of every comparable metric beyond `tolerance`."""
+    base = dict(_metrics(baseline.get('results', {})))
+    regressions, improvements = [], []
+    for name, value in _metrics(current.get('results', {})):
+        old = base.get(name)
+        if old in (None, 0) or name.endswith('max_ms'):
+            continue  # single worst samples are too noisy to gate on
+        if name.endswith(('_ms', '_seconds', '.mae', '.smape_pct')):
+            change = (value - old) / old
+        elif name.endswith('_per_sec'):
+            change = (old - value) / old
+        else:
+            continue
+        entry = {'metric': name, 'baseline': old, 'current': value, 'change': round(change, 4)}
+        if change > tolerance:
+            regressions.append(entry)
+        elif change < -tolerance:
+            improvements.append(entry)
+    return {'tolerance': tolerance, 'regressions': regressions, 'improvements': improvements}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the analytics service hot paths.')
+    parser.add_argument('--scenarios', nargs='+', default=['train', 'predict', 'ingest', 'merge', 'parse'],
+                        choices=['train', 'predict', 'ingest', 'merge', 'parse', 'forecast'])
+    parser.add_argument('--skus', type=int, nargs='+', default=[20, 200, 1000])
+    parser.add_argument('--repeat', type=int, default=200, help='calls per single-call latency measurement')
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--concurrent-calls', type=int, default=800)
+    parser.add_argument('--batches', type=int, default=50)
+    parser.add_argument('--batch-size', type=int, default=200)
+    parser.add_argument('--parse-repeat', type=int, default=5)
+    parser.add_argument('--holdout', type=int, default=6, help='months held out by the forecast scenario')
+    parser.add_argument('--quick', action='store_true', help='small sizes for a smoke run')
+    parser.add_argument('--out', help='write results JSON here (default: stdout)')
+    parser.add_argument('--baseline', help='earlier results JSON to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed relative slowdown')
+    parser.add_argument('--fail-on-regression', action='store_true')
+    parser.add_argument('--keep-scratch', action='store_true')
+    args = parser.parse_args()
+    if args.quick:
+        args.skus = [20, 200]
+        args.repeat, args.concurrent_calls, args.batches, args.parse_repeat = 30, 120, 10, 1
+
+    scratch = make_scratch()
+    app = None
+    try:
+        app, startup = import_app(scratch)
+        results = {'startup': startup}
+        if 'train' in args.scenarios:
+            results['train'] = bench_train(app, args.skus)
+        if 'predict' in args.scenarios:
+            results['predict'] = bench_predict(app, args.repeat, args.threads, args.concurrent_calls)
+        if 'ingest' in args.scenarios:
+            results['ingest'] = bench_ingest(app, args.batches, args.batch_size)
+        if 'merge' in args.scenarios:
+            results['merge'] = bench_merge(app)
+        if 'parse' in args.scenarios:
+            results['parse'] = bench_parse(scratch, args.parse_repeat)
+        if 'forecast' in args.scenarios:
+            results['forecast'] = bench_forecast(args.skus, args.holdout)
+    finally:
+        if not args.keep_scratch:
+            if app is not None:
+                # nothing to snapshot into once the scratch dir is gone
+                app.demand_aggregate.snapshot_path = None
+            shutil.rmtree(scratch, ignore_errors=True)
+
+    report = {
+        'meta': {
+            'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'args': vars(args),
+        },
+        'results': results,
+    }
+    exit_code = 0
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            report['comparison'] = compare(report, json.load(f), args.tolerance)
+        if args.fail_on_regression and report['comparison']['regressions']:
+            exit_code = 1
+
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+    if 'comparison' in report:
+        for entry in report['comparison']['regressions']:
+            print(f"REGRESSION {entry['metric']}: {entry['baseline']} -> {entry['current']} "
+                  f"({entry['change']:+.1%})", file=sys.stderr)
+    return exit_code
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,132 @@
+# analytics-service/coalescer.py
+"""
+Micro-batching for concurrent inference calls.
+
+Request threads call submit(item) and block. The first caller of a batch becomes
+its leader: it waits up to `window_ms` (or until `max_batch` items have joined),
+runs batch_fn once over every item and hands each caller its own result. Callers
+that arrive while a batch is running start the next one.
+"""
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+# upper bounds of the batch-size histogram buckets
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128)
+
+
+class _Pending:
+    __slots__ = ('item', 'event', 'result', 'error', 'enqueued')
+
+    def __init__(self, item):
+        self.item = item
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+        self.enqueued = time.perf_counter()
+
+
+class _Batch:
+    __slots__ = ('items', 'full')
+
+    def __init__(self):
+        self.items = []
+        self.full = threading.Event()
+
+
+class RequestCoalescer:
+    """
+    batch_fn(items) -> list of results, same length and order as items. An exception
+    from batch_fn is re-raised in every caller of that batch.
+    """
+
+    def __init__(self, batch_fn, window_ms=2.0, max_batch=32, name='coalescer'):
+        self.batch_fn = batch_fn
+        self.window = max(0.0, float(window_ms)) / 1000.0
+        self.max_batch = max(1, int(max_batch))
+        self.name = name
+        self._lock = threading.Lock()
+        self._open = None
+        self._stats_lock = threading.Lock()
+        self._batches = 0
+        self._requests = 0
+        self._size_counts = [0] * (len(BATCH_SIZE_BUCKETS) + 1)
+        self._delay_total = 0.0
+        self._delay_max = 0.0
+        self._recent_delays = deque(maxlen=2048)
+
+    def submit(self, item):
+        pending = _Pending(item)
+        with self._lock:
+            batch = self._open
+            leader = batch is None
+            if leader:
+                batch = self._open = _Batch()
+            batch.items.append(pending)
+            if len(batch.items) >= self.max_batch:
+                # close it so later arrivals start a fresh batch
+                self._open = None
+                batch.full.set()
+        if leader:
+            batch.full.wait(self.window)
+            with self._lock:
+                if self._open is batch:
+                    self._open = None
+            self._run(batch.items)
+        else:
+            pending.event.wait()
+        if pending.error is not None:
+            raise pending.error
+        return pending.result
+
+    def _run(self, items):
+        started = time.perf_counter()
+        try:
+            results = self.batch_fn([p.item for p in items])
+            if len(results) != len(items):
+                raise RuntimeError(f"{self.name}: batch_fn returned {len(results)} results for {len(items)} items")
+            for p, r in zip(items, results):
+                p.result = r
+        except Exception as e:
+            for p in items:
+                p.error = e
+        finally:
+            for p in items:
+                p.event.set()
+            self._record(items, started)
+
+    def _record(self, items, started):
+        delays = [started - p.enqueued for p in items]
+        size = len(items)
+        bucket = next((i for i, ub in enumerate(BATCH_SIZE_BUCKETS) if size <= ub), len(BATCH_SIZE_BUCKETS))
+        with self._stats_lock:
+            self._batches += 1
+            self._requests += size
+            self._size_counts[bucket] += 1
+            self._delay_total += sum(delays)
+            self._delay_max = max(self._delay_max, max(delays))
+            self._recent_delays.extend(delays)
+
+    def stats(self):
+        with self._stats_lock:
+            recent = list(self._recent_delays)
+            out = {
+                'name': self.name,
+                'window_ms': self.window * 1000.0,
+                'max_batch': self.max_batch,
+                'batches': self._batches,
+                'requests': self._requests,
+                'mean_batch_size': round(self._requests / self._batches, 3) if self._batches else 0.0,
+                'batch_size_histogram': {
+                    **{f"le_{ub}": n for ub, n in zip(BATCH_SIZE_BUCKETS, self._size_counts)},
+                    'gt_max': self._size_counts[-1],
+                },
+                'queue_delay_ms_mean': round(self._delay_total / self._requests * 1000.0, 4) if self._requests else 0.0,
+                'queue_delay_ms_max': round(self._delay_max * 1000.0, 4),
+            }
+        if recent:
+            out['queue_delay_ms_p50'] = round(float(np.percentile(recent, 50)) * 1000.0, 4)
+            out['queue_delay_ms_p99'] = round(float(np.percentile(recent, 99)) * 1000.0, 4)
+        return out
@@ -0,0 +1,231 @@
+# analytics-service/columnar_store.py
+"""
+Month-partitioned Parquet storage for demand history, disease trends and demand events.
+
+Layout (one directory per dataset):
+
+    data/store/demand/month=2025-10/part-0.parquet
+    data/store/demand/month=2025-11/part-0.parquet
+    ...
+
+The month lives in the directory name, not in the files. Appending rows rewrites
+only the partitions of the months they belong to; reads can ask for a subset of
+columns and months. Partition values must be a YYYY-MM month (or empty, which is
+stored as `unknown`): rows with anything else, e.g. '2025/12', '2025-13' or '../x'
+from an ingested event, are not written to a partition but appended to
+quarantine.csv in the dataset directory, so they can neither escape the store nor
+vanish silently. Needs pyarrow; callers check `columnar_available()` and keep using
+the CSVs when it isn't installed.
+
+    python columnar_store.py compact [--data-dir DIR]
+
+folds processed event archives (data/*.processed.<ts>) into the events dataset.
+"""
+import glob
+import hashlib
+import importlib.util
+import os
+import re
+import tempfile
+from contextlib import contextmanager
+
+import pandas as pd
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+PART_FILE = 'part-0.parquet'
+QUARANTINE_FILE = 'quarantine.csv'
+UNKNOWN_MONTH = 'unknown'
+_PARTITION_VALUE_RE = re.compile(r'^\d{4}-(0[1-9]|1[0-2])$')
+
+
+def valid_partition_value(value):
+    """True for YYYY-MM and the `unknown` partition; the value becomes a directory name."""
+    return value == UNKNOWN_MONTH or bool(_PARTITION_VALUE_RE.match(str(value)))
+
+
+def partition_values(series):
+    """`series` as the partition values append() stores (missing / empty -> unknown)."""
+    return series.fillna('').astype(str).replace('', UNKNOWN_MONTH)
+
+
+def columnar_available():
+    return importlib.util.find_spec('pyarrow') is not None
+
+
+def _arrow():
+    """pyarrow and pyarrow.parquet, imported on first use (they are slow to import)."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    return pa, pq
+
+
+class PartitionedStore:
+
+    def __init__(self, root, partition_col='month'):
+        self.root = root
+        self.partition_col = partition_col
+
+    # ---- layout helpers ----
+    def _partition_dir(self, value):
+        value = str(value) if value not in (None, '') and not pd.isna(value) else UNKNOWN_MONTH
+        if not valid_partition_value(value):
+            raise ValueError(f"invalid {self.partition_col} partition value {value!r}")
+        return os.path.join(self.root, f"{self.partition_col}={value}")
+
+    def partitions(self):
+        """Sorted partition values present on disk."""
+        if not os.path.isdir(self.root):
+            return []
+        prefix = f"{self.partition_col}="
+        out = []
+        for name in os.listdir(self.root):
+            value = name[len(prefix):]
+            if (name.startswith(prefix) and valid_partition_value(value)
+                    and os.path.exists(os.path.join(self.root, name, PART_FILE))):
+                out.append(value)
+        return sorted(out)
+
+    def is_empty(self):
+        return not self.partitions()
+
+    def fingerprint(self):
+        """Cheap change detector: partition names, sizes and mtimes (not contents)."""
+        h = hashlib.sha256()
+        for value in self.partitions():
+            path = os.path.join(self._partition_dir(value), PART_FILE)
+            st = os.stat(path)
+            h.update(f"{value}:{st.st_size}:{st.st_mtime_ns}|".encode())
+        return h.hexdigest()
+
+    @contextmanager
+    def _write_lock(self):
+        os.makedirs(self.root, exist_ok=True)
+        if fcntl is None:
+            yield
+            return
+        with open(os.path.join(self.root, '.lock'), 'a') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    # ---- reads ----
+    def read_partition(self, value, columns=None):
+        _, pq = _arrow()
+        path = os.path.join(self._partition_dir(value), PART_FILE)
+        table = pq.read_table(path, columns=[c for c in columns if c != self.partition_col] if columns else None)
+        df = table.to_pandas()
+        if columns is None or self.partition_col in columns:
+            df.insert(0, self.partition_col, str(value))
+        return df
+
+    def read(self, columns=None, partitions=None):
+        """
+        Concatenate the requested partitions (default: all), reading only `columns`
+        (the partition column is materialised from the directory name when asked for).
+        """
+        values = self.partitions() if partitions is None else [p for p in partitions if p in set(self.partitions())]
+        frames = [self.read_partition(v, columns) for v in values]
+        if not frames:
+            return pd.DataFrame(columns=columns or [self.partition_col])
+        return pd.concat(frames, ignore_index=True)
+
+    # ---- writes ----
+    def _write_partition(self, value, df):
+        pa, pq = _arrow()
+        part_dir = self._partition_dir(value)
+        os.makedirs(part_dir, exist_ok=True)
+        table = pa.Table.from_pandas(df.drop(columns=[self.partition_col]), preserve_index=False)
+        fd, tmp = tempfile.mkstemp(dir=part_dir, suffix='.tmp')
+        os.close(fd)
+        try:
+            pq.write_table(table, tmp)
+            os.replace(tmp, os.path.join(part_dir, PART_FILE))
+        finally:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+
+    @property
+    def quarantine_path(self):
+        return os.path.join(self.root, QUARANTINE_FILE)
+
+    def _quarantine(self, df):
+        path = self.quarantine_path
+        print(f"[columnar_store] {len(df)} rows with invalid {self.partition_col} values moved to {path}:",
+              sorted(df[self.partition_col].unique())[:10])
+        df.to_csv(path, mode='a', header=not os.path.exists(path), index=False)
+
+    def append(self, df):
+        """
+        Append rows, rewriting only the partitions they fall in. Rows whose partition
+        value is not valid go to quarantine.csv instead. Returns the partitions touched.
+        """
+        if df.empty:
+            return []
+        df = df.copy()
+        df[self.partition_col] = partition_values(df[self.partition_col])
+        touched = []
+        with self._write_lock():
+            valid = df[self.partition_col].map(valid_partition_value).astype(bool)
+            if not valid.all():
+                self._quarantine(df[~valid])
+                df = df[valid]
+            existing = set(self.partitions())
+            for value, part in df.groupby(self.partition_col, sort=True):
+                if value in existing:
+                    old = self.read_partition(value)
+                    part = pd.concat([old, part], ignore_index=True, sort=False)
+                self._write_partition(value, part)
+                touched.append(value)
+        return touched
+
+    def import_csv(self, csv_path):
+        """Bootstrap an empty store from a CSV that has a partition column. Returns rows imported."""
+        if not os.path.exists(csv_path):
+            return 0
+        df = pd.read_csv(csv_path)
+        self.append(df)
+        return len(df)
+
+
+def compact_event_archives(events_csv, events_store, remove=True):
+    """
+    Fold every processed archive of `events_csv` (events_csv + '.processed.<ts>') into
+    `events_store`, oldest first, and delete the archives. Returns a summary dict.
+    """
+    archives = sorted(glob.glob(events_csv + '.processed.*'))
+    rows = 0
+    partitions = set()
+    for path in archives:
+        try:
+            df = pd.read_csv(path, dtype={'month': str, 'invoiceId': str})
+        except pd.errors.EmptyDataError:
+            df = pd.DataFrame()
+        if not df.empty:
+            partitions.update(events_store.append(df))
+            rows += len(df)
+        if remove:
+            os.unlink(path)
+    return {'archives': len(archives), 'rows': rows, 'partitions': sorted(partitions)}
+
+
+if __name__ == '__main__':
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description='Maintenance for the analytics columnar store.')
+    parser.add_argument('command', choices=['compact'])
+    parser.add_argument('--data-dir', default=os.path.dirname(os.path.abspath(__file__)))
+    args = parser.parse_args()
+    if not columnar_available():
+        raise SystemExit('pyarrow is not installed')
+
+    event_dir = os.path.join(args.data_dir, 'data')
+    store = PartitionedStore(os.path.join(event_dir, 'store', 'events'))
+    summary = compact_event_archives(os.path.join(event_dir, 'synthetic_medicine_demand_events.csv'), store)
+    print(json.dumps(summary))
@@ -0,0 +1,193 @@
+# analytics-service/demand_aggregate.py
+"""
+Running (month, medicine) -> quantity totals of the demand events not merged yet.
+
+The aggregate tails the demand event log: refresh() parses only the bytes appended
+since the last call, so it picks up batches written by every gunicorn worker, not
+just this one. A snapshot (log inode + byte offset + totals) is written on shutdown
+and reused on startup, so only the tail of the log has to be parsed again. When the
+log is rotated away by a merge the totals are handed to the merge and reset.
+"""
+import atexit
+import csv
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+
+SNAPSHOT_VERSION = 1
+
+
+def _quantity(value):
+    try:
+        return int(value)
+    except ValueError:
+        return float(value)
+
+
+class DemandAggregate:
+
+    def __init__(self, path, snapshot_path=None):
+        self.path = path
+        self.snapshot_path = snapshot_path
+        self._lock = threading.Lock()
+        self._reset(None)
+        self._refreshes = 0
+        self._refresh_seconds = 0.0
+        if snapshot_path:
+            atexit.register(self.snapshot)
+
+    def _reset(self, inode):
+        self._totals = {}
+        self._inode = inode
+        self._offset = 0
+        self._header = None
+        self._events = 0
+        self._skipped = 0
+
+    # ---- startup / shutdown ----
+    def load(self):
+        """Restore the snapshot if it still describes the current log, then catch up on the tail."""
+        source = 'rebuild'
+        state = None
+        if self.snapshot_path and os.path.exists(self.snapshot_path):
+            try:
+                with open(self.snapshot_path, encoding='utf-8') as f:
+                    state = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"[demand_aggregate] ignoring unreadable snapshot {self.snapshot_path}:", e)
+        with self._lock:
+            try:
+                st = os.stat(self.path)
+            except FileNotFoundError:
+                st = None
+            if (state and state.get('version') == SNAPSHOT_VERSION and st is not None
+                    and state.get('inode') == st.st_ino and state.get('offset', 0) <= st.st_size):
+                self._inode = st.st_ino
+                self._offset = state['offset']
+                self._header = state.get('header')
+                self._events = state.get('events', 0)
+                self._skipped = state.get('skipped', 0)
+                self._totals = {(m, med): q for m, med, q in state.get('totals', [])}
+                source = 'snapshot'
+        self.refresh()
+        return source
+
+    def snapshot(self):
+        if not self.snapshot_path:
+            return
+        with self._lock:
+            state = {
+                'version': SNAPSHOT_VERSION,
+                'inode': self._inode,
+                'offset': self._offset,
+                'header': self._header,
+                'events': self._events,
+                'skipped': self._skipped,
+                'totals': [[m, med, q] for (m, med), q in self._totals.items()],
+                'written_at': time.time(),
+            }
+        directory = os.path.dirname(self.snapshot_path) or '.'
+        try:
+            fd, tmp = tempfile.mkstemp(dir=directory, suffix='.tmp')
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(state, f)
+            os.replace(tmp, self.snapshot_path)
+        except OSError as e:
+            print(f"[demand_aggregate] snapshot to {self.snapshot_path} failed:", e)
+
+    # ---- tailing ----
+    def refresh(self):
+        """Fold in whatever was appended to the log since the last call. Returns events added."""
+        t0 = time.perf_counter()
+        with self._lock:
+            try:
+                f = open(self.path, 'rb')
+            except FileNotFoundError:
+                # rotated by a merge and nothing written since: those events are history now
+                if self._inode is not None:
+                    self._reset(None)
+                return 0
+            with f:
+                added = self._consume(f)
+            self._refreshes += 1
+            self._refresh_seconds += time.perf_counter() - t0
+        return added
+
+    def rotate_and_drain(self, writer, archive):
+        """
+        Rotate the log through `writer` and return the totals of everything in it as
+        {(month, medicine): quantity}, or None if there was no log. The aggregate then
+        starts over on the fresh log.
+        """
+        with self._lock:
+            if not writer.rotate(archive):
+                return None
+            with open(archive, 'rb') as f:
+                self._consume(f)
+                totals = self._totals
+            self._reset(None)
+        return totals
+
+    def _consume(self, f):
+        st = os.fstat(f.fileno())
+        if st.st_ino != self._inode or st.st_size < self._offset:
+            # a different (rotated-in or truncated) file: start over from its first byte
+            self._reset(st.st_ino)
+        f.seek(self._offset)
+        data = f.read()
+        end = data.rfind(b'\n')
+        if end < 0:
+            return 0
+        # only whole lines; a partly flushed last line is picked up next time (a line is
+        # a whole record: EventLogWriter never writes a newline inside a field)
+        chunk = data[:end + 1]
+        self._offset += len(chunk)
+        reader = csv.reader(io.StringIO(chunk.decode('utf-8')))
+        if self._header is None:
+            self._header = next(reader, None)
+        try:
+            i_month = self._header.index('month')
+            i_med = self._header.index('medicine')
+            i_qty = self._header.index('quantity')
+        except (AttributeError, ValueError):
+            return 0
+        added = 0
+        totals = self._totals
+        for row in reader:
+            try:
+                month, med, qty = row[i_month], row[i_med], _quantity(row[i_qty])
+            except (IndexError, ValueError):
+                self._skipped += 1
+                continue
+            if not month or not med:
+                # same rows the pandas groupby used to drop (NaN keys)
+                self._skipped += 1
+                continue
+            key = (month, med)
+            totals[key] = totals.get(key, 0) + qty
+            added += 1
+        self._events += added
+        return added
+
+    # ---- queries ----
+    def query(self, month=None, medicine=None):
+        """[(month, medicine, quantity), ...] sorted, optionally filtered."""
+        with self._lock:
+            items = [(m, med, q) for (m, med), q in self._totals.items()
+                     if (month is None or m == month) and (medicine is None or med == medicine)]
+        return sorted(items)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'path': os.path.basename(self.path),
+                'groups': len(self._totals),
+                'events': self._events,
+                'skipped_rows': self._skipped,
+                'offset_bytes': self._offset,
+                'refreshes': self._refreshes,
+                'mean_refresh_ms': round(self._refresh_seconds / self._refreshes * 1000.0, 4) if self._refreshes else 0.0,
+            }
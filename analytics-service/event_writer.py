@@ -0,0 +1,204 @@
+# analytics-service/event_writer.py
+"""
+Append-only CSV event log writer shared by every gunicorn worker.
+
+A batch of rows is serialised in memory and appended with a single write while
+holding an exclusive flock on the file, so rows from different workers never
+interleave and the header is written exactly once. With a flush interval > 0
+batches from many requests are group-committed by a background thread.
+
+Every record is kept on one physical line (CR/LF inside a value become spaces), so
+readers tailing the log can cut it at any newline without splitting a record.
+"""
+import atexit
+import csv
+import io
+import os
+import threading
+import time
+from collections import deque
+
+try:
+    import fcntl
+except ImportError:  # Windows: no advisory locks, single-worker deployments only
+    fcntl = None
+
+FSYNC_POLICIES = ('never', 'always', 'interval')
+
+
+def _one_line(value):
+    if isinstance(value, str) and ('\n' in value or '\r' in value):
+        return value.replace('\r\n', ' ').replace('\r', ' ').replace('\n', ' ')
+    return value
+
+
+class EventLogWriter:
+
+    def __init__(self, path, fieldnames, flush_interval_ms=0, fsync='never', fsync_interval_ms=1000,
+                 max_buffer=10000):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"fsync policy must be one of {FSYNC_POLICIES}, got {fsync!r}")
+        self.path = path
+        self.fieldnames = list(fieldnames)
+        self.flush_interval = max(0.0, float(flush_interval_ms)) / 1000.0
+        self.fsync = fsync
+        self.fsync_interval = max(0.0, float(fsync_interval_ms)) / 1000.0
+        self.max_buffer = max(1, int(max_buffer))
+        self._buffer = []
+        self._lock = threading.Lock()        # guards _buffer
+        self._write_lock = threading.Lock()  # one flush at a time within this process
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._closed = False
+        self._last_fsync = 0.0
+        # stats (this process only)
+        self._started = time.time()
+        self._events = 0
+        self._writes = 0
+        self._bytes = 0
+        self._flush_seconds = 0.0
+        self._recent = deque()  # (timestamp, events) of recent writes, for a 60s rate
+        atexit.register(self.close)
+
+    # ---- public API ----
+    def append(self, rows):
+        """Queue (or, with no flush interval, write straight away) a list of row dicts."""
+        if not rows:
+            return 0
+        if self.flush_interval <= 0:
+            self._write(rows)
+            return len(rows)
+        with self._lock:
+            self._buffer.extend(rows)
+            full = len(self._buffer) >= self.max_buffer
+        self._ensure_thread()
+        if full:
+            self.flush()
+        return len(rows)
+
+    def flush(self):
+        with self._lock:
+            rows, self._buffer = self._buffer, []
+        if rows:
+            self._write(rows)
+
+    def rotate(self, new_path):
+        """
+        Flush, then atomically move the log to `new_path` under the file lock so no
+        worker's batch is split across the two files. Returns False if there was no log.
+        """
+        self.flush()
+        with self._write_lock:
+            if not os.path.exists(self.path):
+                return False
+            with open(self.path, 'a') as f:
+                self._lock_file(f)
+                try:
+                    os.replace(self.path, new_path)
+                finally:
+                    self._unlock_file(f)
+            return True
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._wakeup.set()
+        try:
+            self.flush()
+        except Exception as e:
+            print(f"[event_writer] final flush of {self.path} failed:", e)
+
+    def stats(self):
+        now = time.time()
+        with self._lock:
+            pending = len(self._buffer)
+            while self._recent and now - self._recent[0][0] > 60:
+                self._recent.popleft()
+            recent_events = sum(n for _, n in self._recent)
+        uptime = max(now - self._started, 1e-9)
+        return {
+            'path': os.path.basename(self.path),
+            'pid': os.getpid(),
+            'events_total': self._events,
+            'writes_total': self._writes,
+            'bytes_total': self._bytes,
+            'pending_events': pending,
+            'events_per_sec': round(self._events / uptime, 3),
+            'events_per_sec_last_60s': round(recent_events / min(uptime, 60.0), 3),
+            'mean_events_per_write': round(self._events / self._writes, 3) if self._writes else 0.0,
+            'mean_write_ms': round(self._flush_seconds / self._writes * 1000.0, 4) if self._writes else 0.0,
+            'flush_interval_ms': self.flush_interval * 1000.0,
+            'fsync': self.fsync,
+        }
+
+    # ---- internals ----
+    def _ensure_thread(self):
+        # started lazily so nothing is running before a pre-fork server forks
+        if self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._flush_loop, daemon=True,
+                                                    name=f"event-writer-{os.path.basename(self.path)}")
+                    self._thread.start()
+
+    def _flush_loop(self):
+        while not self._closed:
+            self._wakeup.wait(self.flush_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"[event_writer] flush of {self.path} failed:", e)
+
+    def _lock_file(self, f):
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+
+    def _unlock_file(self, f):
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+    def _serialise(self, rows, header):
+        buf = io.StringIO()
+        writer = csv.DictWriter(buf, fieldnames=self.fieldnames, extrasaction='ignore')
+        if header:
+            writer.writeheader()
+        writer.writerows({k: _one_line(v) for k, v in row.items()} for row in rows)
+        return buf.getvalue().encode('utf-8')
+
+    def _write(self, rows):
+        t0 = time.perf_counter()
+        with self._write_lock:
+            while True:
+                f = open(self.path, 'ab')
+                try:
+                    self._lock_file(f)
+                    # another process may have rotated the file between open() and flock()
+                    try:
+                        same = os.fstat(f.fileno()).st_ino == os.stat(self.path).st_ino
+                    except FileNotFoundError:
+                        same = False
+                    if not same:
+                        continue
+                    data = self._serialise(rows, header=os.fstat(f.fileno()).st_size == 0)
+                    f.write(data)
+                    f.flush()
+                    now = time.time()
+                    if self.fsync == 'always' or (self.fsync == 'interval' and now - self._last_fsync >= self.fsync_interval):
+                        os.fsync(f.fileno())
+                        self._last_fsync = now
+                    break
+                finally:
+                    self._unlock_file(f)
+                    f.close()
+        elapsed = time.perf_counter() - t0
+        with self._lock:
+            self._events += len(rows)
+            self._writes += 1
+            self._bytes += len(data)
+            self._flush_seconds += elapsed
+            now = time.time()
+            self._recent.append((now, len(rows)))
+            while self._recent and now - self._recent[0][0] > 60:
+                self._recent.popleft()
+        return len(data)
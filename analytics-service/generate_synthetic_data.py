@@ -1,13 +1,50 @@
-import pandas as pd
+# analytics-service/generate_synthetic_data.py
+"""
+Synthetic training data and event logs for the analytics service.
+
+    python generate_synthetic_data.py --force              # regenerate the bundled CSVs
+    python generate_synthetic_data.py --skus 50000 --patients 2000000 \\
+        --demand-events 20000000 --admission-events 5000000 --out-dir /tmp/load
+
+Tables (same columns as the files app.py trains on / writes):
+
+    synthetic_medicine_demand.csv          month, medicine, demand
+    synthetic_patient_risk.csv             age, gender, condition, isSmoker, hr, bp, risk_score, readmitted
+    synthetic_disease_trends.csv           month, disease, cases
+    data/synthetic_medicine_demand_events.csv   timestamp, month, medicine, quantity, invoiceId
+    data/admissions_events.csv             timestamp, admittedAt, patientName, age, gender, roomType, doctor, admissionId
+
+The event logs are only written when --demand-events / --admission-events are given.
+--out-dir defaults to the service directory, whose CSVs and data/ event logs are the
+live ones app.py trains on and appends to, so existing files are only overwritten
+with --force.
+
+Demand peaks in winter and monsoon; Dengue/Malaria-like diseases peak in the
+monsoon and Influenza/Pneumonia-like ones in winter; event volume per month follows
+the same seasons. Rows are drawn with NumPy a block of 65536 at a time (each block
+from its own generator seeded by (seed, table, block)) and written chunk by chunk,
+so memory stays bounded and the output depends only on the seed and the size
+arguments, not on --chunk-rows. CSVs are written with pyarrow when it is installed
+and with pandas otherwise.
+"""
+import argparse
+import os
+import time
+
 import numpy as np
-import random
-from datetime import datetime, timedelta
+import pandas as pd
 
-np.random.seed(42)
-random.seed(42)
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.csv as pa_csv
+except ImportError:
+    pa = None
 
-# ----------- 1. Medicine Demand Data ------------
-medicines = [
+BLOCK_ROWS = 1 << 16
+
+# ----------- catalogs ------------
+MEDICINES = [
     "Paracetamol 500mg Tablets", "Amoxicillin 250mg Capsules", "Ibuprofen 400mg Tablets",
     "Cough Syrup 100ml", "Vitamin C 500mg Tablets", "Cetirizine 10mg Tablets",
     "Azithromycin 500mg Tablets", "Omeprazole 20mg Capsules", "Insulin Injection 10ml",
@@ -16,70 +53,404 @@ medicines = [
     "Prednisolone 10mg Tablets", "Montelukast 10mg Tablets", "Diclofenac 50mg Tablets",
     "Clopidogrel 75mg Tablets", "Amoxiclav 625mg Tablets"
 ]
+MEDICINE_STEMS = ['Paracetamol', 'Amoxicillin', 'Ibuprofen', 'Metformin', 'Atorvastatin', 'Omeprazole',
+                  'Cetirizine', 'Azithromycin', 'Losartan', 'Amlodipine', 'Pantoprazole', 'Diclofenac',
+                  'Cefixime', 'Montelukast', 'Clopidogrel', 'Prednisolone']
+MEDICINE_STRENGTHS = [5, 10, 20, 40, 50, 75, 250, 400, 500, 625, 650]
+MEDICINE_FORMS = ['Tablets', 'Capsules', 'Syrup 100ml', 'Injection 10ml', 'Suspension 60ml']
+
+# (disease, seasonal peak) -- peak is 'monsoon', 'winter' or None
+DISEASES = [
+    ("Dengue", 'monsoon'), ("Malaria", 'monsoon'), ("Typhoid", None),
+    ("Influenza", 'winter'), ("Chikungunya", None), ("Pneumonia", 'winter'),
+    ("Cholera", 'monsoon'), ("Bronchitis", 'winter'), ("Hepatitis A", None),
+    ("Leptospirosis", 'monsoon'), ("Measles", 'winter'), ("Tuberculosis", None),
+]
+PEAK_CYCLE = ['monsoon', 'winter', None]
+
+CONDITIONS = ["None", "Diabetes", "Hypertension", "Cardiac", "Asthma"]
+CONDITION_P = [0.25, 0.25, 0.25, 0.15, 0.10]
+GENDERS = ["Male", "Female"]
+FIRST_NAMES = ['Aarav', 'Ali', 'Ananya', 'Arjun', 'Diya', 'Fatima', 'Ishaan', 'John', 'Kavya', 'Meera',
+               'Mohammed', 'Neha', 'Priya', 'Rahul', 'Riya', 'Rohan', 'Sara', 'Vikram', 'Zara', 'Kabir']
+LAST_NAMES = ['Bose', 'Das', 'Doe', 'Gupta', 'Iyer', 'Joshi', 'Khan', 'Kumar', 'Mehta', 'Nair',
+              'Patel', 'Rao', 'Reddy', 'Shah', 'Sharma', 'Singh', 'Verma', 'Yadav']
+ROOM_TYPES = ['General', 'Semi-Private', 'Private', 'ICU']
+ROOM_TYPE_P = [0.5, 0.25, 0.17, 0.08]
+DOCTORS = ['Dr A', 'Dr Mehta', 'Dr Rao', 'Dr Iyer', 'Dr Khan', 'Dr Shah', 'Ms Shraddha', 'Dr Nair']
+
+WINTER = (12, 1, 2)
+MONSOON = (6, 7, 8)
+DISEASE_MONSOON = (6, 7, 8, 9)
+INVOICE_LINES = 8
+
+# file -> columns; the event log names and fields are the ones app.py writes
+DEMAND_FIELDS = ['month', 'medicine', 'demand']
+RISK_FIELDS = ['age', 'gender', 'condition', 'isSmoker', 'hr', 'bp', 'risk_score', 'readmitted']
+DISEASE_FIELDS = ['month', 'disease', 'cases']
+DEMAND_EVENT_FIELDS = ['timestamp', 'month', 'medicine', 'quantity', 'invoiceId']
+ADMISSION_EVENT_FIELDS = ['timestamp', 'admittedAt', 'patientName', 'age', 'gender', 'roomType', 'doctor',
+                          'admissionId']
+
+# random streams, one per table
+STREAM_CATALOG, STREAM_DEMAND, STREAM_RISK, STREAM_DISEASE, STREAM_DEMAND_EVENTS, STREAM_ADMISSIONS = range(6)
+
+
+def _categorical(codes, categories):
+    """Column of labels stored as codes into `categories` (a list or CategoricalDtype)."""
+    dtype = categories if isinstance(categories, pd.CategoricalDtype) else pd.CategoricalDtype(categories)
+    return pd.Categorical.from_codes(codes, dtype=dtype)
+
+
+def _ids(prefix, first, codes):
+    """Labels prefix<first + code> for a run of ids, as a categorical."""
+    count = int(codes.max()) + 1 if len(codes) else 0
+    return _categorical(codes, [f"{prefix}{first + j}" for j in range(count)])
+
+
+def _blocks(seed, stream, lo, hi):
+    """(start, stop, rng) slices of rows lo..hi, relative to lo; lo is a multiple of BLOCK_ROWS."""
+    for start in range(lo, hi, BLOCK_ROWS):
+        rng = np.random.default_rng([seed, stream, start // BLOCK_ROWS])
+        yield start - lo, min(start + BLOCK_ROWS, hi) - lo, rng
+
+
+def _chunks(total, chunk_rows):
+    step = max(BLOCK_ROWS, chunk_rows // BLOCK_ROWS * BLOCK_ROWS)
+    for lo in range(0, total, step):
+        yield lo, min(lo + step, total)
+
+
+class Months:
+
+    def __init__(self, start, end):
+        index = pd.date_range(start=pd.Period(start, 'M').start_time, end=pd.Period(end, 'M').start_time, freq='MS')
+        if len(index) == 0:
+            raise SystemExit(f"empty month range {start}..{end}")
+        self.labels = list(index.strftime('%Y-%m'))
+        self.month = index.month.to_numpy()
+        bounds = np.append(index.to_numpy(), (index[-1] + pd.offsets.MonthBegin()).to_datetime64())
+        bounds = bounds.astype('datetime64[us]')
+        self.start = bounds[:-1]
+        self.duration_us = np.diff(bounds).astype(np.int64)
+
+    def __len__(self):
+        return len(self.labels)
+
 
-months = pd.date_range(start="2023-01-01", end="2025-10-01", freq="MS")
+# ----------- CSV output ------------
+def _to_arrow(columns):
+    arrays = {}
+    for name, values in columns.items():
+        if isinstance(values, pd.Categorical):
+            codes = pa.array(values.codes.astype(np.int32))
+            arr = pa.DictionaryArray.from_arrays(codes, pa.array(values.categories.to_numpy(dtype=object)))
+            arr = arr.cast(pa.string())
+        elif np.issubdtype(values.dtype, np.datetime64):
+            # a plain cast prints "YYYY-MM-DD HH:MM:SS.ffffff" and is much faster than strftime
+            arr = pc.replace_substring(pa.array(values).cast(pa.string()), ' ', 'T', max_replacements=1)
+            if values.dtype == np.dtype('datetime64[ms]'):
+                arr = pc.binary_join_element_wise(arr, pa.scalar('Z'), '')
+        else:
+            arr = pa.array(values)
+        arrays[name] = arr
+    return pa.table(arrays)
 
-records = []
-for med in medicines:
-    base = random.randint(80, 200)
-    for m in months:
-        seasonal_factor = 1.0
-        if m.month in [12, 1, 2]:  # winter
-            seasonal_factor = random.uniform(1.2, 1.5)
-        elif m.month in [6, 7, 8]:  # monsoon
-            seasonal_factor = random.uniform(1.1, 1.3)
-        noise = np.random.normal(0, 10)
-        demand = max(10, int(base * seasonal_factor + noise))
-        records.append([m.strftime("%Y-%m"), med, demand])
 
-demand_df = pd.DataFrame(records, columns=["month", "medicine", "demand"])
-demand_df.to_csv("synthetic_medicine_demand.csv", index=False)
+def _to_frame(columns):
+    out = {}
+    for name, values in columns.items():
+        if not isinstance(values, pd.Categorical) and np.issubdtype(values.dtype, np.datetime64):
+            # datetime.isoformat() for us, JavaScript toISOString() for ms
+            suffix = 'Z' if values.dtype == np.dtype('datetime64[ms]') else ''
+            values = np.char.add(np.datetime_as_string(values), suffix)
+        out[name] = values
+    return pd.DataFrame(out)
 
-print(f"✅ synthetic_medicine_demand.csv created ({len(demand_df)} rows)")
+
+def write_csv(path, fields, chunks):
+    """Write column-dict chunks to `path` with one header row. Returns the row count."""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    rows = 0
+    if pa is not None:
+        # unquoted like the pandas output: no catalog value holds a comma, quote or newline
+        # (pyarrow raises if one ever does). pyarrow quotes header names regardless, so the
+        # header line is written here.
+        options = pa_csv.WriteOptions(include_header=False, quoting_style='none')
+        with open(path, 'wb') as f:
+            f.write((','.join(fields) + '\n').encode('utf-8'))
+            writer = None
+            try:
+                for columns in chunks:
+                    table = _to_arrow(columns).select(fields)
+                    if writer is None:
+                        writer = pa_csv.CSVWriter(f, table.schema, write_options=options)
+                    writer.write_table(table)
+                    rows += table.num_rows
+            finally:
+                if writer is not None:
+                    writer.close()
+        return rows
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        header = True
+        for columns in chunks:
+            frame = _to_frame(columns)[fields]
+            frame.to_csv(f, index=False, header=header)
+            header = False
+            rows += len(frame)
+        if header:
+            f.write(','.join(fields) + '\n')
+    return rows
+
+
+# ----------- 1. Medicine Demand Data ------------
+def medicine_names(n_skus):
+    """The 20 bundled medicines first, then generated names that never repeat."""
+    names = MEDICINES[:n_skus]
+    for i in range(len(names), n_skus):
+        j = i - len(MEDICINES)
+        stem = MEDICINE_STEMS[j % len(MEDICINE_STEMS)]
+        code, rest = '', j // len(MEDICINE_STEMS)
+        while True:
+            code = chr(ord('A') + rest % 26) + code
+            rest = rest // 26 - 1
+            if rest < 0:
+                break
+        strength = MEDICINE_STRENGTHS[(j // 7) % len(MEDICINE_STRENGTHS)]
+        form = MEDICINE_FORMS[(j // 3) % len(MEDICINE_FORMS)]
+        names.append(f"{stem} {code} {strength}mg {form}")
+    return names
+
+
+def medicine_bases(seed, n_skus):
+    return np.random.default_rng([seed, STREAM_CATALOG]).integers(80, 201, n_skus)
+
+
+def demand_chunks(seed, bases, medicine_dtype, months, chunk_rows):
+    """month x medicine demand: base * seasonal factor + N(0, 10), at least 10."""
+    n_months = len(months)
+    month_labels = pd.CategoricalDtype(months.labels)
+    winter = np.isin(months.month, WINTER)
+    monsoon = np.isin(months.month, MONSOON)
+    for lo, hi in _chunks(len(bases) * n_months, chunk_rows):
+        u = np.empty(hi - lo)
+        noise = np.empty(hi - lo)
+        for s, e, rng in _blocks(seed, STREAM_DEMAND, lo, hi):
+            u[s:e] = rng.random(e - s)
+            noise[s:e] = rng.normal(0, 10, e - s)
+        row = np.arange(lo, hi)
+        sku, m = np.divmod(row, n_months)
+        factor = np.where(winter[m], 1.2 + 0.3 * u, np.where(monsoon[m], 1.1 + 0.2 * u, 1.0))
+        demand = np.maximum(10, (bases[sku] * factor + noise).astype(np.int64))
+        yield {'month': _categorical(m, month_labels), 'medicine': _categorical(sku, medicine_dtype),
+               'demand': demand}
 
 
 # ----------- 2. Patient Risk Data ------------
-ages = np.random.randint(18, 90, 1000)
-genders = np.random.choice(["Male", "Female"], 1000)
-conditions = ["None", "Diabetes", "Hypertension", "Cardiac", "Asthma"]
-smoker = np.random.choice([True, False], 1000, p=[0.3, 0.7])
-
-rows = []
-for i in range(1000):
-    cond = np.random.choice(conditions, p=[0.25, 0.25, 0.25, 0.15, 0.10])
-    hr = np.random.randint(60, 110)
-    bp_sys = np.random.randint(100, 180)
-    bp_dia = np.random.randint(60, 110)
-    risk_score = (
-        (ages[i] / 100) +
-        (1 if cond != "None" else 0) * 1.5 +
-        (1 if smoker[i] else 0.8) +
-        ((bp_sys > 140 or bp_dia > 90) * 1.2)
-    ) + np.random.normal(0, 0.5)
-    readmit = 1 if risk_score > 2.8 else 0
-    rows.append([ages[i], genders[i], cond, smoker[i], hr, f"{bp_sys}/{bp_dia}", risk_score, readmit])
-
-risk_df = pd.DataFrame(rows, columns=["age", "gender", "condition", "isSmoker", "hr", "bp", "risk_score", "readmitted"])
-risk_df.to_csv("synthetic_patient_risk.csv", index=False)
-
-print(f"✅ synthetic_patient_risk.csv created ({len(risk_df)} rows)")
+def risk_chunks(seed, n_patients, chunk_rows):
+    # bp is "sys/dia" with sys in 100..179 and dia in 60..109
+    bp_labels = [f"{s}/{d}" for s in range(100, 180) for d in range(60, 110)]
+    condition_cdf = np.cumsum(CONDITION_P)
+    for lo, hi in _chunks(n_patients, chunk_rows):
+        n = hi - lo
+        age, gender, cond, smoker = (np.empty(n, np.int64), np.empty(n, np.int8),
+                                     np.empty(n, np.int64), np.empty(n, bool))
+        hr, bp_sys, bp_dia, noise = (np.empty(n, np.int64), np.empty(n, np.int64),
+                                     np.empty(n, np.int64), np.empty(n))
+        for s, e, rng in _blocks(seed, STREAM_RISK, lo, hi):
+            k = e - s
+            age[s:e] = rng.integers(18, 90, k)
+            gender[s:e] = rng.integers(0, 2, k)
+            smoker[s:e] = rng.random(k) < 0.3
+            cond[s:e] = np.minimum(np.searchsorted(condition_cdf, rng.random(k), side='right'), len(CONDITIONS) - 1)
+            hr[s:e] = rng.integers(60, 110, k)
+            bp_sys[s:e] = rng.integers(100, 180, k)
+            bp_dia[s:e] = rng.integers(60, 110, k)
+            noise[s:e] = rng.normal(0, 0.5, k)
+        high_bp = (bp_sys > 140) | (bp_dia > 90)
+        risk_score = (age / 100 + (cond != 0) * 1.5 + np.where(smoker, 1.0, 0.8) + high_bp * 1.2) + noise
+        yield {
+            'age': age,
+            'gender': _categorical(gender, GENDERS),
+            'condition': _categorical(cond, CONDITIONS),
+            'isSmoker': _categorical(smoker.astype(np.int8), ['False', 'True']),
+            'hr': hr,
+            'bp': _categorical((bp_sys - 100) * 50 + (bp_dia - 60), bp_labels),
+            'risk_score': risk_score,
+            'readmitted': (risk_score > 2.8).astype(np.int64),
+        }
 
 
 # ----------- 3. Seasonal Disease Trends ------------
-diseases = ["Dengue", "Malaria", "Typhoid", "Influenza", "Chikungunya", "Pneumonia"]
-trend_records = []
-
-for dis in diseases:
-    for m in months:
-        base = random.randint(20, 100)
-        if dis in ["Dengue", "Malaria"] and m.month in [6,7,8,9]:  # monsoon peak
-            base *= random.uniform(2.0, 3.0)
-        elif dis in ["Influenza", "Pneumonia"] and m.month in [12,1,2]:  # winter peak
-            base *= random.uniform(1.5, 2.5)
-        cases = int(base + np.random.normal(0, 10))
-        trend_records.append([m.strftime("%Y-%m"), dis, max(0, cases)])
-
-trend_df = pd.DataFrame(trend_records, columns=["month", "disease", "cases"])
-trend_df.to_csv("synthetic_disease_trends.csv", index=False)
-
-print(f"✅ synthetic_disease_trends.csv created ({len(trend_df)} rows)")
\ No newline at end of file
+def disease_catalog(n_diseases):
+    out = list(DISEASES[:n_diseases])
+    for i in range(len(out), n_diseases):
+        out.append((f"Disease {i + 1:03d}", PEAK_CYCLE[i % len(PEAK_CYCLE)]))
+    return out
+
+
+def disease_factor(peak, month, u):
+    """Seasonal multiplier for a disease with `peak`, given uniforms u in [0, 1)."""
+    if peak == 'monsoon':
+        return np.where(np.isin(month, DISEASE_MONSOON), 2.0 + u, 1.0)
+    if peak == 'winter':
+        return np.where(np.isin(month, WINTER), 1.5 + u, 1.0)
+    return np.ones_like(u)
+
+
+def disease_chunks(seed, diseases, months, chunk_rows):
+    n_months = len(months)
+    month_labels = pd.CategoricalDtype(months.labels)
+    peaks = np.array([PEAK_CYCLE.index(peak) for _, peak in diseases])
+    for lo, hi in _chunks(len(diseases) * n_months, chunk_rows):
+        base, u, noise = np.empty(hi - lo), np.empty(hi - lo), np.empty(hi - lo)
+        for s, e, rng in _blocks(seed, STREAM_DISEASE, lo, hi):
+            base[s:e] = rng.integers(20, 101, e - s)
+            u[s:e] = rng.random(e - s)
+            noise[s:e] = rng.normal(0, 10, e - s)
+        d, m = np.divmod(np.arange(lo, hi), n_months)
+        factor = np.ones(hi - lo)
+        for p, peak in enumerate(PEAK_CYCLE):
+            sel = peaks[d] == p
+            factor[sel] = disease_factor(peak, months.month[m[sel]], u[sel])
+        cases = np.maximum(0, (base * factor + noise).astype(np.int64))
+        yield {'month': _categorical(m, month_labels),
+               'disease': _categorical(d, [name for name, _ in diseases]), 'cases': cases}
+
+
+# ----------- 4. Event logs ------------
+def monthly_counts(seed, stream, total, weights):
+    """Split `total` events over the months in proportion to `weights`."""
+    rng = np.random.default_rng([seed, stream])
+    return rng.multinomial(total, np.asarray(weights, dtype=float) / np.sum(weights))
+
+
+def event_times(rows, counts, months, u):
+    """
+    Month index and timestamp of each event row: the events of month m are evenly
+    spread over it (with jitter), so timestamps increase with the row number.
+    """
+    ends = np.cumsum(counts)
+    m = np.searchsorted(ends, rows, side='right')
+    first = ends[m] - counts[m]
+    offset = (rows - first + u) / counts[m] * months.duration_us[m]
+    return m, months.start[m] + offset.astype(np.int64).astype('timedelta64[us]')
+
+
+def demand_event_chunks(seed, n_events, bases, medicine_dtype, months, chunk_rows):
+    """Dispensing events; busier in winter / monsoon, popular medicines more often."""
+    month_weight = np.where(np.isin(months.month, WINTER), 1.35, np.where(np.isin(months.month, MONSOON), 1.2, 1.0))
+    counts = monthly_counts(seed, STREAM_DEMAND_EVENTS, n_events, month_weight)
+    sku_cdf = np.cumsum(bases / bases.sum())
+    month_labels = pd.CategoricalDtype(months.labels)
+    for lo, hi in _chunks(n_events, chunk_rows):
+        u, pick, quantity = np.empty(hi - lo), np.empty(hi - lo), np.empty(hi - lo, np.int64)
+        for s, e, rng in _blocks(seed, STREAM_DEMAND_EVENTS, lo, hi):
+            u[s:e] = rng.random(e - s)
+            pick[s:e] = rng.random(e - s)
+            quantity[s:e] = rng.integers(1, 21, e - s)
+        rows = np.arange(lo, hi)
+        m, ts = event_times(rows, counts, months, u)
+        sku = np.minimum(np.searchsorted(sku_cdf, pick, side='right'), len(bases) - 1)
+        invoice = rows // INVOICE_LINES
+        yield {
+            'timestamp': ts,
+            'month': _categorical(m, month_labels),
+            'medicine': _categorical(sku, medicine_dtype),
+            'quantity': quantity,
+            'invoiceId': _ids('INV', int(invoice[0]), invoice - invoice[0]),
+        }
+
+
+def admission_event_chunks(seed, n_events, diseases, months, chunk_rows):
+    """Admissions; monthly volume follows the expected disease case load."""
+    mid = np.full(len(months), 0.5)
+    load = sum(disease_factor(peak, months.month, mid) for _, peak in diseases)
+    counts = monthly_counts(seed, STREAM_ADMISSIONS, n_events, load)
+    names = [f"{first} {last}" for first in FIRST_NAMES for last in LAST_NAMES]
+    room_cdf = np.cumsum(ROOM_TYPE_P)
+    for lo, hi in _chunks(n_events, chunk_rows):
+        n = hi - lo
+        u, lag = np.empty(n), np.empty(n, np.int64)
+        name, age, gender = np.empty(n, np.int64), np.empty(n, np.int64), np.empty(n, np.int8)
+        room, doctor = np.empty(n, np.int64), np.empty(n, np.int64)
+        for s, e, rng in _blocks(seed, STREAM_ADMISSIONS, lo, hi):
+            k = e - s
+            u[s:e] = rng.random(k)
+            lag[s:e] = rng.integers(0, 120_000, k)  # admittedAt precedes the log write
+            name[s:e] = rng.integers(0, len(names), k)
+            age[s:e] = rng.integers(1, 91, k)
+            gender[s:e] = rng.integers(0, 2, k)
+            room[s:e] = np.minimum(np.searchsorted(room_cdf, rng.random(k), side='right'), len(ROOM_TYPES) - 1)
+            doctor[s:e] = rng.integers(0, len(DOCTORS), k)
+        rows = np.arange(lo, hi)
+        _, ts = event_times(rows, counts, months, u)
+        admitted = ts.astype('datetime64[ms]') - lag.astype('timedelta64[ms]')
+        yield {
+            'timestamp': ts,
+            'admittedAt': admitted,
+            'patientName': _categorical(name, names),
+            'age': age,
+            'gender': _categorical(gender, GENDERS),
+            'roomType': _categorical(room, ROOM_TYPES),
+            'doctor': _categorical(doctor, DOCTORS),
+            'admissionId': _ids('ADM', lo + 1, rows - lo),
+        }
+
+
+TABLES = ('demand', 'risk', 'disease', 'demand-events', 'admission-events')
+
+
+def main():
+    here = os.path.dirname(os.path.abspath(__file__))
+    parser = argparse.ArgumentParser(description='Generate synthetic analytics data.')
+    parser.add_argument('--out-dir', default=here, help='where the CSVs go (event logs under <out-dir>/data)')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--skus', type=int, default=len(MEDICINES))
+    parser.add_argument('--diseases', type=int, default=6)
+    parser.add_argument('--patients', type=int, default=1000)
+    parser.add_argument('--start', default='2023-01', help='first month, YYYY-MM')
+    parser.add_argument('--end', default='2025-10', help='last month, YYYY-MM')
+    parser.add_argument('--demand-events', type=int, default=0)
+    parser.add_argument('--admission-events', type=int, default=0)
+    parser.add_argument('--chunk-rows', type=int, default=1 << 20, help='rows held in memory per write')
+    parser.add_argument('--only', nargs='+', choices=TABLES, help='generate just these tables')
+    parser.add_argument('--force', action='store_true', help='overwrite files that already exist')
+    args = parser.parse_args()
+
+    months = Months(args.start, args.end)
+    bases = medicine_bases(args.seed, args.skus)
+    medicine_dtype = pd.CategoricalDtype(medicine_names(args.skus))
+    diseases = disease_catalog(args.diseases)
+    wanted = set(args.only or TABLES)
+    if args.demand_events <= 0:
+        wanted.discard('demand-events')
+    if args.admission_events <= 0:
+        wanted.discard('admission-events')
+
+    jobs = [
+        ('demand', 'synthetic_medicine_demand.csv', DEMAND_FIELDS,
+         lambda: demand_chunks(args.seed, bases, medicine_dtype, months, args.chunk_rows)),
+        ('risk', 'synthetic_patient_risk.csv', RISK_FIELDS,
+         lambda: risk_chunks(args.seed, args.patients, args.chunk_rows)),
+        ('disease', 'synthetic_disease_trends.csv', DISEASE_FIELDS,
+         lambda: disease_chunks(args.seed, diseases, months, args.chunk_rows)),
+        ('demand-events', os.path.join('data', 'synthetic_medicine_demand_events.csv'), DEMAND_EVENT_FIELDS,
+         lambda: demand_event_chunks(args.seed, args.demand_events, bases, medicine_dtype, months,
+                                     args.chunk_rows)),
+        ('admission-events', os.path.join('data', 'admissions_events.csv'), ADMISSION_EVENT_FIELDS,
+         lambda: admission_event_chunks(args.seed, args.admission_events, diseases, months, args.chunk_rows)),
+    ]
+    jobs = [job for job in jobs if job[0] in wanted]
+    existing = [name for _, name, _, _ in jobs if os.path.exists(os.path.join(args.out_dir, name))]
+    if existing and not args.force:
+        parser.error(f"{', '.join(existing)} already exist in {args.out_dir}; "
+                     "pass --force to overwrite them or choose another --out-dir")
+    for table, name, fields, chunks in jobs:
+        t0 = time.perf_counter()
+        rows = write_csv(os.path.join(args.out_dir, name), fields, chunks())
+        print(f"✅ {name} created ({rows} rows, {time.perf_counter() - t0:.2f}s)")
+
+
+if __name__ == '__main__':
+    main()
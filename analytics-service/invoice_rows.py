@@ -0,0 +1,125 @@
+# analytics-service/invoice_rows.py
+"""
+Turn camelot tables into invoice row dicts.
+
+The first row of a table is its header. Each header cell is mapped to a field
+(description / batch / expiry / quantity / price) once per table, the cells are
+stripped once as a whole array, and the field values are pulled out as columns.
+Rows without a description fall back to their longest cell.
+
+    python invoice_rows.py [--repeat 200] [--scale 1 50 500]
+
+benchmarks this against the original per-cell loop on the bundled sample invoices
+(tables stacked `scale` times to mimic long wholesaler invoices).
+"""
+import numpy as np
+
+INVOICE_FIELDS = ('description', 'batch', 'expiry', 'quantity', 'price')
+
+
+def header_field(header):
+    """Field a (lower-cased, stripped) header cell maps to, or None."""
+    h = header
+    if 'description' in h or 'item' in h or 'product' in h or 'medicine' in h:
+        return 'description'
+    elif 'batch' in h or 'batch no' in h or 'batch#' in h:
+        return 'batch'
+    elif 'exp' in h or 'expiry' in h or 'e/d' in h:
+        return 'expiry'
+    elif 'qty' in h or 'quantity' in h:
+        return 'quantity'
+    elif 'price' in h or 'rate' in h or 'amount' in h:
+        return 'price'
+    return None
+
+
+def header_columns(headers):
+    """field -> column index; when several columns match a field the last one wins."""
+    columns = {}
+    for col_idx, h in enumerate(headers):
+        field = header_field(h)
+        if field is not None:
+            columns[field] = col_idx
+    return columns
+
+
+def table_to_rows(df):
+    """Map one camelot table (first row = header) to invoice row dicts."""
+    if df.shape[0] < 2 or df.shape[1] == 0:
+        return []
+    cells = np.char.strip(df.to_numpy().astype(str))
+    headers = [h.lower() for h in cells[0].tolist()]
+    body = cells[1:]
+    columns = header_columns(headers)
+
+    raw = body.tolist()
+    n = len(raw)
+    values = {field: body[:, columns[field]].tolist() if field in columns else [None] * n
+              for field in INVOICE_FIELDS}
+
+    # longest cell per row (first one on ties), only needed where the description is empty
+    descriptions = values['description']
+    missing = [i for i, d in enumerate(descriptions) if not d]
+    if missing:
+        longest = np.char.str_len(body[missing]).argmax(axis=1)
+        for i, col in zip(missing, longest.tolist()):
+            descriptions[i] = raw[i][col]
+
+    return [
+        {'raw': raw[i], 'description': descriptions[i], 'batch': values['batch'][i],
+         'expiry': values['expiry'][i], 'quantity': values['quantity'][i], 'price': values['price'][i]}
+        for i in range(n)
+    ]
+
+
+def _table_to_rows_per_cell(df):
+    """The original row-by-row, cell-by-cell extraction (kept for the benchmark)."""
+    rows = []
+    if df.shape[0] < 2:
+        return rows
+    headers = [str(h).strip().lower() for h in df.iloc[0].tolist()]
+    for i in range(1, df.shape[0]):
+        row = df.iloc[i].tolist()
+        row_obj = {'raw': [str(c).strip() for c in row], 'description': None, 'batch': None,
+                   'expiry': None, 'quantity': None, 'price': None}
+        for col_idx, cell in enumerate(row):
+            h = headers[col_idx] if col_idx < len(headers) else ''
+            field = header_field(h)
+            if field is not None:
+                row_obj[field] = str(cell).strip()
+        if not row_obj['description']:
+            row_obj['description'] = max([str(c).strip() for c in row], key=len)
+        rows.append(row_obj)
+    return rows
+
+
+if __name__ == '__main__':
+    import argparse
+    import json
+    import os
+    import time
+
+    import camelot
+    import pandas as pd
+
+    parser = argparse.ArgumentParser(description='Benchmark table-to-row extraction.')
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--scale', type=int, nargs='+', default=[1, 50, 500])
+    args = parser.parse_args()
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    for name in ('sample_invoice.pdf', 'invoice_sample.pdf'):
+        base = [t.df for t in camelot.read_pdf(os.path.join(here, name), flavor='lattice', pages='all', strip_text='\n')]
+        for scale in args.scale:
+            tables = [pd.concat([df] + [df.iloc[1:]] * (scale - 1), ignore_index=True) for df in base]
+            assert [table_to_rows(t) for t in tables] == [_table_to_rows_per_cell(t) for t in tables]
+            out = {'pdf': name, 'scale': scale, 'rows': sum(len(t) - 1 for t in tables)}
+            for label, fn in (('per_cell', _table_to_rows_per_cell), ('vectorized', table_to_rows)):
+                repeat = max(1, args.repeat // scale)
+                t0 = time.perf_counter()
+                for _ in range(repeat):
+                    for t in tables:
+                        fn(t)
+                out[f'{label}_ms'] = round((time.perf_counter() - t0) / repeat * 1000.0, 4)
+            out['speedup'] = round(out['per_cell_ms'] / out['vectorized_ms'], 2) if out['vectorized_ms'] else None
+            print(json.dumps(out))
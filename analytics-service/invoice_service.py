@@ -1,67 +1,295 @@
 # analytics-service/invoice_service.py
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
 import tempfile
 import os
-import camelot
 import traceback
+import atexit
+import multiprocessing
+import signal
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+import uuid
+import json
+import hmac
+from importlib.metadata import version as package_version
+from collections import deque
+from itertools import islice
+from parse_cache import ParseCache, save_upload
+from invoice_rows import table_to_rows
+from metrics import REGISTRY as metrics_registry, CONTENT_TYPE as METRICS_CONTENT_TYPE, SLOW_BUCKETS
 
 app = Flask(__name__)
 CORS(app)
 
-def parse_pdf_with_camelot(path):
-    # Try lattice first (works with ruled tables), then stream
-    tables = []
+# -------------------------
+# Page-parallel parsing: every page is parsed on its own (lattice first, stream only
+# when lattice finds no table on that page) and pages are spread over a process pool.
+# Results are merged back in page order. INVOICE_PARSE_WORKERS sets the pool size
+# (default: up to 4, one per core); 1 parses in the request thread.
+# -------------------------
+CAMELOT_FLAVORS = ('lattice', 'stream')
+
+# timings come back in the page reports, so they are recorded here in the parent
+# process even when the page was parsed on the pool
+PAGE_PARSE_SECONDS = metrics_registry.histogram(
+    'invoice_page_parse_seconds', 'Camelot time per page, by the flavor that found its tables.', ['flavor'],
+    buckets=SLOW_BUCKETS)
+FLAVOR_PARSE_SECONDS = metrics_registry.histogram(
+    'invoice_flavor_parse_seconds', 'Camelot time per page and flavor attempt.', ['flavor'], buckets=SLOW_BUCKETS)
+
+def observe_page(report):
+    PAGE_PARSE_SECONDS.labels(report['flavor'] or 'none').observe(report['seconds'])
+    for flavor, seconds in report['flavor_seconds'].items():
+        FLAVOR_PARSE_SECONDS.labels(flavor).observe(seconds)
+
+def _default_parse_workers():
     try:
-        tables = camelot.read_pdf(path, flavor='lattice', pages='all', strip_text='\n')
-        if len(tables) == 0:
-            tables = camelot.read_pdf(path, flavor='stream', pages='all', strip_text='\n')
-    except Exception as e:
-        # return empty and let caller fallback or return error
-        print("Camelot parse error:", e)
-        tables = []
+        configured = int(os.environ.get('INVOICE_PARSE_WORKERS', 0))
+    except ValueError:
+        configured = 0
+    return configured if configured > 0 else min(4, os.cpu_count() or 1)
+
+INVOICE_PARSE_WORKERS = _default_parse_workers()
+_parse_pool = None
+_parse_pool_lock = threading.Lock()
+
+def _get_parse_pool():
+    global _parse_pool
+    with _parse_pool_lock:
+        if _parse_pool is None:
+            _parse_pool = ProcessPoolExecutor(max_workers=INVOICE_PARSE_WORKERS)
+            atexit.register(_parse_pool.shutdown, wait=False, cancel_futures=True)
+        return _parse_pool
+
+def _reset_parse_pool():
+    global _parse_pool
+    with _parse_pool_lock:
+        pool, _parse_pool = _parse_pool, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
 
+def pdf_pages(path):
+    """
+    Page numbers of the PDF as strings ('1', '2', ...), the form camelot's pages=
+    takes. Raises (pypdf's errors) when the file can't be read as a PDF.
+    """
+    from pypdf import PdfReader
+    return [str(i) for i in range(1, len(PdfReader(path).pages) + 1)]
+
+def parse_page(task):
+    """Parse one page -> (page report, [table DataFrames]). Runs in a pool worker."""
+    # camelot (and OpenCV behind it) is imported on the first parse, not at startup
+    import camelot
+    path, page = task
+    t0 = time.perf_counter()
+    report = {'page': int(page), 'flavor': None, 'tables': 0, 'flavor_seconds': {}}
+    frames = []
+    for flavor in CAMELOT_FLAVORS:
+        t = time.perf_counter()
+        try:
+            tables = camelot.read_pdf(path, flavor=flavor, pages=page, strip_text='\n')
+        except Exception as e:
+            print(f"Camelot {flavor} parse error on page {page}:", e)
+            tables = []
+        report['flavor_seconds'][flavor] = round(time.perf_counter() - t, 6)
+        if len(tables) > 0:
+            frames = [tbl.df for tbl in tables]
+            report['flavor'] = flavor
+            report['tables'] = len(frames)
+            break
+    report['seconds'] = round(time.perf_counter() - t0, 6)
+    return report, frames
+
+def _remaining(deadline):
+    if deadline is None:
+        return None
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise TimeoutError('invoice parse timed out')
+    return remaining
+
+def iter_page_results(path, pages, deadline=None):
+    """
+    Yield (page report, [table DataFrames]) for `pages` in page order, each as soon as
+    it (and every page before it) is parsed. Only a small window of pages is in flight
+    on the pool at a time, so memory doesn't grow with the page count. `deadline`
+    (time.monotonic() value) raises TimeoutError once passed, checked between pages.
+    """
+    tasks = [(path, page) for page in pages]
+    done = 0
+    if len(tasks) > 1 and INVOICE_PARSE_WORKERS > 1:
+        window = deque()
+        try:
+            pool = _get_parse_pool()
+            upcoming = iter(tasks)
+            for t in islice(upcoming, INVOICE_PARSE_WORKERS * 2):
+                window.append(pool.submit(parse_page, t))
+            while window:
+                result = window.popleft().result(timeout=_remaining(deadline))
+                nxt = next(upcoming, None)
+                if nxt is not None:
+                    window.append(pool.submit(parse_page, nxt))
+                done += 1
+                yield result
+        except BrokenProcessPool as e:
+            print("Invoice parse pool broke, parsing in-process:", e)
+            _reset_parse_pool()
+        except (TimeoutError, FutureTimeoutError):
+            raise TimeoutError('invoice parse timed out')
+        finally:
+            for fut in window:
+                fut.cancel()
+    for t in tasks[done:]:
+        _remaining(deadline)
+        yield parse_page(t)
+
+def iter_page_tables(path, pages, deadline=None):
+    """Like iter_page_results, with each table already turned into invoice rows."""
+    for report, frames in iter_page_results(path, pages, deadline):
+        observe_page(report)
+        tables = [table_to_rows(df) for df in frames]
+        report['table_rows'] = [len(t) for t in tables]
+        yield report, tables
+
+def parse_pdf_pages(path, deadline=None, progress=None):
+    """
+    Parse every page of the PDF (in parallel when there is more than one) and return
+    (rows in page order, per-page reports with flavor and timings).
+    `progress(pages_done, pages_total)` is called as pages finish.
+    """
+    pages = pdf_pages(path)
     rows = []
-    for t in tables:
-        df = t.df  # pandas DataFrame
-        # assume first row is header
-        if df.shape[0] < 2:
-            continue
-        headers = [str(h).strip().lower() for h in df.iloc[0].tolist()]
-        for i in range(1, df.shape[0]):
-            row = df.iloc[i].tolist()
-            # heuristic mapping
-            # find likely columns (description, batch, expiry, qty, price)
-            row_obj = {
-                'raw': [str(c).strip() for c in row],
-                'description': None,
-                'batch': None,
-                'expiry': None,
-                'quantity': None,
-                'price': None,
-            }
-            for col_idx, cell in enumerate(row):
-                h = headers[col_idx] if col_idx < len(headers) else ''
-                cell_text = str(cell).strip()
-                if 'description' in h or 'item' in h or 'product' in h or 'medicine' in h:
-                    row_obj['description'] = cell_text
-                elif 'batch' in h or 'batch no' in h or 'batch#' in h:
-                    row_obj['batch'] = cell_text
-                elif 'exp' in h or 'expiry' in h or 'e/d' in h:
-                    row_obj['expiry'] = cell_text
-                elif 'qty' in h or 'quantity' in h:
-                    row_obj['quantity'] = cell_text
-                elif 'price' in h or 'rate' in h or 'amount' in h:
-                    row_obj['price'] = cell_text
-            # fallback attempts: if any keys missing, attempt to find by regex in the full row
-            # ensure description not null
-            if not row_obj['description']:
-                # try the longest text cell as description
-                longest = max([str(c).strip() for c in row], key=len)
-                row_obj['description'] = longest
-            rows.append(row_obj)
+    reports = []
+    for report, tables in iter_page_tables(path, pages, deadline):
+        for table in tables:
+            rows.extend(table)
+        reports.append(report)
+        if progress:
+            progress(len(reports), len(pages))
+    return rows, reports
+
+def parse_pdf_with_camelot(path):
+    rows, _ = parse_pdf_pages(path)
     return rows
 
+# -------------------------
+# Parse result cache: results are stored on disk under the SHA-256 of the uploaded
+# bytes (computed while the upload is written to the temp file) plus PARSER_VERSION,
+# so a re-uploaded PDF is answered without running camelot. Bump PARSER_VERSION
+# whenever parsing or row extraction changes output. INVOICE_CACHE_MAX_MB=0 disables.
+# /api/invoice/cache (stats, purge) needs "X-Admin-Token: <INVOICE_ADMIN_TOKEN>" and
+# is refused outright while INVOICE_ADMIN_TOKEN is unset.
+# -------------------------
+PARSER_VERSION = f"camelot-{package_version('camelot-py')}/pages-2"
+INVOICE_CACHE_DIR = os.environ.get(
+    'INVOICE_CACHE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'invoice_cache'))
+INVOICE_CACHE_MAX_MB = float(os.environ.get('INVOICE_CACHE_MAX_MB', 256))
+INVOICE_ADMIN_TOKEN = os.environ.get('INVOICE_ADMIN_TOKEN', '')
+parse_cache = ParseCache(INVOICE_CACHE_DIR, int(INVOICE_CACHE_MAX_MB * (1 << 20)))
+
+def save_and_lookup(f):
+    """Stream the upload to a temp file -> (path, sha256, cache key, cached result or None)."""
+    tmp = tempfile.NamedTemporaryFile(delete=False, suffix='.pdf')
+    tmp.close()
+    digest = save_upload(f, tmp.name)
+    key = ParseCache.key(digest, PARSER_VERSION)
+    cached = parse_cache.get(key) if parse_cache.enabled else None
+    return tmp.name, digest, key, cached
+
+def cache_parse_result(key, rows, pages):
+    # nothing parsed (a PDF without pages); don't pin that
+    if pages:
+        try:
+            parse_cache.put(key, {'rows': rows, 'pages': pages})
+        except OSError as e:
+            print("Invoice parse cache write failed:", e)
+
+# -------------------------
+# Optional description -> catalog matching, installed by the analytics app via
+# set_row_matcher(fn) where fn(descriptions, k) returns top-k candidate lists.
+# ?match=1 (&match_k=N) adds a 'matches' list to every parsed row.
+# -------------------------
+row_matcher = None
+
+def set_row_matcher(fn):
+    global row_matcher
+    row_matcher = fn
+
+def requested_match_k():
+    """k from ?match=1&match_k=N, or None when no matching was asked for (or possible)."""
+    if row_matcher is None or request.args.get('match') not in ('1', 'true', 'yes'):
+        return None
+    try:
+        return max(1, min(int(request.args.get('match_k', 3)), 20))
+    except ValueError:
+        return 3
+
+def with_matches(rows, k):
+    if k is None or not rows:
+        return rows
+    matches = row_matcher([r.get('description') or '' for r in rows], k)
+    return [dict(r, matches=m) for r, m in zip(rows, matches)]
+
+# -------------------------
+# Opt-in NDJSON streaming for /api/invoice/parse (?stream=1 or
+# Accept: application/x-ndjson). One JSON object per line:
+#   {"type": "start", "sha256": ..., "cache": "hit"|"miss", "pages": N}
+#   {"type": "table", "page": p, "table": k, "rows": n}      before a table's rows
+#   {"type": "row", "page": p, "table": k, "row": {...}}
+#   {"type": "page", "page": p, "flavor": ..., "seconds": ..., ...}   page finished
+#   {"type": "end", "rows": total, "parse_seconds": ...}  or  {"type": "error", ...}
+# Rows go out as soon as their page is parsed and are not kept, so a streamed parse
+# is not written to the parse cache (cache hits are still streamed from it).
+# -------------------------
+def wants_ndjson():
+    if request.args.get('stream') in ('1', 'true', 'yes'):
+        return True
+    return request.accept_mimetypes.best == 'application/x-ndjson'
+
+def _cached_page_tables(cached):
+    """Rebuild (page report, [rows per table]) from a cached result."""
+    rows = iter(cached['rows'])
+    for report in cached['pages']:
+        yield report, [list(islice(rows, n)) for n in report.get('table_rows', [])]
+
+def ndjson_parse_stream(tmp_path, digest, cached, t0, match_k=None):
+    def line(obj):
+        return json.dumps(obj) + '\n'
+    total = 0
+    try:
+        if cached is not None:
+            n_pages = len(cached['pages'])
+            page_tables = _cached_page_tables(cached)
+        else:
+            pages = pdf_pages(tmp_path)
+            n_pages = len(pages)
+            page_tables = iter_page_tables(tmp_path, pages)
+        yield line({'type': 'start', 'sha256': digest, 'cache': 'miss' if cached is None else 'hit',
+                    'pages': n_pages})
+        for report, tables in page_tables:
+            page = report['page']
+            for k, rows in enumerate(tables):
+                yield line({'type': 'table', 'page': page, 'table': k, 'rows': len(rows)})
+                for row in with_matches(rows, match_k):
+                    yield line({'type': 'row', 'page': page, 'table': k, 'row': row})
+                total += len(rows)
+            yield line(dict(report, type='page'))
+        yield line({'type': 'end', 'rows': total, 'parse_seconds': round(time.perf_counter() - t0, 6)})
+    except Exception as e:
+        traceback.print_exc()
+        yield line({'type': 'error', 'error': str(e), 'rows': total})
+
+def _remove_upload(path):
+    try:
+        os.unlink(path)
+    except OSError:
+        pass
+
 @app.route('/api/invoice/parse', methods=['POST'])
 def parse_invoice():
     try:
@@ -71,26 +299,378 @@ def parse_invoice():
         if f.filename == '':
             return jsonify({'error': 'No selected file'}), 400
 
-        # save temporarily
-        tmp = tempfile.NamedTemporaryFile(delete=False, suffix='.pdf')
-        f.save(tmp.name)
-        tmp.flush()
-        tmp.close()
+        # save temporarily (hashed on the way for the cache lookup)
+        t0 = time.perf_counter()
+        tmp_path, digest, key, cached = save_and_lookup(f)
+
+        if wants_ndjson():
+            resp = Response(ndjson_parse_stream(tmp_path, digest, cached, t0, requested_match_k()),
+                            mimetype='application/x-ndjson')
+            # runs when the response is closed, also if the stream was never started
+            resp.call_on_close(lambda: _remove_upload(tmp_path))
+            return resp
+
+        try:
+            if cached is None:
+                rows, pages = parse_pdf_pages(tmp_path)
+                cache_parse_result(key, rows, pages)
+            else:
+                rows, pages = cached['rows'], cached['pages']
+            parse_seconds = round(time.perf_counter() - t0, 6)
+        finally:
+            # cleanup (also when the upload isn't a readable PDF)
+            _remove_upload(tmp_path)
+
+        return jsonify({'rows': with_matches(rows, requested_match_k()), 'pages': pages, 'parse_seconds': parse_seconds,
+                        'cache': 'miss' if cached is None else 'hit', 'sha256': digest})
+
+    except Exception as e:
+        traceback.print_exc()
+        return jsonify({'error': str(e)}), 500
+
+# -------------------------
+# Async parse jobs: POST /api/invoice/jobs stores the upload and returns a job id
+# straight away; a small thread pool runs the parses so slow PDFs never hold a request
+# worker. Poll /api/invoice/jobs/<id> for status and progress and fetch the rows from
+# /api/invoice/jobs/<id>/result. Beyond INVOICE_JOB_QUEUE_MAX unfinished jobs new
+# uploads get a 429; finished jobs are forgotten after INVOICE_JOB_TTL_SECONDS.
+# Each job parses in a child process of its own (with its own page pool), which is
+# killed once INVOICE_JOB_TIMEOUT_SECONDS (counted from submission) have passed, so a
+# page stuck in camelot can't outlive the deadline. Each job has a small status file
+# (<id>.json: status, progress) and, once parsed, a rows file (<id>.rows.json) read
+# only by the result endpoint, both under INVOICE_JOB_DIR (default: <cache dir>/jobs),
+# so any gunicorn worker sharing that directory can answer a poll.
+# -------------------------
+INVOICE_JOB_WORKERS = max(1, int(os.environ.get('INVOICE_JOB_WORKERS', 2)))
+INVOICE_JOB_QUEUE_MAX = max(1, int(os.environ.get('INVOICE_JOB_QUEUE_MAX', 16)))
+INVOICE_JOB_TIMEOUT_SECONDS = float(os.environ.get('INVOICE_JOB_TIMEOUT_SECONDS', 120))
+INVOICE_JOB_TTL_SECONDS = float(os.environ.get('INVOICE_JOB_TTL_SECONDS', 600))
+INVOICE_JOB_DIR = os.environ.get('INVOICE_JOB_DIR') or os.path.join(INVOICE_CACHE_DIR, 'jobs')
+
+JOB_FINISHED = ('done', 'failed', 'timeout')
+
+_job_executor = ThreadPoolExecutor(max_workers=INVOICE_JOB_WORKERS, thread_name_prefix='invoice-job')
+_job_processes = set()
+
+def _kill_job_processes():
+    for proc in list(_job_processes):
+        _kill_process_group(proc)
+
+atexit.register(_kill_job_processes)
+
+JOB_SUFFIX = '.json'
+JOB_ROWS_SUFFIX = '.rows.json'
+# what goes to <id>.rows.json (read by /result only) rather than the status file
+JOB_RESULT_KEYS = ('rows', 'pages')
+
+def _job_path(root, job_id, suffix=JOB_SUFFIX):
+    if len(job_id) != 32 or any(c not in '0123456789abcdef' for c in job_id):
+        return None
+    return os.path.join(root, job_id + suffix)
 
-        rows = parse_pdf_with_camelot(tmp.name)
+def _write_json(root, path, value):
+    fd, tmp = tempfile.mkstemp(dir=root, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(value, f)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+
+def _read_json(path):
+    if path is None:
+        return None
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def save_job(root, job):
+    """
+    Atomically write the job's status file, and its rows file first when `job` holds
+    the result, so a 'done' status always has rows to go with it. The monotonic
+    deadline stays in this process.
+    """
+    os.makedirs(root, exist_ok=True)
+    if 'rows' in job:
+        _write_json(root, _job_path(root, job['id'], JOB_ROWS_SUFFIX), {k: job[k] for k in JOB_RESULT_KEYS})
+    _write_json(root, _job_path(root, job['id']),
+                {k: v for k, v in job.items() if k != 'deadline' and k not in JOB_RESULT_KEYS})
+
+def load_job(root, job_id):
+    """The job's status (no rows), or None for an unknown id."""
+    return _read_json(_job_path(root, job_id))
+
+def load_job_result(root, job_id):
+    """{'rows': [...], 'pages': [...]} of a finished job, or None."""
+    return _read_json(_job_path(root, job_id, JOB_ROWS_SUFFIX))
 
-        # cleanup
+def _job_status_files(root, newer_than=None):
+    """(job id, mtime) of the status files in `root`, optionally only those modified after `newer_than`."""
+    try:
+        entries = list(os.scandir(root))
+    except FileNotFoundError:
+        return []
+    out = []
+    for entry in entries:
+        if not entry.name.endswith(JOB_SUFFIX) or entry.name.endswith(JOB_ROWS_SUFFIX):
+            continue
         try:
-            os.unlink(tmp.name)
-        except:
+            mtime = entry.stat().st_mtime
+        except FileNotFoundError:
+            continue
+        if newer_than is None or mtime > newer_than:
+            out.append((entry.name[:-len(JOB_SUFFIX)], mtime))
+    return out
+
+def _pending_jobs():
+    """
+    Unfinished jobs across workers. A job's status file is rewritten as it progresses
+    and no job runs past its deadline, so only files touched within the timeout can
+    belong to one.
+    """
+    since = time.time() - INVOICE_JOB_TIMEOUT_SECONDS
+    pending = 0
+    for job_id, _ in _job_status_files(INVOICE_JOB_DIR, since):
+        job = load_job(INVOICE_JOB_DIR, job_id)
+        if job is not None and job['status'] not in JOB_FINISHED:
+            pending += 1
+    return pending
+
+def _job_view(job):
+    return {k: v for k, v in job.items() if k not in ('path', 'deadline', 'cache_key') + JOB_RESULT_KEYS}
+
+def _prune_jobs():
+    """
+    Forget finished jobs past their TTL, and jobs whose worker died before finishing
+    them. Status files untouched for the TTL are the only ones read; rows never are.
+    """
+    now = time.time()
+    for job_id, mtime in _job_status_files(INVOICE_JOB_DIR):
+        if now - mtime <= INVOICE_JOB_TTL_SECONDS:
+            continue
+        job = load_job(INVOICE_JOB_DIR, job_id)
+        if job is not None and job['status'] not in JOB_FINISHED and now - job['deadline_at'] <= INVOICE_JOB_TTL_SECONDS:
+            continue
+        for suffix in (JOB_ROWS_SUFFIX, JOB_SUFFIX):
+            try:
+                os.unlink(_job_path(INVOICE_JOB_DIR, job_id, suffix))
+            except OSError:
+                pass
+
+def _parse_job_process(root, job):
+    """Body of a job's parse process: parse the upload, recording progress and the result in the job file."""
+    global _parse_pool, _parse_pool_lock
+    if hasattr(os, 'setsid'):
+        # own process group, so a timeout kill takes this process's page pool down with it
+        os.setsid()
+    # a forked child inherits the parent's pool object (not its processes) and possibly
+    # a lock some other parent thread held at fork time
+    _parse_pool, _parse_pool_lock = None, threading.Lock()
+
+    def progress(done, total):
+        job.update(pages_done=done, pages_total=total)
+        save_job(root, job)
+
+    try:
+        t0 = time.perf_counter()
+        rows, pages = parse_pdf_pages(job['path'], progress=progress)
+        job.update(rows=rows, pages=pages, row_count=len(rows), parse_seconds=round(time.perf_counter() - t0, 6),
+                   status='done')
+    except Exception as e:
+        traceback.print_exc()
+        job.update(error=str(e), status='failed')
+    finally:
+        _reset_parse_pool()
+    save_job(root, job)
+
+def _kill_process_group(proc):
+    try:
+        if hasattr(os, 'killpg'):
+            os.killpg(proc.pid, signal.SIGKILL)
+        else:
+            proc.kill()
+    except (ProcessLookupError, PermissionError):
+        pass
+    proc.join()
+
+def _run_parse_job(job):
+    job['status'] = 'running'
+    job['started_at'] = time.time()
+    try:
+        save_job(INVOICE_JOB_DIR, job)
+        proc = multiprocessing.Process(target=_parse_job_process, args=(INVOICE_JOB_DIR, job),
+                                       name=f"invoice-job-{job['id']}")
+        proc.start()
+        _job_processes.add(proc)
+        try:
+            proc.join(max(0.0, job['deadline'] - time.monotonic()))
+            if proc.is_alive():
+                _kill_process_group(proc)
+                job['error'] = 'invoice parse timed out'
+                job['status'] = 'timeout'
+            else:
+                status = load_job(INVOICE_JOB_DIR, job['id']) or {}
+                result = load_job_result(INVOICE_JOB_DIR, job['id']) if status.get('status') == 'done' else None
+                if result is not None:
+                    job.update(status)
+                    # the pages were timed in the child; record them with this process's metrics
+                    for report in result['pages']:
+                        observe_page(report)
+                    cache_parse_result(job['cache_key'], result['rows'], result['pages'])
+                else:
+                    job['error'] = status.get('error') or f"parse process exited with code {proc.exitcode}"
+                    job['status'] = 'failed'
+        finally:
+            _job_processes.discard(proc)
+    except Exception as e:
+        traceback.print_exc()
+        job['error'] = str(e)
+        job['status'] = 'failed'
+    finally:
+        job['finished_at'] = time.time()
+        try:
+            save_job(INVOICE_JOB_DIR, job)
+        except OSError as e:
+            print("Invoice job state write failed:", e)
+        try:
+            os.unlink(job['path'])
+        except OSError:
             pass
 
-        return jsonify({'rows': rows})
+@app.route('/api/invoice/jobs', methods=['POST'])
+def submit_parse_job():
+    try:
+        if 'file' not in request.files:
+            return jsonify({'error': 'No file part'}), 400
+        f = request.files['file']
+        if f.filename == '':
+            return jsonify({'error': 'No selected file'}), 400
+
+        tmp_path, digest, key, cached = save_and_lookup(f)
 
+        _prune_jobs()
+        pending = _pending_jobs()
+        if cached is None and pending >= INVOICE_JOB_QUEUE_MAX:
+            os.unlink(tmp_path)
+            resp = jsonify({'error': 'Too many invoice parse jobs queued', 'queued': pending,
+                            'queue_max': INVOICE_JOB_QUEUE_MAX})
+            resp.headers['Retry-After'] = '5'
+            return resp, 429
+        job_id = uuid.uuid4().hex
+        submitted_at = time.time()
+        job = {
+            'id': job_id,
+            'filename': f.filename,
+            'status': 'queued',
+            'submitted_at': submitted_at,
+            'started_at': None,
+            'finished_at': None,
+            'pages_done': 0,
+            'pages_total': None,
+            'error': None,
+            'path': tmp_path,
+            'sha256': digest,
+            'cache_key': key,
+            'cache': 'miss' if cached is None else 'hit',
+            'deadline': time.monotonic() + INVOICE_JOB_TIMEOUT_SECONDS,
+            'deadline_at': submitted_at + INVOICE_JOB_TIMEOUT_SECONDS,
+        }
+        if cached is not None:
+            # answered from the cache: the job is finished before anyone polls it
+            job.update(status='done', rows=cached['rows'], pages=cached['pages'],
+                       row_count=len(cached['rows']), parse_seconds=0.0,
+                       pages_done=len(cached['pages']), pages_total=len(cached['pages']),
+                       started_at=submitted_at, finished_at=time.time())
+        save_job(INVOICE_JOB_DIR, job)
+        if cached is None:
+            _job_executor.submit(_run_parse_job, job)
+        else:
+            os.unlink(tmp_path)
+
+        return jsonify({
+            'job_id': job_id,
+            'status': job['status'],
+            'status_url': f"/api/invoice/jobs/{job_id}",
+            'result_url': f"/api/invoice/jobs/{job_id}/result"
+        }), 202
+    except Exception as e:
+        traceback.print_exc()
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/invoice/jobs/<job_id>', methods=['GET'])
+def parse_job_status(job_id):
+    _prune_jobs()
+    job = load_job(INVOICE_JOB_DIR, job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown job id'}), 404
+    return jsonify(_job_view(job))
+
+@app.route('/api/invoice/jobs/<job_id>/result', methods=['GET'])
+def parse_job_result(job_id):
+    job = load_job(INVOICE_JOB_DIR, job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown job id'}), 404
+    if job['status'] == 'done':
+        result = load_job_result(INVOICE_JOB_DIR, job_id)
+        if result is None:
+            return jsonify({'error': 'Job result is no longer available'}), 410
+        return jsonify({'job_id': job_id, 'rows': with_matches(result['rows'], requested_match_k()),
+                        'pages': result['pages'], 'parse_seconds': job['parse_seconds']})
+    if job['status'] == 'timeout':
+        return jsonify(_job_view(job)), 504
+    if job['status'] == 'failed':
+        return jsonify(_job_view(job)), 500
+    return jsonify(_job_view(job)), 202
+
+def cache_admin_error():
+    """Error response unless the caller sent the invoice admin token."""
+    if not INVOICE_ADMIN_TOKEN:
+        return jsonify({'error': 'cache admin is disabled (INVOICE_ADMIN_TOKEN is not set)'}), 403
+    supplied = request.headers.get('X-Admin-Token') or ''
+    if not hmac.compare_digest(supplied, INVOICE_ADMIN_TOKEN):
+        return jsonify({'error': 'invalid or missing X-Admin-Token'}), 403
+    return None
+
+@app.route('/api/invoice/cache', methods=['GET', 'DELETE'])
+def parse_cache_admin():
+    """
+    GET: cache size, hit/miss counters and the most recently used entries (?entries=N).
+    DELETE: purge everything, or one entry with ?key=<cache key>.
+    Both need the X-Admin-Token header.
+    """
+    denied = cache_admin_error()
+    if denied:
+        return denied
+    try:
+        if request.method == 'DELETE':
+            removed = parse_cache.purge(request.args.get('key') or None)
+            return jsonify({'status': 'ok', 'removed': removed})
+        try:
+            list_entries = max(0, int(request.args.get('entries', 20)))
+        except ValueError:
+            return jsonify({'error': 'entries must be an integer'}), 400
+        return jsonify(dict(parse_cache.stats(list_entries), parser_version=PARSER_VERSION))
     except Exception as e:
         traceback.print_exc()
         return jsonify({'error': str(e)}), 500
 
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    return app.response_class(metrics_registry.render(), content_type=METRICS_CONTENT_TYPE)
+
+def register_routes(target_app):
+    """Register the invoice endpoints (sync parse + async jobs) on another Flask app."""
+    target_app.add_url_rule('/api/invoice/parse', 'invoice_parse', parse_invoice, methods=['POST'])
+    target_app.add_url_rule('/api/invoice/jobs', 'invoice_job_submit', submit_parse_job, methods=['POST'])
+    target_app.add_url_rule('/api/invoice/jobs/<job_id>', 'invoice_job_status', parse_job_status, methods=['GET'])
+    target_app.add_url_rule('/api/invoice/jobs/<job_id>/result', 'invoice_job_result', parse_job_result,
+                            methods=['GET'])
+    target_app.add_url_rule('/api/invoice/cache', 'invoice_cache_admin', parse_cache_admin,
+                            methods=['GET', 'DELETE'])
+
 # --- ADD BELOW INTO analytics-service/invoice_service.py ---
 
 from flask import request, jsonify
@@ -116,7 +696,7 @@ def mock_predict_demand():
                 # try parse as simple int string
                 try:
                     mnum = int(month)
-                except:
+                except ValueError:
                     mnum = 1
         elif isinstance(month, (int, float)):
             mnum = int(month)
@@ -161,10 +741,10 @@ def mock_predict_risk():
 def MathSafe(v):
     try:
         return int(v)
-    except:
+    except (TypeError, ValueError):
         try:
             return round(float(v), 2)
-        except:
+        except (TypeError, ValueError):
             return v
 
 # --- END ADDITION ---
@@ -0,0 +1,192 @@
+# analytics-service/medicine_matcher.py
+"""
+Fuzzy matching of free-text invoice descriptions to medicine catalog names.
+
+"PARACETAMOL 500 MG TAB" and "Paracetamol 500mg Tablets" normalise to nearly the
+same tokens (lower case, strengths glued to their units, dosage-form abbreviations
+expanded). Every catalog name is indexed by the character trigrams of its tokens in
+an inverted index with idf weights; a query scores only the catalog entries that
+share a trigram with it (weighted cosine) and returns the top k. The matcher is
+built once per trained generation.
+
+    python medicine_matcher.py --skus 1000 20000 50000
+
+prints build time and per-query latency on synthetic catalogs.
+"""
+import math
+import re
+
+import numpy as np
+
+_STRENGTH = re.compile(r'(\d+(?:\.\d+)?)\s*(mg|mcg|ml|g|iu|%)(?![a-z])')
+_NON_WORD = re.compile(r'[^a-z0-9.%]+')
+
+# dosage-form abbreviations seen on supplier invoices -> catalog spelling
+FORM_SYNONYMS = {
+    'tab': 'tablets', 'tabs': 'tablets', 'tablet': 'tablets',
+    'cap': 'capsules', 'caps': 'capsules', 'capsule': 'capsules',
+    'inj': 'injection', 'injections': 'injection',
+    'syp': 'syrup', 'syr': 'syrup', 'susp': 'suspension',
+}
+
+
+# grams in more than this share of a large catalog ("tab", "mg " ...) are too common to
+# pick candidates with cheaply; candidates come from the rarer grams and are then
+# rescored over all their grams
+STOP_GRAM_FRACTION = 0.05
+STOP_GRAM_MIN_DF = 500
+# candidates rescored per query (at least, k * 10 when k is larger)
+RESCORE_CANDIDATES = 64
+
+
+def normalize(text):
+    """Lower-cased, unit-glued, synonym-expanded tokens of a description."""
+    text = str(text or '').lower()
+    text = _STRENGTH.sub(r'\1\2', text)
+    tokens = []
+    for tok in _NON_WORD.split(text):
+        tok = tok.strip('.')
+        if tok:
+            tokens.append(FORM_SYNONYMS.get(tok, tok))
+    return tokens
+
+
+def trigrams(tokens):
+    grams = set()
+    for tok in tokens:
+        padded = f" {tok} "
+        for i in range(len(padded) - 2):
+            grams.add(padded[i:i + 3])
+    return grams
+
+
+class MedicineMatcher:
+
+    def __init__(self, catalog):
+        self.catalog = list(catalog)
+        self._exact = {}
+        gram_ids = {}
+        doc_grams = []
+        for i, name in enumerate(self.catalog):
+            tokens = normalize(name)
+            self._exact.setdefault(' '.join(tokens), i)
+            doc_grams.append(sorted(gram_ids.setdefault(g, len(gram_ids)) for g in trigrams(tokens)))
+        self._gram_ids = gram_ids
+
+        n = max(len(self.catalog), 1)
+        # doc x gram incidence in CSR form
+        self._indptr = np.zeros(len(doc_grams) + 1, dtype=np.int64)
+        self._indptr[1:] = np.cumsum([len(g) for g in doc_grams])
+        self._indices = np.fromiter((g for grams in doc_grams for g in grams), dtype=np.int32,
+                                    count=int(self._indptr[-1]))
+        df = np.bincount(self._indices, minlength=len(gram_ids))
+        # squared idf is the weight of a shared gram in the cosine numerator
+        self._weight = np.log1p(n / np.maximum(df, 1)) ** 2
+        self._unseen_weight = math.log1p(n) ** 2
+        self._norms = np.sqrt(np.add.reduceat(self._weight[self._indices], self._indptr[:-1])
+                              if len(self._indices) else np.zeros(len(doc_grams)))
+        self._norms[np.diff(self._indptr) == 0] = 1.0
+
+        # inverted index: gram id -> catalog ids, grouped by gram
+        order = np.argsort(self._indices, kind='stable')
+        self._post_docs = np.repeat(np.arange(len(doc_grams), dtype=np.int32), np.diff(self._indptr))[order]
+        self._post_ptr = np.zeros(len(gram_ids) + 1, dtype=np.int64)
+        self._post_ptr[1:] = np.cumsum(df)
+        self._common = df > max(STOP_GRAM_MIN_DF, int(n * STOP_GRAM_FRACTION))
+
+    def __len__(self):
+        return len(self.catalog)
+
+    def _candidates(self, gram_ids):
+        """Catalog ids sharing a gram with the query, by partial score, best first."""
+        rare = [g for g in gram_ids if not self._common[g]] or gram_ids
+        postings = [self._post_docs[self._post_ptr[g]:self._post_ptr[g + 1]] for g in rare]
+        weights = np.repeat(self._weight[rare], [len(p) for p in postings])
+        partial = np.bincount(np.concatenate(postings), weights=weights, minlength=len(self.catalog))
+        return np.flatnonzero(partial), partial
+
+    def match(self, description, k=3):
+        """Top-k [{'medicine', 'score'}] for one description, best first (score in 0..1)."""
+        tokens = normalize(description)
+        if not tokens or not self.catalog:
+            return []
+        exact = self._exact.get(' '.join(tokens))
+        query_grams = trigrams(tokens)
+        known = [self._gram_ids[g] for g in query_grams if g in self._gram_ids]
+        if not known:
+            return [{'medicine': self.catalog[exact], 'score': 1.0}] if exact is not None else []
+
+        candidates, partial = self._candidates(known)
+        limit = max(RESCORE_CANDIDATES, int(k) * 10)
+        if len(candidates) > limit:
+            keep = np.argpartition(-partial[candidates], limit - 1)[:limit]
+            candidates = candidates[keep]
+        if exact is not None and exact not in candidates:
+            candidates = np.append(candidates, exact)
+
+        # exact cosine over every gram of the shortlisted candidates
+        in_query = np.zeros(len(self._weight), dtype=bool)
+        in_query[known] = True
+        starts, ends = self._indptr[candidates], self._indptr[candidates + 1]
+        grams = np.concatenate([self._indices[s:e] for s, e in zip(starts, ends)])
+        shared = np.where(in_query[grams], self._weight[grams], 0.0)
+        offsets = np.concatenate(([0], np.cumsum(ends - starts)[:-1]))
+        dots = np.add.reduceat(shared, offsets)
+        q_norm = math.sqrt(self._weight[known].sum() + (len(query_grams) - len(known)) * self._unseen_weight)
+        scores = dots / (self._norms[candidates] * q_norm)
+        if exact is not None:
+            scores[candidates == exact] = 1.0
+
+        k = max(1, min(int(k), len(candidates)))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind='stable')]
+        return [{'medicine': self.catalog[candidates[j]], 'score': round(float(min(scores[j], 1.0)), 4)}
+                for j in top]
+
+    def match_many(self, descriptions, k=3):
+        return [self.match(d, k) for d in descriptions]
+
+    def best(self, description, threshold):
+        """Best catalog name if its score reaches `threshold`, else None."""
+        found = self.match(description, 1)
+        if found and found[0]['score'] >= threshold:
+            return found[0]['medicine'], found[0]['score']
+        return None
+
+
+def _synthetic_catalog(n_skus, seed=42):
+    rng = np.random.default_rng(seed)
+    stems = ['Paracetamol', 'Amoxicillin', 'Ibuprofen', 'Metformin', 'Atorvastatin', 'Omeprazole',
+             'Cetirizine', 'Azithromycin', 'Losartan', 'Amlodipine', 'Pantoprazole', 'Diclofenac']
+    forms = ['Tablets', 'Capsules', 'Syrup 100ml', 'Injection 10ml', 'Suspension 60ml']
+    names = set()
+    while len(names) < n_skus:
+        stem = stems[rng.integers(len(stems))] + ''.join(rng.choice(list('abcdefghij'), 3))
+        names.add(f"{stem} {int(rng.choice([5, 10, 20, 40, 250, 500, 650]))}mg {forms[rng.integers(len(forms))]}")
+    return sorted(names)
+
+
+if __name__ == '__main__':
+    import argparse
+    import json
+    import time
+
+    parser = argparse.ArgumentParser(description='Measure matcher build time and query latency.')
+    parser.add_argument('--skus', type=int, nargs='+', default=[1000, 20000, 50000])
+    parser.add_argument('--queries', type=int, default=500)
+    args = parser.parse_args()
+
+    for n in args.skus:
+        catalog = _synthetic_catalog(n)
+        t0 = time.perf_counter()
+        matcher = MedicineMatcher(catalog)
+        build = time.perf_counter() - t0
+        queries = [name.upper().replace('MG ', ' MG ').replace('TABLETS', 'TAB').replace('CAPSULES', 'CAP')
+                   for name in catalog[::max(1, n // args.queries)]]
+        t0 = time.perf_counter()
+        hits = sum(1 for q, name in zip(queries, catalog[::max(1, n // args.queries)])
+                   if matcher.match(q, 3)[0]['medicine'] == name)
+        per_query = (time.perf_counter() - t0) / len(queries)
+        print(json.dumps({'skus': n, 'build_seconds': round(build, 4), 'queries': len(queries),
+                          'top1_accuracy': round(hits / len(queries), 4),
+                          'ms_per_query': round(per_query * 1000.0, 4)}))
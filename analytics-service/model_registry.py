@@ -0,0 +1,132 @@
+# analytics-service/model_registry.py
+"""
+Double-buffered registry for the trained analytics models.
+
+A ModelGeneration is one complete, never-mutated set of models, catalogs, month
+maps and forecast matrices. Retraining builds the next generation off to the side
+(in a background worker) and publishes it with a single reference swap, so a
+request that grabbed `registry.current()` keeps using one consistent generation
+for its whole lifetime no matter when a retrain finishes.
+"""
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+
+class ModelGeneration:
+    """Read-only view over one trained state dict; keys are exposed as attributes."""
+
+    def __init__(self, state, version, source):
+        for value in state.values():
+            # freeze arrays built in-process (memory-mapped artifacts already are)
+            if isinstance(value, np.ndarray) and value.flags.writeable:
+                value.flags.writeable = False
+        self.state = dict(state)
+        self.version = version
+        self.source = source
+        self.created_at = time.time()
+
+    def __getattr__(self, name):
+        try:
+            return self.__dict__['state'][name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def info(self):
+        return {
+            'version': self.version,
+            'source': self.source,
+            'created_at': self.created_at,
+            'age_seconds': round(time.time() - self.created_at, 3),
+        }
+
+
+class ModelRegistry:
+    """
+    Holds the current ModelGeneration and runs retrain jobs one at a time on a
+    background worker. Jobs are plain callables returning a JSON-able result dict;
+    they publish their new generation themselves via publish().
+    """
+
+    def __init__(self, max_jobs_kept=50):
+        self._current = None
+        self._version = 0
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self._listeners = []
+        self._max_jobs_kept = max_jobs_kept
+        # a single worker serialises retrains so generations are built in order
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='retrain')
+
+    def current(self):
+        return self._current
+
+    def publish(self, state, source):
+        with self._lock:
+            self._version += 1
+            generation = ModelGeneration(state, self._version, source)
+            self._current = generation
+        for listener in list(self._listeners):
+            try:
+                listener(generation)
+            except Exception:
+                traceback.print_exc()
+        return generation
+
+    def add_listener(self, fn):
+        """fn(generation) is called after every publish (e.g. to drop cached responses)."""
+        self._listeners.append(fn)
+
+    def submit(self, kind, fn):
+        job_id = uuid.uuid4().hex
+        job = {
+            'id': job_id,
+            'kind': kind,
+            'status': 'queued',
+            'submitted_at': time.time(),
+            'started_at': None,
+            'finished_at': None,
+            'result': None,
+            'error': None,
+        }
+        with self._lock:
+            self._jobs[job_id] = job
+            self._prune_jobs()
+        job['future'] = self._executor.submit(self._run, job, fn)
+        return job_id
+
+    def _run(self, job, fn):
+        job['status'] = 'running'
+        job['started_at'] = time.time()
+        try:
+            job['result'] = fn()
+            job['status'] = 'done'
+        except Exception as e:
+            traceback.print_exc()
+            job['error'] = str(e)
+            job['status'] = 'failed'
+        finally:
+            job['finished_at'] = time.time()
+        return job
+
+    def _prune_jobs(self):
+        finished = [j for j in self._jobs.values() if j['status'] in ('done', 'failed')]
+        finished.sort(key=lambda j: j['finished_at'] or 0)
+        while len(self._jobs) > self._max_jobs_kept and finished:
+            self._jobs.pop(finished.pop(0)['id'], None)
+
+    def wait(self, job_id, timeout=None):
+        job = self._jobs.get(job_id)
+        if job is not None:
+            job['future'].result(timeout=timeout)
+        return self.job(job_id)
+
+    def job(self, job_id):
+        job = self._jobs.get(job_id)
+        if job is None:
+            return None
+        return {k: v for k, v in job.items() if k != 'future'}
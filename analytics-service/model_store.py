@@ -0,0 +1,121 @@
+# analytics-service/model_store.py
+"""
+Versioned on-disk artifacts for the trained analytics models.
+
+An artifact is a joblib dump of everything train_models() produces, stored under a
+name derived from a content hash of the source CSVs (plus anything else that
+changes the trained result, e.g. the forecast horizon and the sklearn version).
+On startup the service loads the artifact whose hash matches the current data and
+only retrains when nothing matches.
+"""
+import hashlib
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process lock, atomic rename still protects readers
+    fcntl = None
+
+# bump when the layout of the saved state changes
+ARTIFACT_FORMAT_VERSION = 5
+ARTIFACT_PREFIX = 'analytics-models-'
+ARTIFACT_SUFFIX = '.joblib'
+
+
+def source_fingerprint(paths, extra=None):
+    """SHA-256 over the contents of `paths` (missing files hash as absent) and `extra`."""
+    h = hashlib.sha256()
+    h.update(f"format={ARTIFACT_FORMAT_VERSION}".encode())
+    for key in sorted(extra or {}):
+        h.update(f"|{key}={extra[key]}".encode())
+    for path in paths:
+        h.update(f"|{os.path.basename(path)}:".encode())
+        if not os.path.exists(path):
+            h.update(b'<absent>')
+            continue
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                h.update(chunk)
+    return h.hexdigest()
+
+
+def artifact_path(model_dir, fingerprint):
+    return os.path.join(model_dir, f"{ARTIFACT_PREFIX}{fingerprint[:16]}{ARTIFACT_SUFFIX}")
+
+
+def list_artifacts(model_dir):
+    if not os.path.isdir(model_dir):
+        return []
+    names = [n for n in os.listdir(model_dir) if n.startswith(ARTIFACT_PREFIX) and n.endswith(ARTIFACT_SUFFIX)]
+    paths = [os.path.join(model_dir, n) for n in names]
+    return sorted(paths, key=os.path.getmtime, reverse=True)
+
+
+def load_artifact(model_dir, fingerprint, mmap=True):
+    """
+    Return the saved state for `fingerprint`, or None if there is no usable artifact.
+    With mmap=True numpy arrays (the forecast matrices) are memory-mapped read-only
+    instead of copied into every worker.
+    """
+    path = artifact_path(model_dir, fingerprint)
+    if not os.path.exists(path):
+        return None
+    import joblib
+    try:
+        state = joblib.load(path, mmap_mode='r' if mmap else None)
+    except Exception as e:
+        print(f"[model_store] failed to load {path}:", e)
+        return None
+    meta = state.get('meta', {}) if isinstance(state, dict) else {}
+    if meta.get('format_version') != ARTIFACT_FORMAT_VERSION or meta.get('fingerprint') != fingerprint:
+        print(f"[model_store] ignoring stale artifact {path}")
+        return None
+    return state
+
+
+def save_artifact(state, model_dir, fingerprint, keep=3):
+    """Atomically write `state` for `fingerprint` and prune all but the newest `keep` artifacts."""
+    os.makedirs(model_dir, exist_ok=True)
+    state = dict(state)
+    state['meta'] = {
+        'format_version': ARTIFACT_FORMAT_VERSION,
+        'fingerprint': fingerprint,
+        'created_at': time.time(),
+    }
+    path = artifact_path(model_dir, fingerprint)
+    import joblib
+    fd, tmp = tempfile.mkstemp(dir=model_dir, suffix='.tmp')
+    os.close(fd)
+    try:
+        joblib.dump(state, tmp)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+    for old in list_artifacts(model_dir)[max(1, keep):]:
+        try:
+            os.unlink(old)
+        except OSError:
+            pass
+    return path
+
+
+@contextmanager
+def artifact_lock(model_dir):
+    """
+    Exclusive cross-process lock around "load or train and save", so that when several
+    gunicorn workers boot at once only the first one trains and the rest load its output.
+    """
+    os.makedirs(model_dir, exist_ok=True)
+    if fcntl is None:
+        yield
+        return
+    with open(os.path.join(model_dir, '.lock'), 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
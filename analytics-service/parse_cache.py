@@ -0,0 +1,138 @@
+# analytics-service/parse_cache.py
+"""
+Content-addressed on-disk cache for parsed invoice results.
+
+An entry is the JSON parse result of one PDF, stored under the SHA-256 of the
+uploaded bytes and the parser version, so re-uploading the same file skips camelot
+entirely and a parser change never serves old output. Entries are touched on every
+hit and the least recently used ones are evicted once the cache grows past its
+byte budget. Writes are atomic renames, so several workers can share one directory.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+
+ENTRY_SUFFIX = '.json'
+CHUNK_SIZE = 1 << 16
+
+
+def save_upload(file_storage, path):
+    """Stream a werkzeug upload to `path`, hashing it on the way. Returns the hex SHA-256."""
+    h = hashlib.sha256()
+    with open(path, 'wb') as out:
+        for chunk in iter(lambda: file_storage.stream.read(CHUNK_SIZE), b''):
+            h.update(chunk)
+            out.write(chunk)
+    return h.hexdigest()
+
+
+class ParseCache:
+
+    def __init__(self, root, max_bytes=256 << 20):
+        self.root = root
+        self.max_bytes = max(0, int(max_bytes))
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    @property
+    def enabled(self):
+        return self.max_bytes > 0
+
+    @staticmethod
+    def key(digest, parser_version):
+        return hashlib.sha256(f"{parser_version}:{digest}".encode()).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.root, key + ENTRY_SUFFIX)
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, encoding='utf-8') as f:
+                value = json.load(f)
+            os.utime(path)  # LRU order is mtime order
+        except (OSError, ValueError):
+            with self._lock:
+                self._misses += 1
+            return None
+        with self._lock:
+            self._hits += 1
+        return value
+
+    def put(self, key, value):
+        if not self.enabled:
+            return
+        os.makedirs(self.root, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.root, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(value, f)
+            os.replace(tmp, self._path(key))
+        finally:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+        self._evict()
+
+    def _scan(self):
+        out = []
+        if not os.path.isdir(self.root):
+            return out
+        for name in os.listdir(self.root):
+            if not name.endswith(ENTRY_SUFFIX):
+                continue
+            try:
+                st = os.stat(os.path.join(self.root, name))
+            except FileNotFoundError:
+                continue
+            out.append((st.st_mtime, st.st_size, name[:-len(ENTRY_SUFFIX)]))
+        out.sort(reverse=True)  # most recently used first
+        return out
+
+    def _evict(self):
+        total = 0
+        for _, size, key in self._scan():
+            total += size
+            if total > self.max_bytes:
+                try:
+                    os.unlink(self._path(key))
+                except FileNotFoundError:
+                    continue
+                with self._lock:
+                    self._evictions += 1
+
+    def purge(self, key=None):
+        """Remove one entry (or all of them). Returns the number removed."""
+        if key and (len(key) != 64 or any(c not in '0123456789abcdef' for c in key)):
+            return 0
+        keys = [key] if key else [k for _, _, k in self._scan()]
+        removed = 0
+        for k in keys:
+            try:
+                os.unlink(self._path(k))
+                removed += 1
+            except FileNotFoundError:
+                pass
+        return removed
+
+    def stats(self, list_entries=0):
+        entries = self._scan()
+        with self._lock:
+            lookups = self._hits + self._misses
+            out = {
+                'enabled': self.enabled,
+                'max_bytes': self.max_bytes,
+                'entries': len(entries),
+                'bytes': sum(size for _, size, _ in entries),
+                'hits': self._hits,
+                'misses': self._misses,
+                'hit_ratio': round(self._hits / lookups, 4) if lookups else 0.0,
+                'evictions': self._evictions,
+            }
+        if list_entries:
+            out['recent'] = [{'key': k, 'bytes': size, 'last_used': mtime}
+                             for mtime, size, k in entries[:list_entries]]
+        return out
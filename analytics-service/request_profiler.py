@@ -0,0 +1,255 @@
+# analytics-service/request_profiler.py
+"""
+Opt-in profiling of individual requests.
+
+A request is profiled when it carries `X-Profile: 1` together with the admin token
+(`X-Profile-Token`), or when it is the Nth matching request and sampling is on.
+While the handler runs, cProfile records the calls of the request thread and a
+sampler thread snapshots that thread's stack every few milliseconds. Each capture
+is written to the profile directory as
+
+    <id>.pstats      cProfile stats (python -m pstats, snakeviz, ...)
+    <id>.collapsed   "frame;frame;frame count" lines for flamegraph.pl / speedscope
+    <id>.json        route, status, duration, trigger, sample count
+
+and only the newest `keep` captures are kept. When neither the token nor sampling
+is configured, install() adds no hooks at all, so requests pay nothing.
+
+Only one request is profiled at a time (profilers are process-wide from Python
+3.12); requests arriving meanwhile run unprofiled. For streamed responses only the
+handler call is covered, not the body as it is sent.
+"""
+import cProfile
+import hmac
+import itertools
+import json
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+
+PROFILE_KINDS = {'pstats': 'application/octet-stream', 'collapsed': 'text/plain; charset=utf-8',
+                 'json': 'application/json'}
+_ID_RE = re.compile(r'^[0-9A-Za-z_.-]+$')
+
+
+def _frame_label(code):
+    filename = code.co_filename
+    marker = 'site-packages' + os.sep
+    if marker in filename:
+        filename = filename.split(marker, 1)[1]
+    else:
+        filename = os.path.basename(filename)
+    return f"{code.co_name} ({filename}:{code.co_firstlineno})".replace(';', ',')
+
+
+class StackSampler:
+    """Counts the stacks of one thread, sampled every `interval` seconds on a helper thread."""
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='profile-sampler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame.f_code))
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+                self.samples += 1
+
+    def collapsed(self):
+        return ''.join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+class _Capture:
+
+    def __init__(self, trigger, interval):
+        self.trigger = trigger
+        self.started = time.perf_counter()
+        self.started_at = time.time()
+        self.sampler = StackSampler(threading.get_ident(), interval).start()
+        self.profile = cProfile.Profile()
+        try:
+            self.profile.enable()
+        except ValueError:
+            # another profiler (a debugger, coverage) owns the hook; keep the sampler only
+            self.profile = None
+
+    def finish(self):
+        if self.profile is not None:
+            self.profile.disable()
+        self.sampler.stop()
+        return time.perf_counter() - self.started
+
+
+class RequestProfiler:
+
+    def __init__(self, root, keep=50, sample_every=0, token='', routes=(), interval_ms=2.0):
+        self.root = root
+        self.keep = max(1, int(keep))
+        self.sample_every = max(0, int(sample_every))
+        self.token = token or ''
+        self.routes = tuple(r for r in routes if r)
+        self.interval = max(0.0005, float(interval_ms) / 1000.0)
+        self._busy = threading.Lock()
+        self._counter = itertools.count(1)
+        self._seen = itertools.count(1)
+        self._local = threading.local()
+        self._stats_lock = threading.Lock()
+        self._captured = 0
+        self._skipped_busy = 0
+        self.on_capture = None  # fn(meta) after a capture is written
+
+    @property
+    def enabled(self):
+        return bool(self.token) or self.sample_every > 0
+
+    def authorized(self, supplied):
+        return bool(self.token) and hmac.compare_digest(str(supplied or ''), self.token)
+
+    def install(self, app):
+        """Register the before/teardown hooks on `app` (nothing when profiling is off)."""
+        if not self.enabled:
+            return False
+        from flask import request
+
+        @app.before_request
+        def _profile_start():
+            trigger = self._trigger(request)
+            if trigger is None:
+                return
+            if not self._busy.acquire(blocking=False):
+                with self._stats_lock:
+                    self._skipped_busy += 1
+                return
+            self._local.capture = _Capture(trigger, self.interval)
+
+        @app.after_request
+        def _profile_status(response):
+            if getattr(self._local, 'capture', None) is not None:
+                self._local.status = response.status_code
+            return response
+
+        @app.teardown_request
+        def _profile_finish(exc):
+            capture = getattr(self._local, 'capture', None)
+            if capture is None:
+                return
+            self._local.capture = None
+            try:
+                seconds = capture.finish()
+                status = getattr(self._local, 'status', None) or (500 if exc is not None else None)
+                self._save(capture, seconds, request.method, request.path,
+                           request.url_rule.rule if request.url_rule is not None else None, status)
+            except Exception as e:
+                print("[profiler] could not save profile:", e)
+            finally:
+                self._local.status = None
+                self._busy.release()
+
+        return True
+
+    def _trigger(self, req):
+        if self.routes and not req.path.startswith(self.routes):
+            return None
+        if req.headers.get('X-Profile') in ('1', 'true', 'yes'):
+            if self.authorized(req.headers.get('X-Profile-Token')):
+                return 'header'
+        if self.sample_every and next(self._seen) % self.sample_every == 0:
+            return 'sample'
+        return None
+
+    def _save(self, capture, seconds, method, path, rule, status):
+        os.makedirs(self.root, exist_ok=True)
+        stamp = time.strftime('%Y%m%dT%H%M%S', time.gmtime(capture.started_at))
+        slug = re.sub(r'[^0-9A-Za-z]+', '_', path).strip('_')[:60] or 'root'
+        profile_id = f"{stamp}-{os.getpid()}-{next(self._counter)}-{slug}"
+        base = os.path.join(self.root, profile_id)
+        if capture.profile is not None:
+            capture.profile.dump_stats(base + '.pstats')
+        with open(base + '.collapsed', 'w', encoding='utf-8') as f:
+            f.write(capture.sampler.collapsed())
+        meta = {
+            'id': profile_id,
+            'method': method,
+            'path': path,
+            'route': rule,
+            'status': status,
+            'trigger': capture.trigger,
+            'started_at': capture.started_at,
+            'duration_ms': round(seconds * 1000.0, 3),
+            'samples': capture.sampler.samples,
+            'sample_interval_ms': self.interval * 1000.0,
+            'pstats': capture.profile is not None,
+            'pid': os.getpid(),
+        }
+        # the .json is written last: a listed profile always has its other files
+        with open(base + '.json', 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        with self._stats_lock:
+            self._captured += 1
+        self._rotate()
+        if self.on_capture is not None:
+            self.on_capture(meta)
+        return meta
+
+    def _rotate(self):
+        for meta in self.list()[self.keep:]:
+            for kind in PROFILE_KINDS:
+                try:
+                    os.unlink(os.path.join(self.root, f"{meta['id']}.{kind}"))
+                except FileNotFoundError:
+                    pass
+
+    def list(self):
+        """Metadata of the kept captures, newest first."""
+        out = []
+        if not os.path.isdir(self.root):
+            return out
+        for name in os.listdir(self.root):
+            if not name.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(self.root, name), encoding='utf-8') as f:
+                    out.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        out.sort(key=lambda m: (m.get('started_at', 0), m.get('id', '')), reverse=True)
+        return out
+
+    def path(self, profile_id, kind):
+        """File of one capture, or None for unknown ids / kinds."""
+        if kind not in PROFILE_KINDS or not _ID_RE.match(profile_id or ''):
+            return None
+        path = os.path.join(self.root, f"{profile_id}.{kind}")
+        return path if os.path.isfile(path) else None
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                'enabled': self.enabled,
+                'header_trigger': bool(self.token),
+                'sample_every': self.sample_every,
+                'routes': list(self.routes),
+                'keep': self.keep,
+                'captured': self._captured,
+                'skipped_busy': self._skipped_busy,
+            }
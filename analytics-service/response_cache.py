@@ -0,0 +1,78 @@
+# analytics-service/response_cache.py
+"""
+Bounded LRU cache for prediction / metadata response bodies.
+
+Entries are keyed by (endpoint, normalized input, model generation), so a retrain
+never serves stale answers; the app also clears the cache when a new generation is
+published. ETags are derived from the same key, which lets a client revalidate with
+If-None-Match and get a 304 without the body being rebuilt.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+class ResponseCache:
+
+    def __init__(self, max_entries=512):
+        self.max_entries = max(0, int(max_entries))
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._not_modified = 0
+        self._evictions = 0
+        self._invalidations = 0
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return value
+
+    def put(self, key, value):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+
+    def invalidate(self):
+        with self._lock:
+            self._entries.clear()
+            self._invalidations += 1
+
+    def record_not_modified(self):
+        with self._lock:
+            self._not_modified += 1
+
+    @staticmethod
+    def etag(*parts):
+        """Opaque tag for a (endpoint, normalized input, generation, ...) tuple."""
+        return hashlib.sha1(repr(parts).encode('utf-8')).hexdigest()[:24]
+
+    def stats(self):
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                'enabled': self.enabled,
+                'max_entries': self.max_entries,
+                'entries': len(self._entries),
+                'hits': self._hits,
+                'misses': self._misses,
+                'hit_ratio': round(self._hits / lookups, 4) if lookups else 0.0,
+                'not_modified': self._not_modified,
+                'evictions': self._evictions,
+                'invalidations': self._invalidations,
+            }
@@ -0,0 +1,187 @@
+# analytics-service/risk_scoring.py
+"""
+Feature building and scoring helpers for the patient readmission-risk model.
+
+Everything here works on whole columns, so scoring N patients costs one pass of
+string parsing and one predict_proba call instead of N. CompiledRiskScorer covers
+the single-patient path.
+"""
+import math
+import time
+
+import numpy as np
+import pandas as pd
+
+# per-field defaults, same as the single-patient /api/predict/risk endpoint
+RISK_DEFAULTS = {
+    'age': 50.0,
+    'isSmoker': False,
+    'hr': 75.0,
+    'bp': '120/80',
+    'condition': 'None',
+}
+RISK_FEATURE_COLUMNS = ['age', 'isSmoker', 'hr', 'high_bp', 'condition']
+
+_TRUTHY = {'true', '1', 'yes', 'y', 't'}
+
+
+def _bool_column(col):
+    if col.dtype == bool:
+        return col
+    if pd.api.types.is_numeric_dtype(col):
+        return col.fillna(0).astype(bool)
+    # CSV uploads give "True"/"False" strings; astype(bool) would make both True
+    return col.astype(str).str.strip().str.lower().isin(_TRUTHY)
+
+
+def high_bp_flags(bp):
+    """Vectorised bp_flag: 1 when systolic > 140 or diastolic > 90, 0 if unparseable."""
+    parts = bp.astype(str).str.split('/', expand=True)
+    if parts.shape[1] < 2:
+        return pd.Series(0, index=bp.index, dtype=int)
+    sys_ = pd.to_numeric(parts[0].str.strip(), errors='coerce')
+    dia = pd.to_numeric(parts[1].str.strip(), errors='coerce')
+    flag = ((sys_ > 140) | (dia > 90)) & sys_.notna() & dia.notna()
+    return flag.astype(int)
+
+
+def build_risk_features(df):
+    """Raw patient frame (age, isSmoker, hr, bp, condition) -> model feature frame."""
+    df = df.reindex(columns=list(RISK_DEFAULTS))
+    X = pd.DataFrame(index=df.index)
+    X['age'] = pd.to_numeric(df['age'], errors='coerce').fillna(RISK_DEFAULTS['age']).astype(float)
+    X['isSmoker'] = _bool_column(df['isSmoker'].fillna(RISK_DEFAULTS['isSmoker'])).astype(int)
+    X['hr'] = pd.to_numeric(df['hr'], errors='coerce').fillna(RISK_DEFAULTS['hr']).astype(float)
+    X['high_bp'] = high_bp_flags(df['bp'].fillna(RISK_DEFAULTS['bp']))
+    X['condition'] = df['condition'].fillna(RISK_DEFAULTS['condition']).astype(str)
+    return X
+
+
+def rule_based_scores(X):
+    """Vectorised version of the rule-based fallback used when no model is trained."""
+    score = X['age'].to_numpy(dtype=float) / 100.0
+    score = score + np.where(X['isSmoker'].to_numpy() != 0, 0.8, 0.0)
+    score = score + np.where(X['high_bp'].to_numpy() != 0, 1.2, 0.0)
+    score = score + np.where(X['condition'].to_numpy() != 'None', 1.5, 0.0)
+    return np.minimum(0.99, score / 6.0)
+
+
+def score_features(pipeline, X, scorer=None):
+    """Risk probabilities for feature frame X (compiled scorer if given, else one predict_proba call)."""
+    if pipeline is None:
+        return rule_based_scores(X)
+    if scorer is not None:
+        return scorer.score_frame(X)
+    return pipeline.predict_proba(X[RISK_FEATURE_COLUMNS])[:, 1]
+
+
+def iter_chunks(frame_or_records, chunk_size):
+    """Yield DataFrames of at most chunk_size rows from a list of dicts or a DataFrame iterator."""
+    if isinstance(frame_or_records, list):
+        for start in range(0, len(frame_or_records), chunk_size):
+            yield pd.DataFrame.from_records(frame_or_records[start:start + chunk_size])
+    else:
+        for chunk in frame_or_records:
+            yield chunk
+
+
+def bp_is_high(bp):
+    """Scalar twin of high_bp_flags for the single-patient path."""
+    try:
+        parts = str(bp).split('/')
+        s_sys, s_dia = int(parts[0]), int(parts[1])
+        return 1 if (s_sys > 140 or s_dia > 90) else 0
+    except Exception:
+        return 0
+
+
+def condition_value(condition):
+    """Scalar twin of build_risk_features' condition column: null -> the 'None' default."""
+    if condition is None or (isinstance(condition, float) and math.isnan(condition)):
+        return RISK_DEFAULTS['condition']
+    return str(condition)
+
+
+class CompiledRiskScorer:
+    """
+    The fitted OneHotEncoder + LogisticRegression pipeline flattened into plain arrays:
+    a condition -> coefficient-column map, the coefficient vector and the intercept.
+    Scoring one patient is a dict lookup plus a 4-term dot product, with no pandas,
+    ColumnTransformer dispatch or sklearn input validation on the request path.
+    """
+
+    NUMERIC_FEATURES = ('age', 'isSmoker', 'hr', 'high_bp')
+
+    def __init__(self, condition_index, coef, intercept, numeric_index):
+        self.condition_index = dict(condition_index)
+        self.coef = np.asarray(coef, dtype=float)
+        self.intercept = float(intercept)
+        self.numeric_index = np.asarray(numeric_index, dtype=int)
+        # plain-float copies for the scalar path (numpy scalar ops cost more than they save here)
+        self._condition_weight = {c: float(self.coef[i]) for c, i in self.condition_index.items()}
+        self._numeric_weight = tuple(float(self.coef[i]) for i in self.numeric_index)
+
+    @classmethod
+    def from_pipeline(cls, pipeline):
+        preprocessor, clf = pipeline[0], pipeline[-1]
+        if clf.coef_.shape[0] != 1:
+            raise ValueError('expected a binary logistic model')
+        names = list(preprocessor.get_feature_names_out())
+        encoder = preprocessor.named_transformers_['cat']
+        if getattr(encoder, 'drop_idx_', None) is not None:
+            raise ValueError('one-hot encoder with dropped categories is not supported')
+        condition_index = {}
+        for category in encoder.categories_[0]:
+            condition_index[str(category)] = names.index(f"cat__condition_{category}")
+        numeric_index = [names.index(f"remainder__{f}") for f in cls.NUMERIC_FEATURES]
+        return cls(condition_index, clf.coef_[0], clf.intercept_[0], numeric_index)
+
+    def score(self, age, is_smoker, hr, high_bp, condition):
+        w = self._numeric_weight
+        z = (self.intercept + w[0] * age + w[1] * is_smoker + w[2] * hr + w[3] * high_bp
+             + self._condition_weight.get(condition, 0.0))
+        # numerically stable logistic
+        if z >= 0:
+            return 1.0 / (1.0 + math.exp(-z))
+        ez = math.exp(z)
+        return ez / (1.0 + ez)
+
+    def score_frame(self, X):
+        """Vectorised scores for a feature frame from build_risk_features()."""
+        numeric = X[list(self.NUMERIC_FEATURES)].to_numpy(dtype=float)
+        z = self.intercept + numeric @ self.coef[self.numeric_index]
+        cond_w = pd.Series(self._condition_weight, dtype=float)
+        z = z + X['condition'].map(cond_w).fillna(0.0).to_numpy(dtype=float)
+        return 1.0 / (1.0 + np.exp(-z))
+
+    def verify(self, pipeline, X, tolerance=1e-9, latency_samples=100):
+        """
+        Parity check against the sklearn pipeline on feature frame X (raises if any
+        score differs by more than `tolerance`) plus p50/p99 single-row latency of both
+        paths over `latency_samples` rows. Returns a report dict.
+        """
+        expected = pipeline.predict_proba(X[RISK_FEATURE_COLUMNS])[:, 1]
+        compiled = np.array([self.score(*row) for row in X[RISK_FEATURE_COLUMNS].itertuples(index=False)])
+        max_diff = float(np.max(np.abs(expected - compiled))) if len(X) else 0.0
+        if max_diff > tolerance:
+            raise ValueError(f"compiled risk scorer differs from pipeline by {max_diff}")
+        report = {'parity_rows': int(len(X)), 'parity_max_abs_diff': max_diff}
+
+        sample = X.head(latency_samples)
+        if len(sample):
+            old, new = [], []
+            for row in sample.to_dict('records'):
+                t0 = time.perf_counter()
+                pipeline.predict_proba(pd.DataFrame([row])[RISK_FEATURE_COLUMNS])
+                old.append(time.perf_counter() - t0)
+                t0 = time.perf_counter()
+                self.score(row['age'], row['isSmoker'], row['hr'], row['high_bp'], row['condition'])
+                new.append(time.perf_counter() - t0)
+            report.update({
+                'latency_samples': len(sample),
+                'sklearn_p50_us': round(float(np.percentile(old, 50)) * 1e6, 2),
+                'sklearn_p99_us': round(float(np.percentile(old, 99)) * 1e6, 2),
+                'compiled_p50_us': round(float(np.percentile(new, 50)) * 1e6, 2),
+                'compiled_p99_us': round(float(np.percentile(new, 99)) * 1e6, 2),
+            })
+        return report
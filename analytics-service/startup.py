@@ -0,0 +1,55 @@
+# analytics-service/startup.py
+"""
+Timing report for one process start.
+
+app.py creates a StartupTimer before its first import. It marks a checkpoint after
+each group of imports, marks serving() once the module has loaded (the port can be
+bound from then on) and times each warm-up phase (stores, event aggregates, models),
+so /readyz can show where start-up time went.
+"""
+import time
+from contextlib import contextmanager
+
+
+class StartupTimer:
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.started_at = time.time()
+        self._last = self.started
+        self.imports = {}
+        self.phases = {}
+        self.details = {}
+        self.serving_after = None
+        self.ready_after = None
+
+    def imported(self, group):
+        """Checkpoint: time since the previous checkpoint was spent importing `group`."""
+        now = time.perf_counter()
+        self.imports[group] = round(now - self._last, 6)
+        self._last = now
+
+    def serving(self):
+        self.serving_after = round(time.perf_counter() - self.started, 6)
+
+    def ready(self):
+        self.ready_after = round(time.perf_counter() - self.started, 6)
+
+    @contextmanager
+    def phase(self, name):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = round(time.perf_counter() - t0, 6)
+
+    def report(self):
+        return {
+            'started_at': self.started_at,
+            'imports': dict(self.imports),
+            'import_seconds': round(sum(self.imports.values()), 6),
+            'serving_after_seconds': self.serving_after,
+            'warmup': dict(self.phases),
+            'warmup_details': dict(self.details),
+            'ready_after_seconds': self.ready_after,
+        }
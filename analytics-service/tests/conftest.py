@@ -0,0 +1,32 @@
+# analytics-service/tests/conftest.py
+import importlib
+import os
+import shutil
+import sys
+
+import pytest
+
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# the service modules are flat files next to app.py, imported by name
+sys.path.insert(0, SERVICE_DIR)
+DATA_FILES = ('synthetic_medicine_demand.csv', 'synthetic_disease_trends.csv', 'synthetic_patient_risk.csv')
+
+
+@pytest.fixture(scope='session')
+def service(tmp_path_factory):
+    """
+    The analytics app (imported once per test run) trained on a copy of the synthetic
+    data, so merges don't touch the repo's files.
+    """
+    pytest.importorskip('sklearn')
+    data_dir = tmp_path_factory.mktemp('analytics')
+    for name in DATA_FILES:
+        shutil.copy(os.path.join(SERVICE_DIR, name), data_dir / name)
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setenv('ANALYTICS_DATA_DIR', str(data_dir))
+        mp.setenv('ANALYTICS_WARMUP', 'sync')
+        mp.setenv('MODEL_ARTIFACTS', '0')
+        mp.setenv('FORECAST_ENGINE', 'forest')
+        app = importlib.import_module('app')
+    assert app.DATA_DIR == str(data_dir)
+    return app
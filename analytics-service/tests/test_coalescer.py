@@ -0,0 +1,73 @@
+# analytics-service/tests/test_coalescer.py
+import threading
+
+import pytest
+
+from coalescer import RequestCoalescer
+
+
+def submit_concurrently(coalescer, items):
+    results = [None] * len(items)
+    errors = [None] * len(items)
+    start = threading.Barrier(len(items))
+
+    def call(i):
+        start.wait()
+        try:
+            results[i] = coalescer.submit(items[i])
+        except Exception as e:
+            errors[i] = e
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(len(items))]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(10)
+    return results, errors
+
+
+def test_concurrent_calls_share_a_batch():
+    batches = []
+
+    def batch_fn(items):
+        batches.append(list(items))
+        return [item * 10 for item in items]
+
+    coalescer = RequestCoalescer(batch_fn, window_ms=200, max_batch=8)
+    results, errors = submit_concurrently(coalescer, list(range(8)))
+
+    assert errors == [None] * 8
+    assert results == [i * 10 for i in range(8)]  # each caller gets its own result
+    assert len(batches) == 1 and sorted(batches[0]) == list(range(8))
+    stats = coalescer.stats()
+    assert stats['batches'] == 1 and stats['requests'] == 8
+    assert stats['batch_size_histogram']['le_8'] == 1
+
+
+def test_batches_are_capped_at_max_batch():
+    sizes = []
+
+    def batch_fn(items):
+        sizes.append(len(items))
+        return list(items)
+
+    coalescer = RequestCoalescer(batch_fn, window_ms=200, max_batch=4)
+    results, errors = submit_concurrently(coalescer, list(range(10)))
+
+    assert results == list(range(10))
+    assert max(sizes) <= 4 and sum(sizes) == 10
+
+
+def test_batch_errors_reach_every_caller():
+    def batch_fn(items):
+        raise ValueError('model not loaded')
+
+    coalescer = RequestCoalescer(batch_fn, window_ms=100, max_batch=3)
+    _, errors = submit_concurrently(coalescer, [1, 2, 3])
+    assert all(isinstance(e, ValueError) for e in errors)
+
+
+def test_wrong_result_count_is_an_error():
+    coalescer = RequestCoalescer(lambda items: [], window_ms=0)
+    with pytest.raises(RuntimeError, match='0 results for 1 items'):
+        coalescer.submit('x')
@@ -0,0 +1,64 @@
+# analytics-service/tests/test_columnar_store.py
+import os
+
+import pandas as pd
+import pytest
+
+pytest.importorskip('pyarrow')
+
+from columnar_store import PartitionedStore, QUARANTINE_FILE  # noqa: E402
+
+
+def _frame(rows):
+    return pd.DataFrame(rows, columns=['month', 'medicine', 'demand'])
+
+
+def test_append_read_round_trip(tmp_path):
+    store = PartitionedStore(str(tmp_path / 'demand'))
+    assert store.is_empty()
+    assert store.append(_frame([('2025-01', 'A', 10), ('2025-02', 'A', 12), ('2025-01', 'B', 7)])) == \
+        ['2025-01', '2025-02']
+    # a second append only rewrites the partitions it touches and keeps the old rows
+    assert store.append(_frame([('2025-02', 'B', 3), ('2025-03', 'A', 1)])) == ['2025-02', '2025-03']
+
+    assert store.partitions() == ['2025-01', '2025-02', '2025-03']
+    df = store.read().sort_values(['month', 'medicine']).reset_index(drop=True)
+    assert df.to_dict('records') == [
+        {'month': '2025-01', 'medicine': 'A', 'demand': 10},
+        {'month': '2025-01', 'medicine': 'B', 'demand': 7},
+        {'month': '2025-02', 'medicine': 'A', 'demand': 12},
+        {'month': '2025-02', 'medicine': 'B', 'demand': 3},
+        {'month': '2025-03', 'medicine': 'A', 'demand': 1},
+    ]
+    assert list(store.read(columns=['medicine'], partitions=['2025-03'])['medicine']) == ['A']
+
+
+def test_empty_month_goes_to_unknown_partition(tmp_path):
+    store = PartitionedStore(str(tmp_path / 'demand'))
+    store.append(_frame([(None, 'A', 1), ('', 'B', 2)]))
+    assert store.partitions() == ['unknown']
+    assert len(store.read()) == 2
+
+
+@pytest.mark.parametrize('month', ['2025/12', '../../../../evil', '2025-12/../../x', 'month=2025-01', '..', '2025\\12',
+                                   '2025-13', '2025-00'])
+def test_invalid_month_is_quarantined(tmp_path, month):
+    root = tmp_path / 'data' / 'store' / 'demand'
+    store = PartitionedStore(str(root))
+    touched = store.append(_frame([(month, 'A', 5), ('2025-12', 'B', 6)]))
+
+    assert touched == ['2025-12']
+    assert store.partitions() == ['2025-12']
+    assert store.read().to_dict('records') == [{'month': '2025-12', 'medicine': 'B', 'demand': 6}]
+    # nothing was written outside the dataset directory
+    written = {os.path.relpath(os.path.join(d, f), tmp_path) for d, _, files in os.walk(tmp_path) for f in files}
+    assert all(p.startswith(os.path.join('data', 'store', 'demand') + os.sep) for p in written)
+    # the rejected row is kept, not lost
+    quarantined = pd.read_csv(root / QUARANTINE_FILE, dtype=str)
+    assert quarantined.to_dict('records') == [{'month': month, 'medicine': 'A', 'demand': '5'}]
+
+
+def test_partition_dir_rejects_invalid_values(tmp_path):
+    store = PartitionedStore(str(tmp_path / 'demand'))
+    with pytest.raises(ValueError):
+        store.read_partition('../x')
@@ -0,0 +1,100 @@
+# analytics-service/tests/test_event_log.py
+import csv
+import os
+import threading
+import time
+
+from admissions_rollup import AdmissionsRollup, hour_of
+from demand_aggregate import DemandAggregate
+from event_writer import EventLogWriter
+
+DEMAND_FIELDS = ['timestamp', 'month', 'medicine', 'quantity', 'invoiceId']
+ADMISSION_FIELDS = ['timestamp', 'admittedAt', 'patientName', 'age', 'gender', 'roomType', 'doctor', 'admissionId']
+
+
+def demand_row(medicine, quantity, month='2025-11', invoice=''):
+    return {'timestamp': '2025-11-03T10:00:00', 'month': month, 'medicine': medicine,
+            'quantity': quantity, 'invoiceId': invoice}
+
+
+def test_values_with_newlines_stay_on_one_line(tmp_path):
+    path = str(tmp_path / 'events.csv')
+    writer = EventLogWriter(path, DEMAND_FIELDS)
+    writer.append([demand_row('Para\ncetamol', 2, invoice='INV\r\n7'), demand_row('Ibuprofen\r', 1)])
+    with open(path, 'rb') as f:
+        lines = f.read().splitlines()
+    assert len(lines) == 3  # header + one line per row
+    with open(path, newline='', encoding='utf-8') as f:
+        rows = list(csv.DictReader(f))
+    assert [r['medicine'] for r in rows] == ['Para cetamol', 'Ibuprofen ']
+    assert rows[0]['invoiceId'] == 'INV 7'
+
+
+def test_aggregate_tails_rows_that_had_newlines(tmp_path):
+    path = str(tmp_path / 'events.csv')
+    writer = EventLogWriter(path, DEMAND_FIELDS)
+    aggregate = DemandAggregate(path)
+    writer.append([demand_row('Para\ncetamol', 2), demand_row('Aspirin', 1)])
+    assert aggregate.refresh() == 2
+    writer.append([demand_row('Para\ncetamol', 3)])
+    assert aggregate.refresh() == 1
+    assert aggregate.query() == [('2025-11', 'Aspirin', 1), ('2025-11', 'Para cetamol', 5)]
+
+
+def test_admissions_rollup_tails_rows_that_had_newlines(tmp_path):
+    path = str(tmp_path / 'admissions.csv')
+    writer = EventLogWriter(path, ADMISSION_FIELDS)
+    rollup = AdmissionsRollup(path)
+    row = {'timestamp': '2025-11-03T10:15:00', 'admittedAt': '2025-11-03T09:30:00', 'patientName': 'A\nB',
+           'age': 40, 'gender': 'F', 'roomType': 'ICU', 'doctor': 'Dr\r\nKhan', 'admissionId': 'a1'}
+    writer.append([row, dict(row, roomType='General', admissionId='a2')])
+    assert rollup.refresh() == 2
+    writer.append([dict(row, admissionId='a3')])
+    assert rollup.refresh() == 1
+    counts, _ = rollup.window('roomType', hour_of('2025-11-03T00:00'), hour_of('2025-11-04T00:00'))
+    assert counts == {'ICU': 2, 'General': 1}
+    counts, _ = rollup.window('doctor', hour_of('2025-11-03T00:00'), hour_of('2025-11-04T00:00'))
+    assert counts == {'Dr Khan': 3}
+
+
+def test_group_commit_and_rotate_lose_no_rows(tmp_path):
+    path = str(tmp_path / 'events.csv')
+    # two writers on one file stand in for two gunicorn workers
+    writers = [EventLogWriter(path, DEMAND_FIELDS, flush_interval_ms=2) for _ in range(2)]
+    archives = []
+    done = threading.Event()
+
+    def produce(writer, worker):
+        for batch in range(50):
+            writer.append([demand_row('Aspirin', 1, invoice=f'{worker}-{batch}-{i}') for i in range(20)])
+            time.sleep(0.001)
+
+    def rotate():
+        n = 0
+        while not done.is_set():
+            archive = str(tmp_path / f'events.csv.processed.{n}')
+            if writers[0].rotate(archive):
+                archives.append(archive)
+                n += 1
+            time.sleep(0.005)
+
+    rotator = threading.Thread(target=rotate)
+    rotator.start()
+    producers = [threading.Thread(target=produce, args=(w, k)) for k, w in enumerate(writers)]
+    for t in producers:
+        t.start()
+    for t in producers:
+        t.join()
+    done.set()
+    rotator.join()
+    for writer in writers:
+        writer.close()
+
+    invoices = []
+    for file in archives + [path]:
+        if not os.path.exists(file):
+            continue
+        with open(file, newline='', encoding='utf-8') as f:
+            invoices.extend(row['invoiceId'] for row in csv.DictReader(f))
+    assert len(archives) > 1
+    assert len(invoices) == len(set(invoices)) == 2 * 50 * 20
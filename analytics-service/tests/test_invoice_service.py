@@ -0,0 +1,148 @@
+# analytics-service/tests/test_invoice_service.py
+import json
+import os
+import time
+
+import pytest
+
+pytest.importorskip('camelot')
+
+import invoice_service
+from parse_cache import ParseCache
+
+SAMPLE_PDF = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'sample_invoice.pdf')
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setattr(invoice_service, 'parse_cache', ParseCache(str(tmp_path / 'cache'), 1 << 20))
+    return invoice_service.app.test_client()
+
+
+def test_cache_admin_disabled_without_token(client, monkeypatch):
+    monkeypatch.setattr(invoice_service, 'INVOICE_ADMIN_TOKEN', '')
+    assert client.get('/api/invoice/cache').status_code == 403
+    assert client.delete('/api/invoice/cache', headers={'X-Admin-Token': ''}).status_code == 403
+
+
+def test_cache_admin_requires_header_token(client, monkeypatch):
+    monkeypatch.setattr(invoice_service, 'INVOICE_ADMIN_TOKEN', 's3cret')
+    assert client.get('/api/invoice/cache').status_code == 403
+    assert client.delete('/api/invoice/cache?token=s3cret').status_code == 403
+    assert client.get('/api/invoice/cache', headers={'X-Admin-Token': 'wrong'}).status_code == 403
+
+    resp = client.get('/api/invoice/cache', headers={'X-Admin-Token': 's3cret'})
+    assert resp.status_code == 200
+    assert 'dir' not in resp.get_json()
+    resp = client.delete('/api/invoice/cache', headers={'X-Admin-Token': 's3cret'})
+    assert resp.status_code == 200
+    assert resp.get_json()['removed'] == 0
+
+
+def _submit(client, pdf):
+    with open(pdf, 'rb') as f:
+        resp = client.post('/api/invoice/jobs', data={'file': (f, 'invoice.pdf')})
+    assert resp.status_code == 202
+    return resp.get_json()['job_id']
+
+
+def _wait(client, job_id, seconds=60):
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        job = client.get(f'/api/invoice/jobs/{job_id}').get_json()
+        # the child reports `done` before the job thread has written its final state
+        if job['status'] in invoice_service.JOB_FINISHED and job['finished_at']:
+            return job
+        time.sleep(0.1)
+    raise AssertionError(f'job {job_id} did not finish')
+
+
+@pytest.fixture
+def jobs_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(invoice_service, 'INVOICE_JOB_DIR', str(tmp_path / 'jobs'))
+    return str(tmp_path / 'jobs')
+
+
+def test_parse_job_state_is_shared_through_the_job_dir(client, jobs_dir):
+    job_id = _submit(client, SAMPLE_PDF)
+    job = _wait(client, job_id)
+    assert job['status'] == 'done'
+    assert job['pages_done'] == job['pages_total'] >= 1
+    # another worker sees the same job through the files alone; rows stay out of the status file
+    status = invoice_service.load_job(jobs_dir, job_id)
+    assert status['status'] == 'done' and 'rows' not in status and status['row_count'] > 0
+    stored = invoice_service.load_job_result(jobs_dir, job_id)
+    assert len(stored['rows']) == status['row_count']
+    result = client.get(f'/api/invoice/jobs/{job_id}/result')
+    assert result.status_code == 200
+    assert result.get_json()['rows'] == stored['rows']
+
+
+def test_expired_jobs_are_pruned_by_mtime(client, jobs_dir, monkeypatch):
+    job_id = _submit(client, SAMPLE_PDF)
+    assert _wait(client, job_id)['status'] == 'done'
+    files = sorted(os.listdir(jobs_dir))
+    assert files == [job_id + '.json', job_id + '.rows.json']
+    old = time.time() - 3600
+    for name in files:
+        os.utime(os.path.join(jobs_dir, name), (old, old))
+    monkeypatch.setattr(invoice_service, 'INVOICE_JOB_TTL_SECONDS', 60)
+    assert client.get(f'/api/invoice/jobs/{job_id}').status_code == 404
+    assert os.listdir(jobs_dir) == []
+
+
+def test_parse_job_is_killed_at_its_deadline(client, jobs_dir, monkeypatch):
+    monkeypatch.setattr(invoice_service, 'INVOICE_JOB_TIMEOUT_SECONDS', 0.05)
+    job_id = _submit(client, SAMPLE_PDF)
+    job = _wait(client, job_id)
+    assert job['status'] == 'timeout'
+    assert client.get(f'/api/invoice/jobs/{job_id}/result').status_code == 504
+    assert not invoice_service._job_processes
+
+
+def test_unknown_job_ids(client, jobs_dir):
+    assert client.get('/api/invoice/jobs/' + 'f' * 32).status_code == 404
+    assert client.get('/api/invoice/jobs/..').status_code == 404
+
+
+def test_pdf_pages_counts_pages():
+    assert invoice_service.pdf_pages(SAMPLE_PDF) == ['1']
+
+
+def test_unreadable_pdf_is_an_error_not_empty_rows(client, tmp_path):
+    bogus = tmp_path / 'bogus.pdf'
+    bogus.write_bytes(b'not a pdf at all')
+    with open(bogus, 'rb') as f:
+        resp = client.post('/api/invoice/parse', data={'file': (f, 'bogus.pdf')})
+    assert resp.status_code == 500
+    assert 'error' in resp.get_json()
+
+
+@pytest.fixture
+def uploads(monkeypatch):
+    saved = []
+    real = invoice_service.save_and_lookup
+
+    def recording(f):
+        result = real(f)
+        saved.append(result[0])
+        return result
+    monkeypatch.setattr(invoice_service, 'save_and_lookup', recording)
+    return saved
+
+
+def test_ndjson_stream_removes_the_upload(client, uploads):
+    with open(SAMPLE_PDF, 'rb') as f:
+        resp = client.post('/api/invoice/parse?stream=1', data={'file': (f, 'invoice.pdf')})
+    lines = [json.loads(line) for line in resp.get_data(as_text=True).splitlines()]
+    resp.close()  # what the WSGI server does once the body is sent
+    assert lines[0]['type'] == 'start' and lines[-1]['type'] == 'end'
+    assert not os.path.exists(uploads[0])
+
+
+def test_ndjson_stream_closed_unread_removes_the_upload(client, uploads):
+    with open(SAMPLE_PDF, 'rb') as f:
+        resp = client.post('/api/invoice/parse?stream=1', data={'file': (f, 'invoice.pdf')}, buffered=False)
+    assert os.path.exists(uploads[0])
+    resp.close()
+    assert not os.path.exists(uploads[0])
@@ -0,0 +1,56 @@
+# analytics-service/tests/test_medicine_matcher.py
+import pytest
+
+import medicine_matcher
+from medicine_matcher import MedicineMatcher, _synthetic_catalog, normalize
+
+CATALOG = [
+    'Paracetamol 500mg Tablets', 'Paracetamol 650mg Tablets', 'Amoxicillin 250mg Capsules',
+    'Cough Syrup 100ml', 'Insulin Injection 10ml', 'Ibuprofen 400mg Tablets',
+]
+
+
+def test_normalize_glues_strengths_and_expands_forms():
+    assert normalize('PARACETAMOL 500 MG TAB.') == ['paracetamol', '500mg', 'tablets']
+    assert normalize('Amoxicillin 250mg caps') == ['amoxicillin', '250mg', 'capsules']
+    assert normalize(None) == []
+
+
+@pytest.mark.parametrize('description, expected', [
+    ('PARACETAMOL 500 MG TAB', 'Paracetamol 500mg Tablets'),
+    ('paracetamol 650mg tabs', 'Paracetamol 650mg Tablets'),
+    ('AMOXICILLIN 250 MG CAP', 'Amoxicillin 250mg Capsules'),
+    ('Insulin inj 10 ml', 'Insulin Injection 10ml'),
+])
+def test_invoice_spellings_rank_their_catalog_name_first(description, expected):
+    matches = MedicineMatcher(CATALOG).match(description, 3)
+    assert matches[0]['medicine'] == expected
+    scores = [m['score'] for m in matches]
+    assert scores == sorted(scores, reverse=True)
+    assert all(0.0 <= s <= 1.0 for s in scores)
+
+
+def test_exact_normalised_name_scores_one():
+    matcher = MedicineMatcher(CATALOG)
+    assert matcher.match('paracetamol 500 mg tablets', 1) == [{'medicine': 'Paracetamol 500mg Tablets', 'score': 1.0}]
+    assert matcher.best('Paracetamol 500mg Tablets', 0.9) == ('Paracetamol 500mg Tablets', 1.0)
+    assert matcher.best('zzzz', 0.5) is None
+    assert matcher.match('', 3) == [] and MedicineMatcher([]).match('paracetamol', 3) == []
+
+
+def test_shortlist_finds_the_same_best_match_as_the_whole_catalog(monkeypatch):
+    catalog = _synthetic_catalog(3000)
+    queries = [name.upper().replace('MG ', ' MG ').replace('TABLETS', 'TAB') for name in catalog[::150]]
+    fast = MedicineMatcher(catalog)
+    assert fast._common.any()  # stop grams are in play
+    fast_results = [fast.match(q, 5) for q in queries]
+
+    # no stop grams and no shortlist: every candidate is rescored
+    monkeypatch.setattr(medicine_matcher, 'STOP_GRAM_MIN_DF', len(catalog))
+    monkeypatch.setattr(medicine_matcher, 'RESCORE_CANDIDATES', len(catalog))
+    full = MedicineMatcher(catalog)
+    for query, name, got in zip(queries, catalog[::150], fast_results):
+        expected = full.match(query, 5)
+        # the shortlist may miss weaker tail candidates, never the best one or its score
+        assert got[0] == expected[0]
+        assert got[0]['medicine'] == name
@@ -0,0 +1,47 @@
+# analytics-service/tests/test_metrics.py
+import pytest
+
+from metrics import MetricsRegistry
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = MetricsRegistry()
+    latency = registry.histogram('req_seconds', 'Latency.', ['route'], buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.5, 3.0):
+        latency.labels('/x').observe(value)
+    text = registry.render()
+    assert '# TYPE req_seconds histogram' in text
+    assert 'req_seconds_bucket{route="/x",le="0.1"} 1' in text
+    assert 'req_seconds_bucket{route="/x",le="1"} 3' in text
+    assert 'req_seconds_bucket{route="/x",le="+Inf"} 4' in text
+    assert 'req_seconds_count{route="/x"} 4' in text
+    assert 'req_seconds_sum{route="/x"} 4.05' in text
+
+
+def test_label_values_are_escaped_and_counts_checked():
+    registry = MetricsRegistry()
+    events = registry.counter('events_total', 'Events.', ['type'])
+    events.labels('a"b\nc').inc(2)
+    assert 'events_total{type="a\\"b\\nc"} 2' in registry.render()
+    with pytest.raises(ValueError):
+        events.labels('a', 'b')
+
+
+def test_a_failing_callback_does_not_break_the_scrape():
+    registry = MetricsRegistry()
+    registry.callback('broken', 'Always fails.', [], lambda: 1 / 0)
+    registry.gauge('up', 'Up.').set(1)
+    text = registry.render()
+    assert '# broken unavailable: division by zero' in text
+    assert 'up 1' in text
+
+
+def test_metrics_endpoint_reports_request_latency(service):
+    client = service.app.test_client()
+    assert client.get('/readyz').status_code == 200
+    resp = client.get('/metrics')
+    assert resp.status_code == 200
+    assert resp.content_type.startswith('text/plain')
+    text = resp.get_data(as_text=True)
+    assert 'http_request_duration_seconds_count{route="/readyz",method="GET",status="200"}' in text
+    assert '# TYPE analytics_train_phase_seconds histogram' in text
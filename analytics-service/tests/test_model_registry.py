@@ -0,0 +1,67 @@
+# analytics-service/tests/test_model_registry.py
+import numpy as np
+import pytest
+
+from model_registry import ModelRegistry
+
+
+def test_publish_swaps_whole_generations():
+    registry = ModelRegistry()
+    assert registry.current() is None
+    first = registry.publish({'months_list': ['2025-01'], 'forecast': np.zeros(3)}, 'trained')
+    held = registry.current()
+    second = registry.publish({'months_list': ['2025-01', '2025-02'], 'forecast': np.ones(3)}, 'incremental')
+
+    assert (first.version, second.version) == (1, 2)
+    assert registry.current() is second
+    # a request that grabbed the old generation keeps seeing all of it
+    assert held is first
+    assert held.months_list == ['2025-01'] and held.forecast.sum() == 0
+    assert second.source == 'incremental'
+    with pytest.raises(AttributeError):
+        second.missing_key
+
+
+def test_published_arrays_are_frozen():
+    gen = ModelRegistry().publish({'forecast': np.zeros((2, 2))}, 'trained')
+    with pytest.raises(ValueError):
+        gen.forecast[0, 0] = 1.0
+
+
+def test_listeners_see_every_publish():
+    registry = ModelRegistry()
+    seen = []
+    registry.add_listener(lambda gen: seen.append(gen.version))
+    registry.add_listener(lambda gen: 1 / 0)  # a failing listener doesn't stop the publish
+    registry.publish({}, 'trained')
+    registry.publish({}, 'trained')
+    assert seen == [1, 2]
+    assert registry.current().version == 2
+
+
+def test_failed_retrain_keeps_the_current_generation():
+    registry = ModelRegistry()
+    good = registry.publish({'months_list': ['2025-01']}, 'trained')
+
+    def broken_retrain():
+        raise RuntimeError('training blew up')
+
+    job = registry.wait(registry.submit('merge_and_retrain', broken_retrain), timeout=10)
+    assert job['status'] == 'failed' and 'blew up' in job['error']
+    assert registry.current() is good
+
+
+def test_jobs_run_one_at_a_time_in_order():
+    registry = ModelRegistry()
+    order = []
+
+    def retrain(n):
+        order.append(n)
+        return {'generation': registry.publish({'n': n}, 'trained').version}
+
+    job_ids = [registry.submit('retrain', lambda n=n: retrain(n)) for n in range(5)]
+    results = [registry.wait(job_id, timeout=10)['result'] for job_id in job_ids]
+    assert order == list(range(5))
+    assert [r['generation'] for r in results] == [1, 2, 3, 4, 5]
+    assert registry.current().n == 4
+    assert registry.job('unknown') is None
@@ -0,0 +1,49 @@
+# analytics-service/tests/test_model_store.py
+import os
+
+import numpy as np
+import pytest
+
+pytest.importorskip('joblib')
+
+import model_store  # noqa: E402
+from model_store import artifact_path, list_artifacts, load_artifact, save_artifact, source_fingerprint  # noqa: E402
+
+
+def test_fingerprint_follows_contents_and_extra(tmp_path):
+    data = tmp_path / 'demand.csv'
+    data.write_text('month,medicine,demand\n2025-01,A,1\n')
+    first = source_fingerprint([str(data)], extra={'horizon': 12})
+    os.utime(data, (0, 0))  # touching the file alone changes nothing
+    assert source_fingerprint([str(data)], extra={'horizon': 12}) == first
+    assert source_fingerprint([str(data)], extra={'horizon': 6}) != first
+    data.write_text('month,medicine,demand\n2025-01,A,2\n')
+    assert source_fingerprint([str(data)], extra={'horizon': 12}) != first
+    assert source_fingerprint([str(tmp_path / 'missing.csv')]) != source_fingerprint([])
+
+
+def test_saved_state_is_reused_only_for_its_fingerprint(tmp_path):
+    model_dir = str(tmp_path / 'models')
+    state = {'demand_forecast': np.arange(6.0).reshape(2, 3), 'months_list': ['2025-01']}
+    save_artifact(state, model_dir, 'a' * 64)
+
+    loaded = load_artifact(model_dir, 'a' * 64)
+    assert loaded['months_list'] == ['2025-01']
+    assert np.array_equal(loaded['demand_forecast'], state['demand_forecast'])
+    assert isinstance(loaded['demand_forecast'], np.memmap)  # mapped, not copied
+    assert load_artifact(model_dir, 'b' * 64) is None
+
+
+def test_stale_format_is_ignored(tmp_path, monkeypatch):
+    model_dir = str(tmp_path / 'models')
+    save_artifact({'months_list': []}, model_dir, 'a' * 64)
+    monkeypatch.setattr(model_store, 'ARTIFACT_FORMAT_VERSION', model_store.ARTIFACT_FORMAT_VERSION + 1)
+    assert load_artifact(model_dir, 'a' * 64) is None
+
+
+def test_only_the_newest_artifacts_are_kept(tmp_path):
+    model_dir = str(tmp_path / 'models')
+    for i, fingerprint in enumerate(['a' * 64, 'b' * 64, 'c' * 64]):
+        path = save_artifact({'i': i}, model_dir, fingerprint, keep=2)
+        os.utime(path, (1000 + i, 1000 + i))
+    assert list_artifacts(model_dir) == [artifact_path(model_dir, 'c' * 64), artifact_path(model_dir, 'b' * 64)]
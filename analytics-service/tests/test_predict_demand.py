@@ -0,0 +1,64 @@
+# analytics-service/tests/test_predict_demand.py
+import pytest
+
+
+@pytest.fixture
+def client(service):
+    return service.app.test_client()
+
+
+def test_single_month_reads_the_forecast_column(service, client):
+    gen = service.registry.current()
+    month = gen.forecast_months[-1]
+    body = client.post('/api/predict/demand', json={'month': month}).get_json()
+    idx = gen.forecast_index_map[month]
+    by_medicine = {p['medicine']: p['predicted_demand'] for p in body['predictions']}
+    for med, row in gen.medicine_row_map.items():
+        assert by_medicine[med] == pytest.approx(float(gen.demand_forecast[row, idx]))
+
+
+def test_range_returns_the_horizon_slice(service, client):
+    gen = service.registry.current()
+    start, end = gen.forecast_months[-3], gen.forecast_months[-1]
+    med = gen.medicine_catalog[0]
+    resp = client.post('/api/predict/demand/range', json={'start': start, 'end': end, 'medicines': [med, 'Nope']})
+    assert resp.status_code == 200
+    body = resp.get_json()
+    assert body['months'] == gen.forecast_months[-3:]
+    assert body['unknown_medicines'] == ['Nope']
+    [prediction] = body['predictions']
+    row = gen.medicine_row_map[med]
+    assert prediction['medicine'] == med
+    assert prediction['predicted_demand'] == pytest.approx(gen.demand_forecast[row, -3:].tolist())
+
+    # a single medicine may be given as a plain string
+    body = client.post('/api/predict/demand/range', json={'start': start, 'medicines': med}).get_json()
+    assert [p['medicine'] for p in body['predictions']] == [med]
+
+
+@pytest.mark.parametrize('medicines', [[['x']], [1, 2], {'a': 1}, 5])
+def test_range_rejects_malformed_medicines(service, client, medicines):
+    start = service.registry.current().forecast_months[-1]
+    resp = client.post('/api/predict/demand/range', json={'start': start, 'medicines': medicines})
+    assert resp.status_code == 400
+    assert 'medicines' in resp.get_json()['error']
+
+
+def test_range_rejects_reversed_bounds(service, client):
+    months = service.registry.current().forecast_months
+    resp = client.post('/api/predict/demand/range', json={'start': months[-1], 'end': months[-2]})
+    assert resp.status_code == 400
+
+
+def test_labels_outside_history_and_horizon_are_rejected(service, client):
+    gen = service.registry.current()
+    resp = client.post('/api/predict/demand', json={'month': '2099-03'})
+    assert resp.status_code == 400
+    assert resp.get_json()['error'] == f"2099-03 is beyond forecast horizon (last: {gen.forecast_months[-1]})"
+    resp = client.post('/api/predict/demand', json={'month': '1999-05'})
+    assert resp.status_code == 400
+    assert 'before the history' in resp.get_json()['error']
+    resp = client.post('/api/predict/demand/range', json={'start': '1999-05', 'end': gen.forecast_months[-1]})
+    assert resp.status_code == 400
+    # bare month numbers still resolve against the trained history
+    assert client.post('/api/predict/demand', json={'month': 5}).status_code == 200
@@ -0,0 +1,56 @@
+# analytics-service/tests/test_readiness.py
+import pytest
+
+
+@pytest.fixture
+def client(service):
+    return service.app.test_client()
+
+
+@pytest.fixture
+def warming_up(service, monkeypatch):
+    """The service as it looks before the warm-up job has published a generation."""
+    monkeypatch.setattr(service.registry, '_current', None)
+    return service
+
+
+def test_ready_once_a_generation_is_served(service, client):
+    resp = client.get('/readyz')
+    assert resp.status_code == 200
+    body = resp.get_json()
+    assert body['status'] == 'ready'
+    assert body['model_generation']['version'] == service.registry.current().version
+    startup = body['startup']
+    assert set(startup['warmup']) >= {'stores', 'demand_aggregate', 'admissions_rollup', 'models'}
+    assert startup['ready_after_seconds'] is not None and startup['serving_after_seconds'] is not None
+
+
+def test_model_routes_answer_503_while_warming_up(warming_up, client):
+    assert client.get('/healthz').status_code == 200
+    ready = client.get('/readyz')
+    assert ready.status_code == 503 and ready.get_json()['status'] == 'starting'
+
+    resp = client.post('/api/predict/demand', json={'month': 5})
+    assert resp.status_code == 503
+    assert resp.headers['Retry-After'] == '5'
+    assert resp.get_json()['status'] == 'starting'
+    # model-free endpoints keep working
+    assert client.get('/metrics').status_code == 200
+    assert client.get('/api/analytics/ingest/stats').status_code == 200
+
+
+def test_failed_warm_up_is_reported(warming_up, client, monkeypatch):
+    def broken():
+        raise RuntimeError('demand store unreadable')
+
+    job_id = warming_up.registry.submit('warmup', broken)
+    warming_up.registry.wait(job_id, timeout=30)
+    monkeypatch.setattr(warming_up, 'warmup_job_id', job_id)
+
+    ready = client.get('/readyz')
+    assert ready.status_code == 503
+    body = ready.get_json()
+    assert body['status'] == 'failed'
+    assert body['warmup_job']['error'] == 'demand store unreadable'
+    resp = client.post('/api/predict/demand', json={'month': 5})
+    assert resp.status_code == 503 and resp.get_json()['warmup_error'] == 'demand store unreadable'
@@ -0,0 +1,82 @@
+# analytics-service/tests/test_request_profiler.py
+import os
+
+import pytest
+from flask import Flask
+
+from request_profiler import RequestProfiler
+
+TOKEN = 's3cret'
+
+
+def make_app(profiler):
+    app = Flask(__name__)
+
+    @app.route('/api/predict/x')
+    def predict():
+        return {'ok': sum(i * i for i in range(2000))}
+
+    @app.route('/health')
+    def health():
+        return 'ok'
+
+    profiler.install(app)
+    return app.test_client()
+
+
+@pytest.fixture
+def profiler(tmp_path):
+    return RequestProfiler(str(tmp_path / 'profiles'), keep=2, token=TOKEN, routes=['/api/predict/'])
+
+
+def test_header_needs_the_matching_token(profiler):
+    client = make_app(profiler)
+    client.get('/api/predict/x', headers={'X-Profile': '1'})
+    client.get('/api/predict/x', headers={'X-Profile': '1', 'X-Profile-Token': 'wrong'})
+    client.get('/api/predict/x', headers={'X-Profile-Token': TOKEN})
+    assert profiler.list() == []
+
+    assert client.get('/api/predict/x', headers={'X-Profile': '1', 'X-Profile-Token': TOKEN}).status_code == 200
+    [meta] = profiler.list()
+    assert meta['trigger'] == 'header' and meta['status'] == 200 and meta['route'] == '/api/predict/x'
+    # no .pstats when a debugger or coverage already owns the profiling hook
+    for kind in ('collapsed', 'json') + (('pstats',) if meta['pstats'] else ()):
+        assert os.path.isfile(profiler.path(meta['id'], kind))
+
+
+def test_routes_outside_the_prefix_are_never_profiled(profiler):
+    client = make_app(profiler)
+    client.get('/health', headers={'X-Profile': '1', 'X-Profile-Token': TOKEN})
+    assert profiler.list() == []
+
+
+def test_without_token_or_sampling_no_hooks_are_installed(tmp_path):
+    profiler = RequestProfiler(str(tmp_path / 'profiles'))
+    app = Flask(__name__)
+    assert not profiler.install(app)
+    assert not app.before_request_funcs and not app.teardown_request_funcs
+    assert not profiler.authorized('') and not profiler.authorized(None)
+
+
+def test_sampling_and_rotation_keep_the_newest(tmp_path):
+    profiler = RequestProfiler(str(tmp_path / 'profiles'), keep=2, sample_every=2, routes=['/api/predict/'])
+    client = make_app(profiler)
+    for _ in range(8):
+        client.get('/api/predict/x')
+    profiles = profiler.list()
+    assert len(profiles) == 2 and {m['trigger'] for m in profiles} == {'sample'}
+    assert profiler.stats()['captured'] == 4
+    kept = {name.split('.')[0] for name in os.listdir(profiler.root) if not name.startswith('.')}
+    assert kept == {m['id'] for m in profiles}
+
+
+@pytest.mark.parametrize('profile_id, kind', [('../x', 'json'), ('a/b', 'json'), ('x', 'py'), ('', 'json')])
+def test_path_rejects_unsafe_ids_and_kinds(profiler, profile_id, kind):
+    assert profiler.path(profile_id, kind) is None
+
+
+def test_admin_endpoints_are_closed_without_a_configured_token(service):
+    client = service.app.test_client()
+    resp = client.get('/api/admin/profiles', headers={'X-Profile-Token': ''})
+    assert resp.status_code == 403
+    assert client.get('/api/admin/profiles/x/json').status_code == 403
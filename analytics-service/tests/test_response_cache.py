@@ -0,0 +1,71 @@
+# analytics-service/tests/test_response_cache.py
+import pytest
+
+from response_cache import ResponseCache
+
+
+@pytest.fixture
+def client(service):
+    return service.app.test_client()
+
+
+def test_lru_evicts_the_least_recently_used_entry():
+    cache = ResponseCache(2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1  # 'b' is now the oldest
+    cache.put('c', 3)
+    assert cache.get('b') is None
+    assert cache.get('a') == 1 and cache.get('c') == 3
+    stats = cache.stats()
+    assert stats['entries'] == 2 and stats['evictions'] == 1
+    assert stats['hits'] == 3 and stats['misses'] == 1
+
+
+def test_disabled_cache_stores_nothing():
+    cache = ResponseCache(0)
+    cache.put('a', 1)
+    assert not cache.enabled and cache.get('a') is None
+
+
+def test_matching_if_none_match_gets_a_304(service, client):
+    month = service.registry.current().forecast_months[-1]
+    first = client.post('/api/predict/demand', json={'month': month})
+    assert first.status_code == 200
+    tag, weak = first.get_etag()
+    assert weak and tag
+
+    again = client.post('/api/predict/demand', json={'month': month}, headers={'If-None-Match': f'W/"{tag}"'})
+    assert again.status_code == 304
+    assert again.get_data() == b''
+    assert again.get_etag() == (tag, True)
+
+    # a stale tag gets the full body
+    other = client.post('/api/predict/demand', json={'month': month}, headers={'If-None-Match': 'W/"nope"'})
+    assert other.status_code == 200 and other.get_json() == first.get_json()
+
+
+def test_echoed_month_is_part_of_the_tag_but_not_the_cache_key(service, client):
+    gen = service.registry.current()
+    assert service.resolve_month(gen, 5) == service.resolve_month(gen, '5')
+    client.post('/api/predict/demand', json={'month': 5})
+    before = service.response_cache.stats()
+    as_number = client.post('/api/predict/demand', json={'month': 5})
+    as_text = client.post('/api/predict/demand', json={'month': '5'})
+    assert as_number.get_json()['month'] == 5 and as_text.get_json()['month'] == '5'
+    assert as_number.get_etag() != as_text.get_etag()
+    assert as_number.get_json()['predictions'] == as_text.get_json()['predictions']
+    assert service.response_cache.stats()['hits'] == before['hits'] + 2
+
+
+def test_a_new_generation_changes_the_tag_and_clears_the_cache(service, client):
+    gen = service.registry.current()
+    month = gen.forecast_months[-1]
+    tag, _ = client.post('/api/predict/demand', json={'month': month}).get_etag()
+    assert service.response_cache.stats()['entries'] > 0
+
+    service.registry.publish(gen.state, 'test')
+    assert service.response_cache.stats()['entries'] == 0
+    resp = client.post('/api/predict/demand', json={'month': month}, headers={'If-None-Match': f'W/"{tag}"'})
+    assert resp.status_code == 200
+    assert resp.get_etag()[0] != tag
@@ -0,0 +1,95 @@
+# analytics-service/tests/test_retrain.py
+import numpy as np
+import pytest
+
+pytest.importorskip('sklearn')
+
+
+def add_demand(app, rows):
+    now = '2025-11-03T10:00:00'
+    app.demand_event_writer.append([{'timestamp': now, 'month': month, 'medicine': med, 'quantity': qty,
+                                     'invoiceId': ''} for month, med, qty in rows])
+    app.demand_event_writer.flush()
+
+
+def test_incremental_retrain_matches_a_full_retrain(service):
+    app = service
+    before = app.registry.current()
+    month = before.months_list[-1]
+    touched = before.medicine_catalog[0]
+    add_demand(app, [(month, touched, 500)])
+
+    result = app.merge_and_retrain()
+    assert result['retrain_mode'] == 'incremental'
+    assert result['refit_medicines'] == [touched]
+    incremental = app.registry.current()
+    assert incremental.version == before.version + 1
+    # untouched medicines keep their forecast rows; the touched one moved
+    row = incremental.medicine_row_map[touched]
+    others = [i for i in range(len(incremental.medicine_catalog)) if i != row]
+    assert np.array_equal(incremental.demand_forecast[others], before.demand_forecast[others])
+    assert not np.array_equal(incremental.demand_forecast[row], before.demand_forecast[row])
+
+    full = app.registry.wait(app.registry.submit('merge_and_retrain', lambda: app.merge_and_retrain(True)),
+                             timeout=600)['result']
+    assert full['retrain_mode'] == 'full'
+    rebuilt = app.registry.current()
+    assert rebuilt.medicine_catalog == incremental.medicine_catalog
+    assert rebuilt.forecast_months == incremental.forecast_months
+    assert np.allclose(rebuilt.demand_forecast, incremental.demand_forecast)
+    assert rebuilt.data_fingerprint == incremental.data_fingerprint
+
+
+def test_new_medicine_and_month_are_added_incrementally(service):
+    app = service
+    before = app.registry.current()
+    next_month = app.extend_months(before.months_list, 1)[-1]
+    add_demand(app, [(next_month, 'Newcillin 250mg', 12), (next_month, before.medicine_catalog[1], 40)])
+
+    result = app.merge_and_retrain()
+    gen = app.registry.current()
+    assert result['retrain_mode'] == 'incremental'
+    assert sorted(result['refit_medicines']) == sorted(['Newcillin 250mg', before.medicine_catalog[1]])
+    assert gen.months_list[-1] == next_month
+    assert gen.forecast_months[0] == before.forecast_months[0]
+    assert 'Newcillin 250mg' in gen.medicine_row_map
+    assert gen.demand_models['Newcillin 250mg'] is None  # one month of history: mean-demand fallback
+
+    # another month that doesn't touch it: its new forecast column is still its mean, not the default
+    later = app.extend_months(gen.months_list, 1)[-1]
+    add_demand(app, [(later, before.medicine_catalog[1], 41)])
+    assert app.merge_and_retrain()['retrain_mode'] == 'incremental'
+    latest = app.registry.current()
+    row = latest.demand_forecast[latest.medicine_row_map['Newcillin 250mg']]
+    assert set(row.tolist()) == {12}
+
+
+def test_stale_generation_forces_a_full_retrain(service):
+    app = service
+    gen = app.registry.current()
+    # another worker merged behind this one's back
+    extra = app.pd.DataFrame({'month': [gen.months_list[-1]], 'medicine': ['Elsewhere 5mg'], 'demand': [3]})
+    if app.USE_COLUMNAR_STORE:
+        app.demand_store.append(extra)
+    else:
+        app.pd.concat([app.pd.read_csv(app.demand_csv), extra]).to_csv(app.demand_csv, index=False)
+
+    result = app.merge_and_retrain()
+    assert result['retrain_mode'] == 'full'
+    assert 'Elsewhere 5mg' in app.registry.current().medicine_row_map
+    assert app.merge_and_retrain()['retrain_mode'] == 'incremental'
+
+
+def test_rows_without_a_month_do_not_reach_training(service):
+    app = service
+    if not app.USE_COLUMNAR_STORE:
+        pytest.skip('the unknown partition only exists in the columnar store')
+    gen = app.registry.current()
+    # e.g. imported from a demand CSV with blank months
+    app.demand_store.append(app.pd.DataFrame({'month': [None], 'medicine': ['Undated 1mg'], 'demand': [9]}))
+    assert 'unknown' in app.demand_store.partitions()
+
+    assert app.merge_and_retrain(True)['retrain_mode'] == 'full'
+    latest = app.registry.current()
+    assert latest.months_list == gen.months_list
+    assert 'Undated 1mg' not in latest.medicine_row_map
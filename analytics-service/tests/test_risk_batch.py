@@ -0,0 +1,55 @@
+# analytics-service/tests/test_risk_batch.py
+import io
+
+import pytest
+
+PATIENTS = [
+    {'id': 7, 'age': 72, 'isSmoker': True, 'hr': 96, 'bp': '150/95', 'condition': 'Diabetes'},
+    {'age': 30, 'isSmoker': False, 'hr': 70, 'bp': '120/80', 'condition': 'None'},
+    {'id': 'p-3', 'age': 55, 'isSmoker': False, 'hr': 80, 'bp': '135/85', 'condition': 'Asthma'},
+]
+
+
+@pytest.fixture
+def client(service):
+    return service.app.test_client()
+
+
+def single_score(client, patient):
+    return client.post('/api/predict/risk', json=patient).get_json()['risk_score']
+
+
+def test_json_batch_keeps_order_and_each_callers_id(client):
+    resp = client.post('/api/predict/risk/batch?chunk_size=2', json=PATIENTS)
+    assert resp.status_code == 200
+    body = resp.get_json()
+    assert body['count'] == 3 and body['chunks'] == 2
+    results = body['results']
+    assert results[0]['id'] == 7 and isinstance(results[0]['id'], int)
+    assert 'id' not in results[1]
+    assert results[2]['id'] == 'p-3'
+    for patient, result in zip(PATIENTS, results):
+        assert result['risk_score'] == pytest.approx(single_score(client, patient))
+    # strict JSON: no NaN anywhere in the body
+    assert 'NaN' not in resp.get_data(as_text=True)
+
+
+def test_csv_batch_echoes_ids_as_written(client):
+    csv_text = ('id,age,isSmoker,hr,bp,condition\n'
+                '007,72,1,96,150/95,Diabetes\n'
+                ',30,0,70,120/80,None\n')
+    resp = client.post('/api/predict/risk/batch', data={'file': (io.BytesIO(csv_text.encode()), 'p.csv')})
+    assert resp.status_code == 200
+    results = resp.get_json()['results']
+    assert [r['id'] for r in results] == ['007', None]
+
+
+@pytest.mark.parametrize('body', [b'', b'id,age\n1,2\n3,4,5,6\n'])
+def test_unreadable_csv_is_a_400(client, body):
+    resp = client.post('/api/predict/risk/batch', data={'file': (io.BytesIO(body), 'p.csv')})
+    assert resp.status_code == 400
+    assert 'CSV' in resp.get_json()['error']
+
+
+def test_non_list_payload_is_a_400(client):
+    assert client.post('/api/predict/risk/batch', json={'patients': 'nope'}).status_code == 400
@@ -0,0 +1,71 @@
+# analytics-service/tests/test_risk_scoring.py
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip('sklearn')
+
+from risk_scoring import (RISK_FEATURE_COLUMNS, CompiledRiskScorer, build_risk_features,  # noqa: E402
+                          condition_value)
+
+PATIENTS = pd.DataFrame({
+    'age': [72, 30, None, 55, 41],
+    'isSmoker': [True, False, None, 'False', 1],
+    'hr': [96, 70, 80, None, 88],
+    'bp': ['150/95', '120/80', None, 'n/a', '130/95'],
+    'condition': ['Diabetes', 'None', None, np.nan, 'Unseen'],
+})
+
+
+@pytest.fixture(scope='module')
+def pipeline():
+    from sklearn.compose import ColumnTransformer
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.pipeline import make_pipeline
+    from sklearn.preprocessing import OneHotEncoder
+
+    rng = np.random.default_rng(0)
+    n = 400
+    raw = pd.DataFrame({
+        'age': rng.integers(20, 90, n),
+        'isSmoker': rng.integers(0, 2, n).astype(bool),
+        'hr': rng.integers(55, 110, n),
+        'bp': [f"{s}/{d}" for s, d in zip(rng.integers(100, 170, n), rng.integers(60, 110, n))],
+        'condition': rng.choice(['None', 'Diabetes', 'Hypertension', 'Asthma'], n),
+    })
+    y = (raw['age'] + 20 * raw['isSmoker'] + rng.normal(0, 15, n) > 70).astype(int)
+    preprocessor = ColumnTransformer([('cat', OneHotEncoder(handle_unknown='ignore'), ['condition'])],
+                                     remainder='passthrough')
+    model = make_pipeline(preprocessor, LogisticRegression(max_iter=1000))
+    model.fit(build_risk_features(raw), y)
+    return model
+
+
+def test_compiled_scores_match_the_pipeline(pipeline):
+    scorer = CompiledRiskScorer.from_pipeline(pipeline)
+    X = build_risk_features(PATIENTS)
+    expected = pipeline.predict_proba(X[RISK_FEATURE_COLUMNS])[:, 1]
+    assert scorer.score_frame(X) == pytest.approx(expected, abs=1e-12)
+    assert scorer.verify(pipeline, X)['parity_max_abs_diff'] <= 1e-9
+
+
+def test_null_condition_scores_as_the_none_default(pipeline):
+    scorer = CompiledRiskScorer.from_pipeline(pipeline)
+    assert condition_value(None) == condition_value(np.nan) == 'None'
+    assert condition_value('Asthma') == 'Asthma'
+    X = build_risk_features(PATIENTS)
+    none_row, null_row = X.iloc[1], X.iloc[2]
+    assert null_row['condition'] == none_row['condition'] == 'None'
+    # the single-patient path (scalar normalisation + compiled score) agrees with the batch features
+    single = scorer.score(50.0, 0, 80.0, 0, condition_value(None))
+    assert single == pytest.approx(pipeline.predict_proba(X.iloc[[2]][RISK_FEATURE_COLUMNS])[0, 1], abs=1e-12)
+
+
+def test_endpoint_treats_null_like_none(service):
+    client = service.app.test_client()
+    patient = {'age': 60, 'isSmoker': False, 'hr': 80, 'bp': '130/85'}
+    scores = [client.post('/api/predict/risk', json=dict(patient, **extra)).get_json()['risk_score']
+              for extra in ({'condition': None}, {'condition': 'None'}, {})]
+    assert scores[0] == pytest.approx(scores[1]) == pytest.approx(scores[2])
+    batch = client.post('/api/predict/risk/batch', json=[dict(patient, condition=None)]).get_json()
+    assert batch['results'][0]['risk_score'] == pytest.approx(scores[0])
@@ -0,0 +1,78 @@
+# analytics-service/tests/test_seasonal_engine.py
+import numpy as np
+import pandas as pd
+import pytest
+
+from seasonal_engine import PERIOD, compare_engines, fit_seasonal_models, seasonal_demand_frame, series_matrix
+
+MONTHS = [f"{2022 + i // 12:04d}-{i % 12 + 1:02d}" for i in range(48)]
+INDEX = {m: i for i, m in enumerate(MONTHS)}
+
+
+def frame(series):
+    """{name: values} -> month, medicine, demand rows (None values are left out)."""
+    rows = [(MONTHS[t], name, v) for name, values in series.items() for t, v in enumerate(values) if v is not None]
+    return pd.DataFrame(rows, columns=['month', 'medicine', 'demand'])
+
+
+def seasonal_series(n, level=100.0, slope=1.5, amplitude=25.0):
+    t = np.arange(n)
+    return level + slope * t + amplitude * np.sin(2 * np.pi * t / PERIOD)
+
+
+def test_series_matrix_averages_duplicates_and_marks_gaps():
+    df = pd.DataFrame({'month': [MONTHS[0], MONTHS[0], MONTHS[2], MONTHS[1]],
+                       'medicine': ['B', 'B', 'B', 'A'], 'demand': [10, 20, 5, 7]})
+    names, Y, rows = series_matrix(df, 'medicine', 'demand', {m: INDEX[m] for m in MONTHS[:3]})
+    assert names == ['A', 'B']
+    assert np.isnan(Y[0, 0]) and Y[0, 1] == 7
+    assert Y[1, 0] == 15 and np.isnan(Y[1, 1]) and Y[1, 2] == 5
+    assert rows.tolist() == [1, 3]
+    names, Y, _ = series_matrix(df, 'medicine', 'demand', {m: INDEX[m] for m in MONTHS[:3]}, entities=['B'])
+    assert names == ['B'] and Y.shape == (1, 3)
+
+
+def test_trend_and_season_are_extrapolated():
+    history, horizon = 36, 12
+    truth = seasonal_series(history + horizon)
+    models, report = fit_seasonal_models(frame({'A': truth[:history]}), 'medicine', 'demand',
+                                         {m: INDEX[m] for m in MONTHS[:history]})
+    assert report['fitted'] == report['seasonal'] == 1
+    ahead = models['A'].predict(np.arange(history, history + horizon).reshape(-1, 1))
+    assert np.abs(ahead - truth[history:]).max() < 0.1 * truth[history:].mean()
+    # the peak and trough months of the season carry over
+    assert np.argmax(ahead) % PERIOD == np.argmax(truth[history:]) % PERIOD
+
+
+def test_short_series_fall_back_or_drop_the_season():
+    df = frame({'few': [5, 6, None, None], 'year': list(seasonal_series(18)), 'long': list(seasonal_series(30))})
+    models, report = fit_seasonal_models(df, 'medicine', 'demand', {m: INDEX[m] for m in MONTHS[:30]})
+    assert models['few'] is None
+    assert report['fitted'] == 2 and report['seasonal'] == 1
+    assert models['year'].params[2] == 0.0 and not models['year'].season.any()
+    assert models['long'].season.any()
+
+
+def test_missing_months_do_not_leak_nans():
+    values = list(seasonal_series(30))
+    values[5] = values[17] = None
+    models, _ = fit_seasonal_models(frame({'A': values}), 'medicine', 'demand', {m: INDEX[m] for m in MONTHS[:30]})
+    assert np.isfinite(models['A'].predict(np.arange(40).reshape(-1, 1))).all()
+
+
+def test_each_series_fits_the_same_alone_or_together():
+    series = {f"S{i}": list(seasonal_series(30, level=50 + 10 * i, slope=i * 0.3, amplitude=5 + i))
+              for i in range(6)}
+    index = {m: INDEX[m] for m in MONTHS[:30]}
+    together, _ = fit_seasonal_models(frame(series), 'medicine', 'demand', index)
+    X = np.arange(30, 42).reshape(-1, 1)
+    for name in series:
+        alone, _ = fit_seasonal_models(frame(series), 'medicine', 'demand', index, entities=[name])
+        assert list(alone) == [name]
+        assert np.allclose(alone[name].predict(X), together[name].predict(X))
+
+
+def test_seasonal_engine_beats_the_forest_on_seasonal_demand():
+    pytest.importorskip('sklearn')
+    result = compare_engines(seasonal_demand_frame(12), 'medicine', 'demand', holdout=6, n_estimators=10)
+    assert result['seasonal']['mae'] < result['forest']['mae']
@@ -0,0 +1,40 @@
+# analytics-service/tests/test_training_engine.py
+import pytest
+
+pytest.importorskip('sklearn')
+
+import training_engine as te  # noqa: E402
+
+
+@pytest.fixture
+def frame():
+    return te._synthetic_frame(6, n_months=8)
+
+
+def test_small_fits_run_serially_without_a_pool(frame, monkeypatch):
+    te.shutdown_pool()
+    df, index_map = frame
+    monkeypatch.setattr(te, 'TRAIN_POOL_MIN_TASKS', 16)
+    models, report = te.fit_series_models(df, 'medicine', 'demand', index_map, 5, workers=2,
+                                          entities=['SKU 00001', 'SKU 00002'])
+    assert report['workers'] == 1
+    assert sorted(models) == ['SKU 00001', 'SKU 00002']
+    assert te._pool is None
+
+
+def test_pool_uses_an_explicit_context_and_is_reused(frame, monkeypatch):
+    df, index_map = frame
+    monkeypatch.setattr(te, 'TRAIN_POOL_MIN_TASKS', 2)
+    try:
+        serial, _ = te.fit_series_models(df, 'medicine', 'demand', index_map, 5, workers=1)
+        models, report = te.fit_series_models(df, 'medicine', 'demand', index_map, 5, workers=2)
+        pool = te._pool
+        assert report['workers'] == 2
+        assert pool._mp_context.get_start_method() in ('forkserver', 'spawn')
+        te.fit_series_models(df, 'medicine', 'demand', index_map, 5, workers=2)
+        assert te._pool is pool
+        # same seeds, same data: the pool fits the same models as the serial path
+        for name, model in serial.items():
+            assert (models[name].predict([[9.0]]) == model.predict([[9.0]])).all()
+    finally:
+        te.shutdown_pool()
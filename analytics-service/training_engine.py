@@ -0,0 +1,180 @@
+# analytics-service/training_engine.py
+"""
+Per-entity model fitting for the analytics service.
+
+The demand and disease models are one small RandomForestRegressor per medicine /
+disease on a single month-index feature. Instead of filtering the frame once per
+entity (O(entities x rows)) the frame is split with a single groupby and the fits
+are fanned out over a process pool sized to the machine. seasonal_engine.py is the
+vectorized alternative (FORECAST_ENGINE=seasonal in app.py).
+
+The pool is created once and reused by later retrains. Its workers are started with
+forkserver (spawn where that is missing), never forked from the calling process,
+which runs retrains on a background thread next to request threads whose locks a
+fork would copy. Fits of fewer than TRAIN_POOL_MIN_TASKS entities (an incremental
+merge touching a few medicines) run serially instead.
+
+    python training_engine.py --skus 100 500 2000 --workers 1 2 4
+
+prints how retrain wall-clock scales with SKU count and worker count.
+"""
+import atexit
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+import pandas as pd
+
+# minimum number of observations before an entity gets its own model
+MIN_SAMPLES = 3
+# below this many entities the fits run serially: dispatching them costs more than it saves
+TRAIN_POOL_MIN_TASKS = max(1, int(os.environ.get('TRAIN_POOL_MIN_TASKS', 16)))
+
+
+def default_workers():
+    """TRAIN_WORKERS env var, else one worker per core."""
+    try:
+        configured = int(os.environ.get('TRAIN_WORKERS', 0))
+    except ValueError:
+        configured = 0
+    return configured if configured > 0 else (os.cpu_count() or 1)
+
+
+_pool = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+
+
+def _pool_context():
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+
+
+def _get_pool(workers):
+    """The shared fitting pool, (re)created when a different size is asked for."""
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is not None and _pool_workers != workers:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=_pool_context())
+            _pool_workers = workers
+        return _pool
+
+
+def shutdown_pool():
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+atexit.register(shutdown_pool)
+
+
+def _fit_one(task):
+    from sklearn.ensemble import RandomForestRegressor  # slow to import; only needed once training starts
+    name, X, y, n_estimators = task
+    t0 = time.perf_counter()
+    model = None
+    if len(X) >= MIN_SAMPLES:
+        model = RandomForestRegressor(n_estimators=n_estimators, random_state=42)
+        model.fit(X, y)
+    return name, model, time.perf_counter() - t0
+
+
+def split_series(df, key_col, value_col, months_index_map):
+    """One groupby over the frame -> [(entity, X, y), ...] in sorted entity order."""
+    X_all = df['month'].map(months_index_map).to_numpy(dtype=float)
+    y_all = df[value_col].to_numpy()
+    out = []
+    for name, idx in df.groupby(key_col, sort=True).indices.items():
+        # month order within a series, so the fit doesn't depend on how the rows were stored
+        idx = idx[np.argsort(X_all[idx], kind='stable')]
+        out.append((name, X_all[idx].reshape(-1, 1), y_all[idx]))
+    return out
+
+
+def fit_series_models(df, key_col, value_col, months_index_map, n_estimators, workers=None, entities=None):
+    """
+    Fit one model per distinct `key_col` value of `df`. If `entities` is given only
+    those are fitted. Returns (models, report) where models maps entity -> fitted
+    model (or None when there are fewer than MIN_SAMPLES rows) and report holds
+    wall-clock and per-entity fit timings.
+    """
+    t0 = time.perf_counter()
+    series = split_series(df, key_col, value_col, months_index_map)
+    if entities is not None:
+        wanted = set(entities)
+        series = [s for s in series if s[0] in wanted]
+    tasks = [(name, X, y, n_estimators) for name, X, y in series]
+    split_seconds = time.perf_counter() - t0
+
+    workers = max(1, workers or default_workers())
+    results = None
+    if workers > 1 and len(tasks) >= TRAIN_POOL_MIN_TASKS:
+        # a few tasks per chunk keeps IPC overhead low without starving workers
+        chunksize = max(1, len(tasks) // (workers * 4))
+        try:
+            results = list(_get_pool(workers).map(_fit_one, tasks, chunksize=chunksize))
+        except BrokenProcessPool as e:
+            print("[training] fit pool broke, fitting serially:", e)
+            shutdown_pool()
+    if results is None:
+        workers = 1
+        results = [_fit_one(t) for t in tasks]
+
+    models = {}
+    timings = {}
+    for name, model, seconds in results:
+        models[name] = model
+        timings[name] = round(seconds, 6)
+
+    fit_total = sum(timings.values())
+    report = {
+        'entities': len(tasks),
+        'fitted': sum(1 for m in models.values() if m is not None),
+        'workers': workers,
+        'split_seconds': round(split_seconds, 6),
+        'fit_seconds_total': round(fit_total, 6),
+        'fit_seconds_max': max(timings.values()) if timings else 0.0,
+        'wall_seconds': round(time.perf_counter() - t0, 6),
+        'per_entity_seconds': timings,
+    }
+    return models, report
+
+
+def _synthetic_frame(n_skus, n_months=34, seed=42):
+    rng = np.random.default_rng(seed)
+    months = [f"{2023 + i // 12:04d}-{i % 12 + 1:02d}" for i in range(n_months)]
+    meds = [f"SKU {i:05d}" for i in range(n_skus)]
+    demand = rng.integers(50, 250, size=(n_skus, n_months))
+    return pd.DataFrame({
+        'month': np.tile(months, n_skus),
+        'medicine': np.repeat(meds, n_months),
+        'demand': demand.ravel(),
+    }), {m: i for i, m in enumerate(months)}
+
+
+if __name__ == '__main__':
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description='Measure per-entity training scaling.')
+    parser.add_argument('--skus', type=int, nargs='+', default=[20, 200, 1000])
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, default_workers()])
+    parser.add_argument('--estimators', type=int, default=50)
+    args = parser.parse_args()
+
+    for n in args.skus:
+        frame, index_map = _synthetic_frame(n)
+        for w in sorted(set(args.workers)):
+            _, rep = fit_series_models(frame, 'medicine', 'demand', index_map, args.estimators, workers=w)
+            rep.pop('per_entity_seconds')
+            print(json.dumps({'skus': n, **rep}))